@@ -0,0 +1,26 @@
+"""baseline schema
+
+Revision ID: 3c1a7e5d2b90
+Revises:
+Create Date: 2025-08-30 10:00:00.000000
+
+The pre-Alembic schema was applied by hand from tables.sql and the
+*_schema.sql files. Existing databases should be stamped at this revision
+(`alembic stamp 3c1a7e5d2b90`) before running `alembic upgrade head`.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '3c1a7e5d2b90'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    pass
+
+
+def downgrade():
+    pass
@@ -1,7 +1,7 @@
 """add trainer features
 
 Revision ID: 9f8a2d4b3e1c
-Revises: previous_revision_id
+Revises: 3c1a7e5d2b90
 Create Date: 2025-08-31 10:00:00.000000
 
 """
@@ -11,7 +11,7 @@ from sqlalchemy.dialects import postgresql
 
 # revision identifiers, used by Alembic.
 revision = '9f8a2d4b3e1c'
-down_revision = 'previous_revision_id'  # Update this to your last migration
+down_revision = '3c1a7e5d2b90'
 branch_labels = None
 depends_on = None
 
@@ -0,0 +1,34 @@
+"""rate limit buckets
+
+Revision ID: a41c6e2f7d10
+Revises: 9f8a2d4b3e1c
+Create Date: 2025-09-02 10:00:00.000000
+
+Shared token buckets for RATE_LIMIT_BACKEND=postgres. The table is UNLOGGED:
+losing it on a crash only resets everyone's limits.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'a41c6e2f7d10'
+down_revision = '9f8a2d4b3e1c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE UNLOGGED TABLE IF NOT EXISTS rate_limit_buckets (
+            key TEXT PRIMARY KEY,
+            tokens DOUBLE PRECISION NOT NULL,
+            allowed BOOLEAN NOT NULL DEFAULT TRUE,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp()
+        )
+    """)
+    op.create_index('idx_rate_limit_buckets_updated_at', 'rate_limit_buckets', ['updated_at'])
+
+
+def downgrade():
+    op.drop_index('idx_rate_limit_buckets_updated_at', table_name='rate_limit_buckets')
+    op.drop_table('rate_limit_buckets')
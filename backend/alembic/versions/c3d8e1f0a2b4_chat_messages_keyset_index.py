@@ -0,0 +1,48 @@
+"""chat messages keyset index
+
+Revision ID: c3d8e1f0a2b4
+Revises: b7e2c9d4f6a1
+Create Date: 2025-09-05 10:00:00.000000
+
+(room_id, created_at, id) serves the (created_at, id) cursor pages of
+get_room_messages in both directions; created_at alone leaves ties between
+messages sent in the same microsecond unordered. Built CONCURRENTLY so
+chat_messages stays writable; a partitioned chat_messages (created from the
+current schema file) already has it, and cannot be indexed concurrently.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c3d8e1f0a2b4'
+down_revision = 'b7e2c9d4f6a1'
+branch_labels = None
+depends_on = None
+
+
+def _chat_messages_is_partitioned():
+    """True on databases created from the current chat_friends_database_schema.sql."""
+    return op.get_bind().execute(sa.text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('chat_messages'))"
+    )).scalar()
+
+
+def upgrade():
+    if _chat_messages_is_partitioned():
+        op.create_index(
+            'idx_chat_messages_room_created_id', 'chat_messages', ['room_id', 'created_at', 'id'], if_not_exists=True,
+        )
+        return
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'idx_chat_messages_room_created_id', 'chat_messages', ['room_id', 'created_at', 'id'],
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'idx_chat_messages_room_created_id', table_name='chat_messages',
+            postgresql_concurrently=True, if_exists=True,
+        )
@@ -0,0 +1,143 @@
+"""chat change sequence
+
+Revision ID: d5f2a8c1e7b3
+Revises: c3d8e1f0a2b4
+Create Date: 2025-09-06 10:00:00.000000
+
+Stamps every insert/update of chat_messages, message_reactions and
+chat_participants with (change_xid, change_seq) for GET /chat/sync, and
+keeps a tombstone per deleted reaction. change_seq orders changes within a
+transaction; change_xid lets the sync hold back changes of transactions
+that may still commit behind a client's cursor. Rows written before this
+revision have no stamp and are never synced; clients already have them
+from /messages.
+
+The columns are added without defaults, so no table is rewritten; the
+indexes are built CONCURRENTLY. Everything is skipped or replaced when it
+already exists, so databases created from the current schema file can run
+this revision.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'd5f2a8c1e7b3'
+down_revision = 'c3d8e1f0a2b4'
+branch_labels = None
+depends_on = None
+
+STAMPED_TABLES = ('chat_messages', 'message_reactions', 'chat_participants', 'chat_reaction_tombstones')
+
+INDEXES = (
+    ('idx_chat_messages_room_change', 'chat_messages', ['room_id', 'change_xid', 'change_seq']),
+    ('idx_message_reactions_change', 'message_reactions', ['change_xid', 'change_seq']),
+    ('idx_chat_participants_room_change', 'chat_participants', ['room_id', 'change_xid', 'change_seq']),
+    ('idx_chat_reaction_tombstones_room_change', 'chat_reaction_tombstones', ['room_id', 'change_xid', 'change_seq']),
+)
+
+
+def _chat_messages_is_partitioned():
+    """True on databases created from the current chat_friends_database_schema.sql."""
+    return op.get_bind().execute(sa.text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('chat_messages'))"
+    )).scalar()
+
+
+def upgrade():
+    op.execute("CREATE SEQUENCE IF NOT EXISTS chat_change_seq")
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS chat_reaction_tombstones (
+            reaction_id UUID PRIMARY KEY,
+            message_id UUID NOT NULL,
+            room_id UUID NOT NULL,
+            user_id UUID NOT NULL,
+            reaction_type VARCHAR(50) NOT NULL,
+            deleted_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    for table in STAMPED_TABLES:
+        op.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS change_seq BIGINT, ADD COLUMN IF NOT EXISTS change_xid xid8")
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION stamp_chat_change()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            NEW.change_seq = nextval('chat_change_seq');
+            NEW.change_xid = pg_current_xact_id();
+            RETURN NEW;
+        END;
+        $$ language 'plpgsql'
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION stamp_chat_participant_change()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            -- unread_count moves with every message; clients count those from the messages
+            IF TG_OP = 'INSERT'
+               OR (NEW.last_read_at, NEW.left_at, NEW.role, NEW.is_muted, NEW.is_pinned)
+                  IS DISTINCT FROM (OLD.last_read_at, OLD.left_at, OLD.role, OLD.is_muted, OLD.is_pinned) THEN
+                NEW.change_seq = nextval('chat_change_seq');
+                NEW.change_xid = pg_current_xact_id();
+            END IF;
+            RETURN NEW;
+        END;
+        $$ language 'plpgsql'
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION record_chat_reaction_removal()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            INSERT INTO chat_reaction_tombstones (reaction_id, message_id, room_id, user_id, reaction_type)
+            SELECT OLD.id, OLD.message_id, cm.room_id, OLD.user_id, OLD.reaction_type
+            FROM chat_messages cm WHERE cm.id = OLD.message_id
+            ON CONFLICT (reaction_id) DO NOTHING;
+            RETURN OLD;
+        END;
+        $$ language 'plpgsql'
+    """)
+    for table in ('chat_messages', 'message_reactions', 'chat_reaction_tombstones'):
+        op.execute(f"DROP TRIGGER IF EXISTS trigger_stamp_{table}_change ON {table}")
+        op.execute(f"""
+            CREATE TRIGGER trigger_stamp_{table}_change
+                BEFORE INSERT OR UPDATE ON {table}
+                FOR EACH ROW
+                EXECUTE FUNCTION stamp_chat_change()
+        """)
+    op.execute("DROP TRIGGER IF EXISTS trigger_stamp_chat_participants_change ON chat_participants")
+    op.execute("""
+        CREATE TRIGGER trigger_stamp_chat_participants_change
+            BEFORE INSERT OR UPDATE ON chat_participants
+            FOR EACH ROW
+            EXECUTE FUNCTION stamp_chat_participant_change()
+    """)
+    op.execute("DROP TRIGGER IF EXISTS trigger_record_chat_reaction_removal ON message_reactions")
+    op.execute("""
+        CREATE TRIGGER trigger_record_chat_reaction_removal
+            AFTER DELETE ON message_reactions
+            FOR EACH ROW
+            EXECUTE FUNCTION record_chat_reaction_removal()
+    """)
+
+    # A partitioned table cannot be indexed CONCURRENTLY
+    partitioned = _chat_messages_is_partitioned()
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            concurrently = not (partitioned and table == 'chat_messages')
+            op.create_index(name, table, columns, postgresql_concurrently=concurrently, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _ in INDEXES:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+
+    op.execute("DROP TRIGGER IF EXISTS trigger_record_chat_reaction_removal ON message_reactions")
+    for table in STAMPED_TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS trigger_stamp_{table}_change ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS record_chat_reaction_removal()")
+    op.execute("DROP FUNCTION IF EXISTS stamp_chat_participant_change()")
+    op.execute("DROP FUNCTION IF EXISTS stamp_chat_change()")
+    op.execute("DROP TABLE IF EXISTS chat_reaction_tombstones")
+    for table in ('chat_messages', 'message_reactions', 'chat_participants'):
+        op.execute(f"ALTER TABLE {table} DROP COLUMN IF EXISTS change_seq, DROP COLUMN IF EXISTS change_xid")
+    op.execute("DROP SEQUENCE IF EXISTS chat_change_seq")
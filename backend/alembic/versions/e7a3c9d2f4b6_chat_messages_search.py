@@ -0,0 +1,56 @@
+"""chat messages search
+
+Revision ID: e7a3c9d2f4b6
+Revises: d5f2a8c1e7b3
+Create Date: 2025-09-07 10:00:00.000000
+
+Full-text search for ChatCRUD.search_messages: a generated content_tsv
+column and a GIN index on (room_id, content_tsv) over live messages.
+btree_gin lets the uuid room_id sit in the GIN index, so the membership
+filter is an index condition rather than a post-filter. The 'simple'
+configuration does no stemming or stop words, since chat is mixed-language.
+
+Adding a STORED generated column rewrites chat_messages under an ACCESS
+EXCLUSIVE lock; run this revision in a maintenance window. The index is
+built CONCURRENTLY afterwards, except on a partitioned chat_messages (created
+from the current schema file), which already has both.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'e7a3c9d2f4b6'
+down_revision = 'd5f2a8c1e7b3'
+branch_labels = None
+depends_on = None
+
+
+def _chat_messages_is_partitioned():
+    """True on databases created from the current chat_friends_database_schema.sql."""
+    return op.get_bind().execute(sa.text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('chat_messages'))"
+    )).scalar()
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gin")
+    op.execute("""
+        ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS content_tsv tsvector
+            GENERATED ALWAYS AS (to_tsvector('simple', coalesce(content, ''))) STORED
+    """)
+    concurrently = "" if _chat_messages_is_partitioned() else "CONCURRENTLY"
+    with op.get_context().autocommit_block():
+        op.execute(f"""
+            CREATE INDEX {concurrently} IF NOT EXISTS idx_chat_messages_search
+            ON chat_messages USING gin (room_id, content_tsv)
+            WHERE is_deleted = FALSE
+        """)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'idx_chat_messages_search', table_name='chat_messages',
+            postgresql_concurrently=True, if_exists=True,
+        )
+    op.execute("ALTER TABLE chat_messages DROP COLUMN IF EXISTS content_tsv")
@@ -0,0 +1,314 @@
+"""partition chat messages
+
+Revision ID: f1b6d3e8a9c2
+Revises: e7a3c9d2f4b6
+Create Date: 2025-09-08 10:00:00.000000
+
+Rebuilds chat_messages as a table partitioned by month of created_at
+(chat_messages_pYYYYMM, bounds in UTC), so vacuum, index maintenance and
+backups work on one month at a time and old months can leave the table.
+
+- The primary key becomes (id, created_at): a partitioned table's unique
+  constraints must contain the partition key. Nothing can reference
+  chat_messages(id) any more, so the foreign keys from
+  message_read_receipts, message_reactions and reply_to_id /
+  forwarded_from_id are dropped; cleanup_chat_message_references() does
+  their ON DELETE work.
+- create_chat_message_partitions(months_ahead) creates missing monthly
+  partitions up to months_ahead months from now. There is no default
+  partition, so a message for a month without one fails to insert; the
+  app runs this every CHAT_PARTITION_INTERVAL seconds (see
+  app.database.chat_partitions).
+- archive_chat_message_partitions(keep_months) folds each partition older
+  than keep_months into chat_messages_archive, one compressed JSON array
+  per room and month, deletes the month's read receipts and reactions
+  (dropping a partition fires no DELETE trigger), then drops it.
+  get_room_messages keeps reading archived months, without reactions and
+  with read state from last_read_at only. reply_to_id and
+  forwarded_from_id on later messages keep the archived id; the reply
+  preview resolves to NULL.
+
+Existing rows are copied before the triggers exist, so they keep their
+change stamps. The copy runs under an ACCESS EXCLUSIVE lock on
+chat_messages (the same lock the rename takes), so reads and writes both
+wait until the revision commits; on a large table, run it in a maintenance
+window. A chat_messages that is already partitioned (created from the
+current schema file) is left as it is.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'f1b6d3e8a9c2'
+down_revision = 'e7a3c9d2f4b6'
+branch_labels = None
+depends_on = None
+
+COLUMNS = (
+    "id, room_id, sender_id, message_type, content, media_urls, metadata, reply_to_id, "
+    "forwarded_from_id, edited_at, created_at, is_deleted, deleted_at, change_seq, change_xid"
+)
+
+
+def _create_indexes_and_triggers():
+    op.execute("CREATE INDEX IF NOT EXISTS idx_chat_messages_room_id_created_at ON chat_messages(room_id, created_at DESC)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_chat_messages_room_created_id ON chat_messages(room_id, created_at, id)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_chat_messages_sender_id ON chat_messages(sender_id)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_chat_messages_reply_to_id ON chat_messages(reply_to_id) WHERE reply_to_id IS NOT NULL")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_chat_messages_room_change ON chat_messages(room_id, change_xid, change_seq)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_chat_messages_search ON chat_messages USING gin (room_id, content_tsv) WHERE is_deleted = FALSE")
+    op.execute("DROP TRIGGER IF EXISTS trigger_update_chat_room_last_message ON chat_messages")
+    op.execute("""
+        CREATE TRIGGER trigger_update_chat_room_last_message
+            AFTER INSERT OR UPDATE ON chat_messages
+            FOR EACH ROW
+            EXECUTE FUNCTION update_chat_room_last_message()
+    """)
+    op.execute("DROP TRIGGER IF EXISTS trigger_stamp_chat_messages_change ON chat_messages")
+    op.execute("""
+        CREATE TRIGGER trigger_stamp_chat_messages_change
+            BEFORE INSERT OR UPDATE ON chat_messages
+            FOR EACH ROW
+            EXECUTE FUNCTION stamp_chat_change()
+    """)
+
+
+def _create_archive_and_functions():
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS chat_messages_archive (
+            room_id UUID NOT NULL REFERENCES chat_rooms(id) ON DELETE CASCADE,
+            month DATE NOT NULL,
+            message_count INTEGER NOT NULL,
+            messages JSONB NOT NULL,
+            archived_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (room_id, month)
+        ) WITH (toast_tuple_target = 128)
+    """)
+    # lz4 (PostgreSQL 14+ built with lz4) compresses faster than the default pglz
+    op.execute("""
+        DO $$
+        BEGIN
+            ALTER TABLE chat_messages_archive ALTER COLUMN messages SET COMPRESSION lz4;
+        EXCEPTION WHEN OTHERS THEN
+            RAISE NOTICE 'chat_messages_archive.messages stays on the default compression: %', SQLERRM;
+        END $$
+    """)
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION create_chat_message_partitions(months_ahead integer, from_month date DEFAULT NULL)
+        RETURNS integer AS $$
+        DECLARE
+            this_month date := date_trunc('month', now() AT TIME ZONE 'UTC')::date;
+            month date := date_trunc('month', COALESCE(from_month, this_month))::date;
+            part_name text;
+            created integer := 0;
+        BEGIN
+            -- Every app worker runs this; one at a time
+            PERFORM pg_advisory_xact_lock(hashtext('create_chat_message_partitions'));
+            WHILE month <= this_month + make_interval(months => months_ahead) LOOP
+                part_name := 'chat_messages_p' || to_char(month, 'YYYYMM');
+                IF to_regclass(part_name) IS NULL THEN
+                    EXECUTE format(
+                        'CREATE TABLE %I PARTITION OF chat_messages FOR VALUES FROM (%L) TO (%L)',
+                        part_name,
+                        month::timestamp AT TIME ZONE 'UTC',
+                        (month + interval '1 month')::timestamp AT TIME ZONE 'UTC'
+                    );
+                    created := created + 1;
+                END IF;
+                month := (month + interval '1 month')::date;
+            END LOOP;
+            RETURN created;
+        END;
+        $$ language 'plpgsql'
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION archive_chat_message_partitions(keep_months integer)
+        RETURNS integer AS $$
+        DECLARE
+            cutoff date := (date_trunc('month', now() AT TIME ZONE 'UTC') - make_interval(months => keep_months))::date;
+            part record;
+            archived integer := 0;
+        BEGIN
+            PERFORM pg_advisory_xact_lock(hashtext('archive_chat_message_partitions'));
+            FOR part IN
+                SELECT c.relname, to_date(substring(c.relname from '^chat_messages_p([0-9]{6})$'), 'YYYYMM') AS month
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = 'chat_messages'::regclass
+                ORDER BY c.relname
+            LOOP
+                CONTINUE WHEN part.month IS NULL OR part.month >= cutoff;
+                -- Edits to the old month wait; the rest of chat_messages is untouched until the detach
+                EXECUTE format('LOCK TABLE %I IN SHARE MODE', part.relname);
+                EXECUTE format($archive$
+                    INSERT INTO chat_messages_archive (room_id, month, message_count, messages)
+                    SELECT room_id, %L, count(*), jsonb_agg(jsonb_build_object(
+                        'id', id,
+                        'sender_id', sender_id,
+                        'message_type', message_type,
+                        'content', content,
+                        'media_urls', media_urls,
+                        'metadata', metadata,
+                        'reply_to_id', reply_to_id,
+                        'forwarded_from_id', forwarded_from_id,
+                        'created_at', created_at,
+                        'edited_at', edited_at
+                    ) ORDER BY created_at, id)
+                    FROM %I
+                    WHERE is_deleted = FALSE
+                    GROUP BY room_id
+                $archive$, part.month, part.relname);
+                EXECUTE format('ALTER TABLE chat_messages DETACH PARTITION %I', part.relname);
+                -- No DELETE fires on a dropped partition, so do what cleanup_chat_message_references
+                -- would. Once detached the messages are out of chat_messages, so removing their
+                -- reactions leaves no tombstones for the sync feed.
+                EXECUTE format('DELETE FROM message_read_receipts r USING %I m WHERE r.message_id = m.id', part.relname);
+                EXECUTE format('DELETE FROM message_reactions r USING %I m WHERE r.message_id = m.id', part.relname);
+                EXECUTE format('DROP TABLE %I', part.relname);
+                archived := archived + 1;
+            END LOOP;
+            RETURN archived;
+        END;
+        $$ language 'plpgsql'
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION cleanup_chat_message_references()
+        RETURNS TRIGGER AS $$
+        BEGIN
+            -- What the foreign keys to chat_messages(id) used to do
+            DELETE FROM message_read_receipts WHERE message_id = OLD.id;
+            DELETE FROM message_reactions WHERE message_id = OLD.id;
+            UPDATE chat_messages SET reply_to_id = NULL WHERE reply_to_id = OLD.id;
+            UPDATE chat_messages SET forwarded_from_id = NULL WHERE forwarded_from_id = OLD.id;
+            RETURN OLD;
+        END;
+        $$ language 'plpgsql'
+    """)
+
+
+def _create_cleanup_trigger():
+    op.execute("DROP TRIGGER IF EXISTS trigger_cleanup_chat_message_references ON chat_messages")
+    op.execute("""
+        CREATE TRIGGER trigger_cleanup_chat_message_references
+            AFTER DELETE ON chat_messages
+            FOR EACH ROW
+            EXECUTE FUNCTION cleanup_chat_message_references()
+    """)
+
+
+def _chat_messages_is_partitioned():
+    return op.get_bind().execute(sa.text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('chat_messages'))"
+    )).scalar()
+
+
+def upgrade():
+    op.execute("ALTER TABLE message_read_receipts DROP CONSTRAINT IF EXISTS message_read_receipts_message_id_fkey")
+    op.execute("ALTER TABLE message_reactions DROP CONSTRAINT IF EXISTS message_reactions_message_id_fkey")
+    if _chat_messages_is_partitioned():
+        # Created from the current schema file: nothing to copy
+        _create_archive_and_functions()
+        op.execute("SELECT create_chat_message_partitions(3)")
+        _create_cleanup_trigger()
+        return
+
+    op.execute("LOCK TABLE chat_messages IN ACCESS EXCLUSIVE MODE")
+    op.execute("ALTER TABLE chat_messages RENAME TO chat_messages_unpartitioned")
+    op.execute("ALTER INDEX chat_messages_pkey RENAME TO chat_messages_unpartitioned_pkey")
+
+    op.execute("""
+        CREATE TABLE chat_messages (
+            id UUID NOT NULL DEFAULT gen_random_uuid(),
+            room_id UUID NOT NULL REFERENCES chat_rooms(id) ON DELETE CASCADE,
+            sender_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            message_type chat_message_type DEFAULT 'text',
+            content TEXT,
+            media_urls TEXT[],
+            metadata JSONB,
+            reply_to_id UUID,
+            forwarded_from_id UUID,
+            edited_at TIMESTAMP WITH TIME ZONE,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            is_deleted BOOLEAN DEFAULT FALSE,
+            deleted_at TIMESTAMP WITH TIME ZONE,
+            change_seq BIGINT,
+            change_xid xid8,
+            content_tsv tsvector GENERATED ALWAYS AS (to_tsvector('simple', coalesce(content, ''))) STORED,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    _create_archive_and_functions()
+
+    op.execute("""
+        SELECT create_chat_message_partitions(
+            3, (SELECT min(created_at) AT TIME ZONE 'UTC' FROM chat_messages_unpartitioned)::date
+        )
+    """)
+    op.execute(f"""
+        INSERT INTO chat_messages ({COLUMNS})
+        SELECT id, room_id, sender_id, message_type, content, media_urls, metadata, reply_to_id,
+               forwarded_from_id, edited_at, COALESCE(created_at, CURRENT_TIMESTAMP), is_deleted, deleted_at,
+               change_seq, change_xid
+        FROM chat_messages_unpartitioned
+    """)
+    op.execute("DROP TABLE chat_messages_unpartitioned")
+
+    _create_indexes_and_triggers()
+    _create_cleanup_trigger()
+
+
+def downgrade():
+    op.execute("LOCK TABLE chat_messages IN ACCESS EXCLUSIVE MODE")
+    op.execute("ALTER TABLE chat_messages RENAME TO chat_messages_partitioned")
+    op.execute("ALTER INDEX chat_messages_pkey RENAME TO chat_messages_partitioned_pkey")
+    op.execute("""
+        CREATE TABLE chat_messages (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            room_id UUID NOT NULL REFERENCES chat_rooms(id) ON DELETE CASCADE,
+            sender_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            message_type chat_message_type DEFAULT 'text',
+            content TEXT,
+            media_urls TEXT[],
+            metadata JSONB,
+            reply_to_id UUID,
+            forwarded_from_id UUID,
+            edited_at TIMESTAMP WITH TIME ZONE,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            is_deleted BOOLEAN DEFAULT FALSE,
+            deleted_at TIMESTAMP WITH TIME ZONE,
+            change_seq BIGINT,
+            change_xid xid8,
+            content_tsv tsvector GENERATED ALWAYS AS (to_tsvector('simple', coalesce(content, ''))) STORED
+        )
+    """)
+    op.execute(f"INSERT INTO chat_messages ({COLUMNS}) SELECT {COLUMNS} FROM chat_messages_partitioned")
+    # Archived months come back too
+    op.execute("""
+        INSERT INTO chat_messages (id, room_id, sender_id, message_type, content, media_urls, metadata,
+                                   reply_to_id, forwarded_from_id, edited_at, created_at)
+        SELECT e.id, a.room_id, e.sender_id, e.message_type, e.content, e.media_urls, e.metadata,
+               e.reply_to_id, e.forwarded_from_id, e.edited_at, e.created_at
+        FROM chat_messages_archive a
+        CROSS JOIN LATERAL jsonb_to_recordset(a.messages) AS e(
+            id uuid, sender_id uuid, message_type chat_message_type, content text, media_urls text[],
+            metadata jsonb, reply_to_id uuid, forwarded_from_id uuid, created_at timestamptz, edited_at timestamptz
+        )
+    """)
+    op.execute("DROP TABLE chat_messages_partitioned")
+    op.execute("DROP TABLE chat_messages_archive")
+    op.execute("DROP FUNCTION IF EXISTS cleanup_chat_message_references()")
+    op.execute("DROP FUNCTION IF EXISTS archive_chat_message_partitions(integer)")
+    op.execute("DROP FUNCTION IF EXISTS create_chat_message_partitions(integer, date)")
+
+    # Orphans of messages deleted while there were no foreign keys
+    op.execute("DELETE FROM message_read_receipts r WHERE NOT EXISTS (SELECT 1 FROM chat_messages m WHERE m.id = r.message_id)")
+    op.execute("DELETE FROM message_reactions r WHERE NOT EXISTS (SELECT 1 FROM chat_messages m WHERE m.id = r.message_id)")
+    op.execute("UPDATE chat_messages c SET reply_to_id = NULL WHERE reply_to_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM chat_messages m WHERE m.id = c.reply_to_id)")
+    op.execute("UPDATE chat_messages c SET forwarded_from_id = NULL WHERE forwarded_from_id IS NOT NULL AND NOT EXISTS (SELECT 1 FROM chat_messages m WHERE m.id = c.forwarded_from_id)")
+    op.execute("ALTER TABLE chat_messages ADD FOREIGN KEY (reply_to_id) REFERENCES chat_messages(id) ON DELETE SET NULL")
+    op.execute("ALTER TABLE chat_messages ADD FOREIGN KEY (forwarded_from_id) REFERENCES chat_messages(id) ON DELETE SET NULL")
+    op.execute("ALTER TABLE message_read_receipts ADD FOREIGN KEY (message_id) REFERENCES chat_messages(id) ON DELETE CASCADE")
+    op.execute("ALTER TABLE message_reactions ADD FOREIGN KEY (message_id) REFERENCES chat_messages(id) ON DELETE CASCADE")
+
+    _create_indexes_and_triggers()
@@ -1,50 +1,59 @@
+import uuid
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from jose import JWTError, jwt
-from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+from jose import JWTError
 from typing import Optional
 
 from app.database.base import get_db # Assuming get_db is here for session
 import app.models_db # Import the entire module to ensure all models are loaded
-from app.schemas.auth import TokenData # Your Pydantic model for token payload
+from app.core import auth_cache # Memoised token claims and user rows
 from app.core.config import settings # Access to SECRET_KEY, ALGORITHM
-from app.crud import user as user_crud # Access to get_user_by_id or similar
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login") # Adjust tokenUrl if needed
 oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login", auto_error=False)
 
-async def get_current_user(
+def _load_user(db: Session, user_id: uuid.UUID) -> Optional[app.models_db.User]:
+    """User (with profile) from the auth cache, falling back to one query on a miss."""
+    user = auth_cache.cached_user(user_id)
+    if user is None:
+        user = (
+            db.query(app.models_db.User)
+            .options(joinedload(app.models_db.User.profile))
+            .filter(app.models_db.User.id == user_id)
+            .first()
+        )
+        if user is not None:
+            auth_cache.remember_user(user)
+    return user
+
+def _user_id_from_token(token: str) -> Optional[uuid.UUID]:
+    try:
+        return auth_cache.user_id_from_claims(auth_cache.decode_claims(token))
+    except JWTError:
+        return None
+
+def get_current_user(
     db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
 ) -> app.models_db.User:
+    """
+    The one authentication dependency. Claims and the user row are cached
+    (app.core.auth_cache), so a repeat request does no auth queries; the
+    session from get_db only connects on a cache miss.
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
-        )
-        user_id: str = payload.get("sub") # Assuming 'sub' contains the user_id (UUID as string)
-        print(payload)
-        if user_id is None:
-            user_id = payload.get("user_id") # Fallback if 'user_id' is used directly
-        
-        # if user_id is None:
-        #     raise credentials_exception
-        token_data = TokenData(user_id=user_id, username=payload.get("username"), email =payload.get("email")) # username might be optional here
-    except (JWTError, ValidationError) as e:
-        print(f"Token decode/validation error: {e}")
+    user_id = _user_id_from_token(token)
+    if user_id is None:
         raise credentials_exception
-    
-    # Fetch user from DB
-    # Assuming user_id in token_data.user_id is the actual UUID string.
-    # Adjust user_crud.get_user_by_id if it expects a different ID format or method name.
-    # For example, if user_crud.get_user_by_id expects an int, you'd need to adjust.
-    # Based on your auth.py, user.id is a UUID. token_data.user_id is a string.
-    user = user_crud.get_user_by_id(db, user_id=str(token_data.user_id)) # Use get_user_by_id
 
+    user = _load_user(db, user_id)
     if user is None:
         raise credentials_exception
     return user
@@ -56,7 +65,7 @@ async def get_current_active_user(
     #     raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
-async def get_current_user_optional(
+def get_current_user_optional(
     db: Session = Depends(get_db), 
     token: Optional[str] = Depends(oauth2_scheme_optional)
 ) -> Optional[app.models_db.User]:
@@ -67,23 +76,10 @@ async def get_current_user_optional(
     if not token:
         return None
     
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            return None
-        token_data = TokenData(
-            user_id=user_id, 
-            username=payload.get("username"), 
-            email=payload.get("email")
-        )
-    except (JWTError, ValidationError):
-        return None
-    
-    user = user_crud.get_user_by_id(db, user_id=token_data.user_id)
-    if user is None:
+    user_id = _user_id_from_token(token)
+    if user_id is None:
         return None
-    return user
+    return _load_user(db, user_id)
 
 # If you need a superuser check:
 # async def get_current_active_superuser(
@@ -97,31 +93,28 @@ async def get_current_user_optional(
 
 async def get_current_user_from_token(
     token: str, 
-    db: Session
+    db: AsyncSession
 ) -> Optional[app.models_db.User]:
     """
     WebSocket authentication - validates token and returns user.
     Used for WebSocket connections where Depends() doesn't work.
+    Takes the async session the chat layer runs on (see get_async_db).
     """
     if not token:
         return None
     
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            user_id = payload.get("user_id")
-        
-        if user_id is None:
-            return None
-            
-        token_data = TokenData(
-            user_id=user_id, 
-            username=payload.get("username"), 
-            email=payload.get("email")
-        )
-    except (JWTError, ValidationError):
+    user_id = _user_id_from_token(token)
+    if user_id is None:
         return None
-    
-    user = user_crud.get_user_by_id(db, user_id=token_data.user_id)
+
+    user = auth_cache.cached_user(user_id)
+    if user is None:
+        result = await db.execute(
+            select(app.models_db.User)
+            .options(joinedload(app.models_db.User.profile))
+            .where(app.models_db.User.id == user_id)
+        )
+        user = result.scalar_one_or_none()
+        if user is not None:
+            auth_cache.remember_user(user)
     return user
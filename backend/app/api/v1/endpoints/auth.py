@@ -12,11 +12,10 @@ from app.schemas.user import UserCreate, UserPublic # Corrected import
 from app.core.auth import (
     create_access_token,
     hash_token,
-    verify_password,
-    get_password_hash,
     token_expire_minutes,
 )
-from app.crud.user import get_User_by_username, create_user
+from app.core.password_hashing import password_hasher
+from app.crud.user import get_User_by_username, get_user_by_id, create_user
 import secrets
 from app.crud.user import (
     get_User_by_email,
@@ -28,60 +27,81 @@ from app.crud.user import (
     get_user_by_google_id,
     generate_unique_username,
 )
-from app.core.email import send_email
+from app.core.email_worker import get_email_worker
+from app.crud.email_outbox import enqueue_email
+from app.database.executor import run_db
 from fastapi import BackgroundTasks
 import uuid
 from datetime import datetime, timedelta
 from fastapi.encoders import jsonable_encoder
 from app.core.config import settings
-import firebase_admin
-from firebase_admin import auth
-from firebase_admin import credentials
+from app.core.clients import get_firebase_auth
 
-# Initialize Firebase Admin SDK
-import os
+router = APIRouter()
 
-try:
-    key_path = os.path.join(os.path.dirname(__file__), "serviceAccountKey.json")
-    cred = credentials.Certificate(key_path)
-    firebase_admin.initialize_app(cred)
-except Exception as e:
-    print(f"Error initializing Firebase Admin SDK: {e}")
 
-router = APIRouter()
+def _save(db: Session, obj):
+    db.add(obj)
+    db.commit()
+    db.refresh(obj)
+    return obj
+
+
+def _released(db: Session, lookup, *args):
+    """Run a lookup, then give the connection back to the pool.
+
+    Used before awaiting bcrypt, so a queued hash does not pin a pooled
+    connection. Loaded attributes stay readable on the returned object.
+    """
+    try:
+        return lookup(db, *args)
+    finally:
+        db.close()
+
+
+def _finish_login(db: Session, user: User, new_hash, refresh_token: RefreshToken):
+    if new_hash:
+        # Stored hash was made with a different BCRYPT_ROUNDS; upgrade it in place
+        db.add(user)
+        user.password_hash = new_hash
+    db.add(refresh_token)
+    db.commit()
+
+
+def _reset_password(db: Session, user: User, password_hash: str, token: str):
+    db.add(user)
+    update_user_password(db, user, password_hash)
+    delete_password_reset_token(db, token)
 
 
 @router.post("/register", response_model=UserPublic) # Corrected response_model
 async def register(user: UserCreate, db: Session = Depends(get_db)):
-    if db.query(User).filter(User.username == user.username).first():
+    if await run_db(_released, db, get_User_by_username, user.username):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Username already taken"
         )
-    if db.query(User).filter(User.email == user.email).first():
+    if await run_db(_released, db, get_User_by_email, user.email):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Email already taken"
         )
 
-    hashed_pass = get_password_hash(user.password)
+    hashed_pass = await password_hasher.hash(user.password)
     db_user = User(
         username=user.username,
         email=user.email,
         password_hash=hashed_pass,
         role=user.role,
     )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    return db_user
+    return await run_db(_save, db, db_user)
 
 
 @router.post("/login", response_model=Token)
 async def login_for_access_token(
     request: LoginRequest, db: Session = Depends(get_db)
 ):
-    print(request)
-    user = get_User_by_email(db, email=request.email) # Removed await
-    if not user or not verify_password(request.password, user.password_hash):
+    user = await run_db(_released, db, get_User_by_email, request.email)
+    verified, new_hash = await password_hasher.verify(request.password, user.password_hash if user else None)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect password",
@@ -98,8 +118,7 @@ async def login_for_access_token(
     db_token = RefreshToken(
         user_id=user.id, token_hash=refresh_token_hash, expires_at=refresh_expires_at
     )
-    db.add(db_token)
-    db.commit()
+    await run_db(_finish_login, db, user, new_hash, db_token)
     return {
         "access_token": access_token,
         "refresh_token": refresh_token_raw,
@@ -108,7 +127,7 @@ async def login_for_access_token(
 
 
 @router.post("/refresh", response_model=Token)
-async def refresh_access_token(refresh_token: str, db: Session = Depends(get_db)):
+def refresh_access_token(refresh_token: str, db: Session = Depends(get_db)):
     token_hash = hash_token(refresh_token)
     db_token = (
         db.query(RefreshToken).filter(RefreshToken.token_hash == token_hash).first()
@@ -135,7 +154,7 @@ async def refresh_access_token(refresh_token: str, db: Session = Depends(get_db)
         "token_type": "bearer",
     }
 @router.post("/logout")
-async def logout(refresh_token:str,db:Session = Depends(get_db)):
+def logout(refresh_token:str,db:Session = Depends(get_db)):
     token_hash = hash_token(refresh_token)
     db_token = db.query(RefreshToken).filter(RefreshToken.token_hash == token_hash).first()
 
@@ -158,7 +177,7 @@ async def forgot_password(
     background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
 ):
-    user = db.query(User).filter(User.email == request.email).first()
+    user = await run_db(get_User_by_email, db, request.email)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
@@ -166,23 +185,18 @@ async def forgot_password(
 
     token = str(uuid.uuid4())
     expires_at = datetime.utcnow() + timedelta(hours=24)
-    create_password_reset_token(db, str(user.id), token, expires_at)
-    print(f"Password reset token created, token: {token} user_id: {str(user.id)}")
+    await run_db(create_password_reset_token, db, str(user.id), token, expires_at)
 
+    # Delivered by the outbox worker (retries included); the request only waits for the INSERT
     reset_link = f"{settings.FRONTEND_URL}/reset-password?token={token}&user_id={str(user.id)}"
-    email_sent = await send_email(user.email, "Password Reset Request", f"This is a system generated mail to change your password for your Athlytiq account.\nClick this link to reset your password: {reset_link}")
-    if email_sent:
-        return {"message": "Password reset email sent successfully."}
-    else:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to send password reset email. Please try again later."
-        )
+    await run_db(enqueue_email, db, user.email, "Password Reset Request", f"This is a system generated mail to change your password for your Athlytiq account.\nClick this link to reset your password: {reset_link}")
+    get_email_worker().notify()
+    return {"message": "Password reset email sent successfully."}
 
 
 @router.post("/reset-password")
 async def reset_password(request: PasswordReset, db: Session = Depends(get_db)):
-    token = get_password_reset_token(db, request.token)
+    token = await run_db(_released, db, get_password_reset_token, request.token)
     if not token:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid token"
@@ -192,22 +206,21 @@ async def reset_password(request: PasswordReset, db: Session = Depends(get_db)):
             status_code=status.HTTP_400_BAD_REQUEST, detail="Token expired"
         )
 
-    user = db.query(User).filter(User.id == token.user_id).first()
+    user = await run_db(_released, db, get_user_by_id, token.user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
 
-    hashed_password = get_password_hash(request.password)
-    update_user_password(db, user, hashed_password)
-    delete_password_reset_token(db, request.token)
+    hashed_password = await password_hasher.hash(request.password)
+    await run_db(_reset_password, db, user, hashed_password, request.token)
     return {"message": "Password reset successfully"}
 
 
 @router.post("/google-login", response_model=Token)
-async def google_login(request: GoogleOAuthToken, db: Session = Depends(get_db)):
+def google_login(request: GoogleOAuthToken, db: Session = Depends(get_db)):
     try:
-        decoded_token = auth.verify_id_token(request.token)
+        decoded_token = get_firebase_auth().verify_id_token(request.token)
         uid = decoded_token["uid"]
         email = decoded_token["email"]
         name = decoded_token.get("name", email.split('@')[0]) # Use email prefix as name if not provided
@@ -19,7 +19,7 @@ router = APIRouter()
 # ===================================================================
 
 @router.get("/challenges", response_model=ChallengeListResponse)
-async def get_challenges(
+def get_challenges(
     skip: int = Query(0, ge=0, description="Number of challenges to skip"),
     limit: int = Query(20, ge=1, le=100, description="Number of challenges to return"),
     activity_type: Optional[ActivityTypeEnum] = Query(None, description="Filter by activity type"),
@@ -46,13 +46,11 @@ async def get_challenges(
     # Convert to response format with user participation info
     challenge_list = []
     for challenge in challenges:
-        # Only check participation if user is authenticated
+        # Participants are eager-loaded by get_challenges; no per-challenge query
         participation = None
         if current_user:
-            participation = crud_challenges.get_user_participation(
-                db=db,
-                challenge_id=str(challenge.id),
-                user_id=str(current_user.id)
+            participation = next(
+                (p for p in challenge.participants if p.user_id == current_user.id), None
             )
         
         # Count active participants
@@ -98,7 +96,7 @@ async def get_challenges(
     )
 
 @router.get("/challenges/{challenge_id}", response_model=Challenge)
-async def get_challenge(
+def get_challenge(
     challenge_id: str,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
@@ -165,7 +163,7 @@ async def get_challenge(
 
 
 @router.post("/challenges", response_model=Challenge)
-async def create_challenge(
+def create_challenge(
     challenge: ChallengeCreate,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
@@ -206,7 +204,7 @@ async def create_challenge(
     return Challenge(**challenge_response)
 """ 
 @router.post("/challenges", response_model=Challenge)
-async def create_challenge(
+def create_challenge(
     challenge: ChallengeCreate,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
@@ -244,7 +242,7 @@ async def create_challenge(
     return Challenge(**challenge_dict)
 
 @router.put("/challenges/{challenge_id}", response_model=Challenge)
-async def update_challenge(
+def update_challenge(
     challenge_id: str,
     challenge_update: ChallengeUpdate,
     db: Session = Depends(get_db),
@@ -293,7 +291,7 @@ async def update_challenge(
     return Challenge(**challenge_dict)
  """
 @router.delete("/challenges/{challenge_id}")
-async def delete_challenge(
+def delete_challenge(
     challenge_id: str,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
@@ -318,7 +316,7 @@ async def delete_challenge(
 # ===================================================================
 
 @router.post("/challenges/{challenge_id}/join", response_model=ChallengeParticipant)
-async def join_challenge(
+def join_challenge(
     challenge_id: str,
     request: JoinChallengeRequest,
     db: Session = Depends(get_db),
@@ -354,7 +352,7 @@ async def join_challenge(
     return ChallengeParticipant(**participant_dict)
 
 @router.post("/challenges/{challenge_id}/leave")
-async def leave_challenge(
+def leave_challenge(
     challenge_id: str,
     request: LeaveChallengeRequest,
     db: Session = Depends(get_db),
@@ -376,7 +374,7 @@ async def leave_challenge(
     return {"message": "Left challenge successfully"}
 
 @router.put("/challenges/{challenge_id}/progress", response_model=ChallengeParticipant)
-async def update_progress(
+def update_progress(
     challenge_id: str,
     progress_update: UpdateProgressRequest,
     db: Session = Depends(get_db),
@@ -422,7 +420,7 @@ async def update_progress(
     return ChallengeParticipant(**participant_dict)
 
 @router.get("/challenges/{challenge_id}/participants", response_model=ChallengeParticipantsResponse)
-async def get_challenge_participants(
+def get_challenge_participants(
     challenge_id: str,
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
@@ -464,7 +462,7 @@ async def get_challenge_participants(
 # ===================================================================
 
 @router.get("/my-challenges", response_model=ChallengeListResponse)
-async def get_my_challenges(
+def get_my_challenges(
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
     participant_status: Optional[ParticipantStatusEnum] = Query(None),
@@ -527,7 +525,7 @@ async def get_my_challenges(
     )
 
 @router.get("/my-created-challenges", response_model=ChallengeListResponse)
-async def get_my_created_challenges(
+def get_my_created_challenges(
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
     db: Session = Depends(get_db),
@@ -585,7 +583,7 @@ async def get_my_created_challenges(
 # ===================================================================
 
 @router.get("/challenge-stats", response_model=ChallengeStatsResponse)
-async def get_challenge_stats(
+def get_challenge_stats(
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
@@ -1,9 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, Path, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union
 from uuid import UUID
+from datetime import datetime
+import json
 
-from app.database.base import get_db
+from app.core.config import settings
+from app.core.cursors import decode_cursor
+from app.database.base import async_session_scope, get_async_db
 from app.dependencies import get_current_user
 from app.models_db import User
 from app.schemas.chat import (
@@ -18,7 +23,7 @@ router = APIRouter(prefix="/chat", tags=["chat"])
 async def get_user_chat_rooms(
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get all chat rooms for the current user"""
@@ -31,10 +36,44 @@ async def get_user_chat_rooms(
             detail=f"Failed to fetch chat rooms: {str(e)}"
         )
 
+@router.get("/sync")
+async def sync_changes(
+    since: Optional[str] = Query(None, description="next_cursor from the previous sync; omit for the full history"),
+    current_user: User = Depends(get_current_user)
+):
+    """Stream every change across the user's rooms since a cursor (delta sync).
+
+    The body is newline-delimited JSON: one {"type", "room_id", "data"}
+    object per change (message, reaction, reaction_removed, read_state), in
+    the order they were made, then {"type": "sync_state", "next_cursor",
+    "has_more"}. Apply changes as upserts by id; with has_more, call again
+    with next_cursor.
+    """
+    if since:
+        try:
+            decode_cursor(since, int, int)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return StreamingResponse(_stream_changes(current_user.id, since), media_type="application/x-ndjson")
+
+async def _stream_changes(user_id: UUID, cursor: Optional[str]):
+    # A session per batch: a slow reader holds no connection between batches
+    sent, has_more = 0, True
+    while has_more and sent < settings.CHAT_SYNC_MAX_CHANGES:
+        async with async_session_scope() as db:
+            batch = await chat_crud.get_changes_since(
+                db, user_id, cursor, min(settings.CHAT_SYNC_BATCH_SIZE, settings.CHAT_SYNC_MAX_CHANGES - sent)
+            )
+        cursor, has_more = batch['next_cursor'], batch['has_more']
+        sent += len(batch['changes'])
+        if batch['changes']:
+            yield "\n".join(batch['changes']) + "\n"
+    yield json.dumps({"type": "sync_state", "next_cursor": cursor, "has_more": has_more}) + "\n"
+
 @router.post("/rooms/direct", response_model=Dict[str, Any])
 async def create_direct_chat(
     other_user_id: UUID,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Create or get existing direct chat room with another user"""
@@ -63,7 +102,7 @@ async def create_direct_chat(
 @router.post("/rooms/group", response_model=Dict[str, Any])
 async def create_group_chat(
     room_data: ChatRoomCreate,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Create a new group chat room"""
@@ -100,7 +139,7 @@ async def create_group_chat(
 @router.get("/rooms/{room_id}", response_model=Dict[str, Any])
 async def get_chat_room(
     room_id: UUID = Path(...),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get detailed information about a specific chat room"""
@@ -118,20 +157,33 @@ async def get_chat_room(
             detail=f"Failed to fetch chat room: {str(e)}"
         )
 
-@router.get("/rooms/{room_id}/messages", response_model=List[Dict[str, Any]])
+@router.get("/rooms/{room_id}/messages", response_model=Union[Dict[str, Any], List[Dict[str, Any]]])
 async def get_room_messages(
     room_id: UUID = Path(...),
-    before_message_id: Optional[UUID] = Query(None),
+    cursor: Optional[str] = Query(None, description="older_cursor or newer_cursor from a previous page"),
+    direction: str = Query("older", pattern="^(older|newer)$"),
+    before_message_id: Optional[UUID] = Query(None, deprecated=True),
     limit: int = Query(50, ge=1, le=100),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get messages for a chat room with pagination"""
+    """Get a page of messages for a chat room (keyset cursor pagination)
+
+    A request paging with the deprecated before_message_id (and no cursor)
+    gets the bare list of messages, as before cursors existed.
+    """
+    if cursor:
+        try:
+            decode_cursor(cursor, datetime, UUID)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     try:
-        messages = await chat_crud.get_room_messages(
-            db, room_id, current_user.id, before_message_id, limit
+        page = await chat_crud.get_room_messages(
+            db, room_id, current_user.id, cursor, direction, limit, before_message_id
         )
-        return messages
+        if before_message_id and not cursor:
+            return page['messages']
+        return page
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -147,7 +199,7 @@ async def get_room_messages(
 async def send_message(
     room_id: UUID = Path(...),
     message_data: MessageCreate = ...,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Send a message to a chat room"""
@@ -175,7 +227,7 @@ async def send_message(
 async def mark_messages_as_read(
     room_id: UUID = Path(...),
     message_ids: Optional[List[UUID]] = None,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Mark messages as read in a chat room"""
@@ -202,10 +254,34 @@ async def mark_messages_as_read(
             detail=f"Failed to mark messages as read: {str(e)}"
         )
 
+# Declared before /messages/{message_id}, which would otherwise match "search"
+@router.get("/messages/search", response_model=Dict[str, Any])
+async def search_messages(
+    q: str = Query(..., min_length=1, max_length=200, description="Words to find; quotes, OR and -word work as in web search"),
+    room_id: Optional[UUID] = Query(None, description="Search only this room"),
+    cursor: Optional[str] = Query(None, description="next_cursor from a previous page"),
+    limit: int = Query(20, ge=1, le=50),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Search the messages of the user's rooms, best match first"""
+    if cursor:
+        try:
+            decode_cursor(cursor, float, datetime, UUID)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    try:
+        return await chat_crud.search_messages(db, current_user.id, q, room_id, cursor, limit)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to search messages: {str(e)}"
+        )
+
 @router.get("/messages/{message_id}", response_model=Dict[str, Any])
 async def get_message_details(
     message_id: UUID = Path(...),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get detailed information about a specific message"""
@@ -229,7 +305,7 @@ async def update_room_participants(
     room_id: UUID = Path(...),
     action: str = Query(..., pattern="^(add|remove|promote|demote)$"),
     user_ids: List[UUID] = ...,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Add/remove participants or change their roles in a group chat"""
@@ -252,7 +328,7 @@ async def update_room_settings(
     room_id: UUID = Path(...),
     is_muted: Optional[bool] = None,
     is_pinned: Optional[bool] = None,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Update user's settings for a specific chat room"""
@@ -279,7 +355,7 @@ async def update_room_settings(
 @router.delete("/rooms/{room_id}")
 async def leave_or_delete_room(
     room_id: UUID = Path(...),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Leave a chat room (or delete if you're the owner of a group chat)"""
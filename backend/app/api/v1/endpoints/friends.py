@@ -3,13 +3,14 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional, Dict, Any
 from uuid import UUID
 
-from app.database.base import get_db
+from app.database.base import get_async_db
 from app.dependencies import get_current_user
 from app.models_db import User
 from app.schemas.chat import (
     FriendRequestCreate, FriendRequestResponse, UserSearchResult
 )
 from app.crud.friends_crud import friends_crud
+from app.websocket.chat_websocket import presence
 
 router = APIRouter(prefix="/friends", tags=["friends"])
 
@@ -19,7 +20,7 @@ async def get_friends_list(
     online_only: bool = Query(False),
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get current user's friends list"""
@@ -40,7 +41,7 @@ async def get_friend_requests(
     status_filter: Optional[str] = Query(None, pattern="^(pending|accepted|rejected|blocked)$"),
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get friend requests (received, sent, or all)"""
@@ -59,7 +60,7 @@ async def get_friend_requests(
 async def send_friend_request(
     receiver_id: UUID,
     message: Optional[str] = None,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Send a friend request to another user"""
@@ -83,7 +84,7 @@ async def send_friend_request(
 async def respond_to_friend_request(
     request_id: UUID = Path(...),
     accept: bool = ...,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Accept or reject a friend request"""
@@ -91,6 +92,8 @@ async def respond_to_friend_request(
         request = await friends_crud.respond_to_friend_request(
             db, request_id, current_user.id, accept
         )
+        if accept:
+            presence.forget_friends(current_user.id, request.get('sender_id'))
         return {
             "message": f"Friend request {'accepted' if accept else 'rejected'}",
             "request": request
@@ -109,7 +112,7 @@ async def respond_to_friend_request(
 @router.get("/requests/{request_id}", response_model=Dict[str, Any])
 async def get_friend_request_details(
     request_id: UUID = Path(...),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get detailed information about a specific friend request"""
@@ -132,7 +135,7 @@ async def get_friend_request_details(
 @router.delete("/requests/{request_id}")
 async def cancel_friend_request(
     request_id: UUID = Path(...),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Cancel a sent friend request"""
@@ -152,12 +155,13 @@ async def cancel_friend_request(
 @router.delete("/{friend_id}")
 async def remove_friend(
     friend_id: UUID = Path(...),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Remove a friend (unfriend)"""
     try:
         success = await friends_crud.remove_friend(db, current_user.id, friend_id)
+        presence.forget_friends(current_user.id, friend_id)
         
         if success:
             return {"message": "Friend removed successfully"}
@@ -177,7 +181,7 @@ async def search_users(
     q: str = Query(..., min_length=2),
     exclude_friends: bool = Query(False),
     limit: int = Query(20, ge=1, le=50),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Search for users to add as friends"""
@@ -195,12 +199,13 @@ async def search_users(
 @router.post("/block/{user_id}")
 async def block_user(
     user_id: UUID = Path(...),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Block a user"""
     try:
         success = await friends_crud.block_user(db, current_user.id, user_id)
+        presence.forget_friends(current_user.id, user_id)
         
         if success:
             return {"message": "User blocked successfully"}
@@ -223,7 +228,7 @@ async def block_user(
 @router.delete("/block/{user_id}")
 async def unblock_user(
     user_id: UUID = Path(...),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Unblock a user"""
@@ -247,7 +252,7 @@ async def unblock_user(
 async def get_blocked_users(
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get list of blocked users"""
@@ -266,7 +271,7 @@ async def get_blocked_users(
 @router.get("/{friend_id}", response_model=Dict[str, Any])
 async def get_friend_details(
     friend_id: UUID = Path(...),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get detailed information about a specific friend"""
@@ -294,7 +299,7 @@ async def get_friend_details(
 async def get_mutual_friends(
     friend_id: UUID = Path(...),
     limit: int = Query(20, ge=1, le=50),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get mutual friends with another user"""
@@ -0,0 +1,58 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import PlainTextResponse
+
+from app.core.config import settings
+from app.database.base import get_pool_stats
+from app.database.chat_partitions import chat_partitions
+from app.core.email_worker import get_email_worker
+from app.core.inbox_cache import inbox_cache
+from app.core.password_hashing import password_hasher
+from app.middleware.observability import metrics
+from app.websocket.chat_websocket import heartbeat, manager, presence, read_receipts, typing_tracker
+from app.websocket.outbound import fanout_metrics
+
+### Operational endpoints, hidden from the public docs.
+### `router` is mounted at /internal; `metrics_router` serves /metrics.
+
+def require_internal_token(x_internal_token: Optional[str] = Header(None)):
+    """Guard /internal/* and /metrics with settings.INTERNAL_API_TOKEN.
+
+    Without a token the endpoints do not exist (404), unless DEBUG is set.
+    """
+    if not settings.INTERNAL_API_TOKEN:
+        if not settings.DEBUG:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    elif x_internal_token != settings.INTERNAL_API_TOKEN:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+
+router = APIRouter(dependencies=[Depends(require_internal_token)])
+metrics_router = APIRouter(dependencies=[Depends(require_internal_token)])
+
+@router.get("/db/pool")
+def read_pool_stats():
+    """Live connection pool stats for this worker (checked out, overflow, wait histogram)."""
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "engines": get_pool_stats(),
+    }
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    """Per-route request metrics, password hashing pool, email outbox, WebSocket connections, heartbeats, fan-out, broker, presence, typing, read-receipt, inbox cache and chat partition stats (Prometheus text)."""
+    return (
+        metrics.render_prometheus()
+        + password_hasher.render_prometheus()
+        + get_email_worker().render_prometheus()
+        + manager.render_prometheus()
+        + heartbeat.render_prometheus()
+        + fanout_metrics.render_prometheus()
+        + manager.broker.render_prometheus()
+        + presence.render_prometheus()
+        + typing_tracker.render_prometheus()
+        + read_receipts.render_prometheus()
+        + inbox_cache.render_prometheus()
+        + chat_partitions.render_prometheus()
+    )
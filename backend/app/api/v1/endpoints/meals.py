@@ -5,7 +5,8 @@ from uuid import UUID
 
 from app.schemas.meal import MealCreate, MealInDB
 from app.crud import meal_crud
-from app.api.dependencies import get_db, get_current_user
+from app.api.dependencies import get_current_user
+from app.database.base import get_async_db
 from app.models_db import User
 
 router = APIRouter()
@@ -15,7 +16,7 @@ router = APIRouter()
 @router.post("/", response_model=MealInDB, status_code=status.HTTP_201_CREATED)
 async def create_meal_endpoint(
     meal: MealCreate,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Create a new meal entry for the current user."""
@@ -24,7 +25,7 @@ async def create_meal_endpoint(
 @router.get("/{meal_id}", response_model=MealInDB)
 async def read_meal_endpoint(
     meal_id: UUID,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Retrieve a specific meal by its ID."""
@@ -39,7 +40,7 @@ async def read_meal_endpoint(
 async def read_my_meals_endpoint(
     skip: int = 0,
     limit: int = 100,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Retrieve all meal entries for the current user."""
@@ -51,7 +52,7 @@ async def read_my_meals_endpoint(
 async def update_meal_endpoint(
     meal_id: UUID,
     meal_update: MealCreate,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Update an existing meal entry."""
@@ -69,7 +70,7 @@ async def update_meal_endpoint(
 @router.delete("/{meal_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_meal_endpoint(
     meal_id: UUID,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Delete a meal entry."""
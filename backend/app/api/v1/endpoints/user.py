@@ -1,38 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status,UploadFile,File
-from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from typing import List
-from jose import JWTError, jwt
 from sqlalchemy.orm import joinedload
 
 from app.database.base import get_db
 from app.models_db import User
 from app.schemas.user import UserInDB, UserPublic
-from app.core.auth import secret_key, algo
+from app.api.dependencies import get_current_user
 from app.crud.user import get_Users, get_User_by_email, get_User_by_username
 from app.crud.crud_profile import update_profile_picture
-import cloudinary.uploader
-
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/v1/auth/login")
-
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(token, secret_key, algorithms=[algo])
-        user_id: str = payload.get("user_id")
-        if user_id is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    user = db.query(User).options(joinedload(User.profile)).filter(User.id == user_id).first()
-    # print(user.profile)
-    if user is None:
-        raise credentials_exception
-    return user
+from app.core.clients import get_cloudinary_uploader
 
 router = APIRouter()
 
@@ -49,7 +26,7 @@ async def read_users_me(current_user: User = Depends(get_current_user)):
     return current_user
 
 @router.get("/{user_id}", response_model=UserPublic)
-async def get_user_by_id(user_id: str, db: Session = Depends(get_db)):
+def get_user_by_id(user_id: str, db: Session = Depends(get_db)):
     """Get user profile by user ID"""
     try:
         user = db.query(User).options(joinedload(User.profile)).filter(User.id == user_id).first()
@@ -68,7 +45,7 @@ async def get_user_by_id(user_id: str, db: Session = Depends(get_db)):
         )
 
 @router.post("/upload-pfp",summary="Upload a profile picture")
-async def upload_profile_picture(
+def upload_profile_picture(
     file:UploadFile=File(...),
     db:Session = Depends(get_db),
     current_user = Depends(get_current_user)
@@ -77,7 +54,7 @@ async def upload_profile_picture(
         raise HTTPException(status_code=400, detail="Invalid file type. Must be an image.")
     
     try:
-        upload_result = cloudinary.uploader.upload(
+        upload_result = get_cloudinary_uploader().upload(
             file.file,
             folder="profile_picture",
             use_filename=True,
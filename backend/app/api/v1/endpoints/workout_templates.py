@@ -19,7 +19,7 @@ router = APIRouter()
 
 
 @router.get("/", response_model=WorkoutTemplateListResponse)
-async def get_workout_templates(
+def get_workout_templates(
     author: Optional[str] = Query(None, description="Filter by author (e.g., 'Ronnie Coleman')"),
     difficulty_level: Optional[str] = Query(None, description="Filter by difficulty level"),
     muscle_groups: Optional[str] = Query(None, description="Filter by muscle groups (comma-separated)"),
@@ -82,7 +82,7 @@ async def get_workout_templates(
 
 
 @router.get("/{template_id}", response_model=WorkoutTemplateDetailResponse)
-async def get_workout_template(
+def get_workout_template(
     template_id: UUID,
     db: Session = Depends(get_db)
 ):
@@ -104,7 +104,7 @@ async def get_workout_template(
 
 
 @router.post("/{template_id}/import", response_model=ImportTemplateResponse)
-async def import_workout_template(
+def import_workout_template(
     template_id: UUID,
     import_request: ImportTemplateRequest,
     current_user: User = Depends(get_current_user),
@@ -167,7 +167,7 @@ async def import_workout_template(
 
 
 @router.get("/authors/list")
-async def get_template_authors(db: Session = Depends(get_db)):
+def get_template_authors(db: Session = Depends(get_db)):
     """
     Get list of all available authors with template counts.
     """
@@ -195,7 +195,7 @@ async def get_template_authors(db: Session = Depends(get_db)):
 
 
 @router.get("/tags/list")
-async def get_template_tags(db: Session = Depends(get_db)):
+def get_template_tags(db: Session = Depends(get_db)):
     """
     Get list of all available tags.
     """
@@ -215,7 +215,7 @@ async def get_template_tags(db: Session = Depends(get_db)):
 
 
 @router.get("/muscle-groups/list")
-async def get_template_muscle_groups(db: Session = Depends(get_db)):
+def get_template_muscle_groups(db: Session = Depends(get_db)):
     """
     Get list of all available muscle groups.
     """
@@ -15,7 +15,15 @@ print(secret_key) # This can be removed or adapted if still needed for debugging
 algo = os.getenv("ALGORITHM", "HS256") # Use settings.ALGORITHM
 token_expire_minutes = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30000)) # Use settings.ACCESS_TOKEN_EXPIRE_MINUTES
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# min = max = default rounds, so hashes made at any other cost report needs_update
+# and are replaced on the next successful login (see app.core.password_hashing).
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
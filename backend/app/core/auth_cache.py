@@ -0,0 +1,148 @@
+"""Caches behind the shared auth dependency (app.api.dependencies).
+
+Decoded JWT claims are memoised per token until the token expires (capped at
+AUTH_TOKEN_CACHE_TTL), and users with their profile are kept for
+AUTH_USER_CACHE_TTL seconds keyed by user id, so an authenticated request
+normally costs no database round trip for auth.
+
+The user cache stores column snapshots, never live ORM objects. Each request
+gets its own detached User (profile attached) that behaves like a freshly
+loaded row: `db.add(current_user)` re-attaches it without an INSERT. ORM
+updates to a User or Profile evict the entry in this worker; other workers
+pick the change up within the TTL.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from jose import jwt
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.core.config import settings
+from app.models_db import Profile, User
+
+
+class TTLCache:
+    """Thread-safe LRU with per-entry expiry (sync handlers run in the threadpool)."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[1] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return item[0]
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """Like get(), without counting a hit or miss or refreshing recency."""
+        with self._lock:
+            item = self._data.get(key)
+            return item[0] if item is not None and item[1] > time.monotonic() else None
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+token_claims = TTLCache(settings.AUTH_CACHE_SIZE, settings.AUTH_TOKEN_CACHE_TTL)
+user_snapshots = TTLCache(settings.AUTH_CACHE_SIZE, settings.AUTH_USER_CACHE_TTL)
+
+
+def decode_claims(token: str) -> Dict[str, Any]:
+    """jwt.decode, memoised per token. Raises JWTError for invalid or expired tokens."""
+    claims = token_claims.get(token)
+    if claims is None:
+        claims = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        exp = claims.get("exp")
+        token_claims.set(token, claims, exp - time.time() if exp is not None else None)
+    return claims
+
+
+def user_id_from_claims(claims: Dict[str, Any]) -> Optional[uuid.UUID]:
+    """Access tokens carry the id in `user_id`; older ones only in `sub`."""
+    for key in ("user_id", "sub"):
+        try:
+            return uuid.UUID(str(claims.get(key)))
+        except ValueError:
+            continue
+    return None
+
+
+def _columns(obj) -> Dict[str, Any]:
+    return {attr.key: getattr(obj, attr.key) for attr in inspect(obj).mapper.column_attrs}
+
+
+def _detached(model, values: Dict[str, Any]):
+    obj = model(**values)
+    make_transient_to_detached(obj)
+    return obj
+
+
+def cached_user(user_id) -> Optional[User]:
+    """A fresh detached User for `user_id` from the cache, or None on a miss."""
+    snapshot = user_snapshots.get(str(user_id))
+    if snapshot is None:
+        return None
+    user_values, profile_values = snapshot
+    user = _detached(User, user_values)
+    profile = _detached(Profile, profile_values) if profile_values is not None else None
+    set_committed_value(user, "profile", profile)
+    if profile is not None:
+        set_committed_value(profile, "user", user)
+    return user
+
+
+def remember_user(user: User):
+    """Snapshot a loaded User (profile must already be loaded)."""
+    profile = user.profile
+    user_snapshots.set(str(user.id), (_columns(user), _columns(profile) if profile is not None else None))
+
+
+def invalidate_user(user_id):
+    user_snapshots.pop(str(user_id))
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _evict_user(mapper, connection, target):
+    invalidate_user(target.id)
+
+
+@event.listens_for(Profile, "after_insert")
+@event.listens_for(Profile, "after_update")
+@event.listens_for(Profile, "after_delete")
+def _evict_profile_owner(mapper, connection, target):
+    invalidate_user(target.user_id)
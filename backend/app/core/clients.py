@@ -0,0 +1,40 @@
+"""Lazily initialised third-party clients.
+
+Firebase Admin and Cloudinary are only needed by a couple of endpoints, so
+they are imported and configured on first use instead of at app import.
+This keeps worker boot (and every --reload) from paying for them.
+"""
+import os
+from functools import lru_cache
+
+from app.core.config import settings
+
+FIREBASE_KEY_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "api", "v1", "endpoints", "serviceAccountKey.json"
+)
+
+
+@lru_cache(maxsize=1)
+def get_firebase_auth():
+    """Return the firebase_admin.auth module, initialising the default app once."""
+    import firebase_admin
+    from firebase_admin import auth, credentials
+
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app(credentials.Certificate(FIREBASE_KEY_PATH))
+    return auth
+
+
+@lru_cache(maxsize=1)
+def get_cloudinary_uploader():
+    """Return cloudinary.uploader with credentials from Settings applied."""
+    import cloudinary
+    import cloudinary.uploader
+
+    cloudinary.config(
+        cloud_name=settings.CLOUDINARY_CLOUD_NAME,
+        api_key=settings.CLOUDINARY_API_KEY,
+        api_secret=settings.CLOUDINARY_API_SECRET,
+        secure=True
+    )
+    return cloudinary.uploader
@@ -1,3 +1,5 @@
+from typing import Dict
+
 from pydantic_settings import BaseSettings
 from pydantic import ValidationError
 class Settings(BaseSettings):
@@ -12,9 +14,68 @@ class Settings(BaseSettings):
     FRONTEND_URL: str
     EMAIL_HOST: str
     EMAIL_PORT: int
+    EMAIL_USE_TLS: bool = True # STARTTLS after connecting
+    # Email outbox worker (app.core.email_worker)
+    EMAIL_OUTBOX_ENABLED: bool = True
+    EMAIL_OUTBOX_BATCH_SIZE: int = 20
+    EMAIL_OUTBOX_POLL_INTERVAL: float = 2.0 # seconds between polls when idle
+    EMAIL_OUTBOX_MAX_ATTEMPTS: int = 6
+    EMAIL_OUTBOX_RETRY_BASE: float = 30.0 # seconds; doubles per attempt, capped at 1h
     CLOUDINARY_CLOUD_NAME:str
     CLOUDINARY_API_KEY:str
     CLOUDINARY_API_SECRET:str
+    # Database pool (per engine, per uvicorn worker). Budget Postgres
+    # connections as workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) per engine.
+    DB_SESSION_MODE: str = "async" # "async" (asyncpg) or "sync" (threadpool-wrapped psycopg2)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 5
+    DB_POOL_TIMEOUT: float = 10.0 # seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = 1800 # seconds; keeps us under Supabase/pgbouncer idle cutoffs
+    DB_STATEMENT_TIMEOUT_MS: int = 30000 # 0 disables
+    DB_THREADPOOL_SIZE: int = 0 # threads for run_db calls; 0 = 2 * (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+    INTERNAL_API_TOKEN: str = "" # /internal/* and /metrics require X-Internal-Token; unset = 404 unless DEBUG
+    DEBUG: bool = False # adds x-db-queries / x-db-time-ms / x-db-max-repeat response headers
+    DB_REPEATED_QUERY_THRESHOLD: int = 5 # same statement this many times in one request = likely N+1; 0 disables
+    # Auth caches (app.core.auth_cache); 0 TTL disables a cache
+    AUTH_TOKEN_CACHE_TTL: int = 300 # seconds a decoded token is reused (never past its exp)
+    AUTH_USER_CACHE_TTL: int = 60 # seconds a user row may be served stale to other workers
+    AUTH_CACHE_SIZE: int = 10000 # entries per cache, per worker
+    # Chat room list cache (app.core.inbox_cache)
+    CHAT_INBOX_CACHE_TTL: int = 60 # seconds a user's room list may be served stale to other workers
+    CHAT_INBOX_CACHE_SIZE: int = 10000 # users whose room list is cached, per worker
+    # Chat delta sync (GET /api/v1/chat/sync)
+    CHAT_SYNC_BATCH_SIZE: int = 500 # changes read per query while streaming
+    CHAT_SYNC_MAX_CHANGES: int = 5000 # changes per response; the client follows next_cursor for the rest
+    # Chat message partitions (app.database.chat_partitions)
+    CHAT_PARTITION_MAINTENANCE_ENABLED: bool = True
+    CHAT_PARTITION_MONTHS_AHEAD: int = 3 # monthly chat_messages partitions created ahead of time
+    CHAT_PARTITION_INTERVAL: float = 3600.0 # seconds between maintenance runs
+    CHAT_ARCHIVE_AFTER_MONTHS: int = 0 # months kept in chat_messages before moving to chat_messages_archive; 0 disables
+    # Password hashing (app.core.password_hashing)
+    BCRYPT_ROUNDS: int = 12 # cost factor; stored hashes at another cost are rehashed on login
+    PASSWORD_HASH_WORKERS: int = 2 # concurrent bcrypt calls per worker process
+    PASSWORD_HASH_MAX_QUEUE: int = 64 # waiting calls beyond this get 503
+    # Rate limiting (app.middleware.rate_limit)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory" # "memory" (per worker) or "postgres" (shared across workers)
+    RATE_LIMIT_MAX_KEYS: int = 50000 # LRU cap on tracked (route group, client) buckets per worker
+    RATE_LIMITS: Dict[str, str] = {} # per-group overrides, e.g. {"auth": "5/60"} = 5 requests per 60s
+    # WebSocket fan-out (app.websocket.outbound)
+    WS_SEND_QUEUE_SIZE: int = 256 # frames queued per socket before typing events are shed / the client is dropped
+    WS_SLOW_CONSUMER_SECONDS: float = 10.0 # disconnect a socket whose oldest queued frame is older than this
+    WS_BROKER: str = "memory" # "memory" (single worker) or "postgres" (LISTEN/NOTIFY, delivers across workers/pods)
+    WS_PRESENCE_GRACE_SECONDS: float = 10.0 # a user whose last socket closed stays online this long (reconnect storms)
+    WS_PRESENCE_FLUSH_SECONDS: float = 5.0 # user_online_status is written in one batch this often
+    WS_PRESENCE_FRIENDS_TTL: int = 300 # seconds a user's friend list is cached for presence fan-out
+    WS_TYPING_TTL: float = 6.0 # a typing_start without a refresh expires after this many seconds
+    WS_TYPING_INTERVAL: float = 1.0 # minimum seconds between typing broadcasts per room
+    WS_READ_FLUSH_INTERVAL: float = 0.5 # message_read events per room and user are written as one batch this often
+    WS_MEMBERSHIP_TTL: float = 60.0 # seconds a socket's confirmed room membership lets send_message skip the participant check
+    WS_HEARTBEAT_INTERVAL: float = 25.0 # a socket quiet this long is sent {"type": "ping"}; 0 disables heartbeats and reaping
+    WS_HEARTBEAT_TIMEOUT: float = 60.0 # a socket with no frame from the client for this long is closed; 0 disables
+    WS_IDLE_TIMEOUT: float = 0.0 # close sockets that sent nothing but heartbeats for this long; 0 disables
+    WS_MAX_CONNECTIONS: int = 10000 # sockets per worker; more are refused with 1013; 0 disables
+    WS_MAX_CONNECTIONS_PER_USER: int = 10 # sockets per user and worker; a new one closes the oldest; 0 disables
     class Config:
         env_file = ".env"
         extra = "ignore"
@@ -0,0 +1,42 @@
+"""Opaque keyset-pagination cursors.
+
+A cursor is the sort key of a boundary row, e.g. ``(created_at, id)``,
+serialised as URL-safe base64 JSON. Clients pass it back unchanged; the
+server decodes it into the values for a ``(a, b) < (:a, :b)`` row
+comparison, so a page costs the same wherever it starts.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Tuple
+from uuid import UUID
+
+
+def encode_cursor(*values: Any) -> str:
+    """Serialise a sort key; datetimes and UUIDs become strings."""
+    raw = json.dumps(
+        [value.isoformat() if isinstance(value, datetime) else str(value) if isinstance(value, UUID) else value
+         for value in values],
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *types) -> Tuple[Any, ...]:
+    """Parse a cursor into values of `types` (datetime, UUID, int, float, str).
+
+    Raises ValueError for anything that is not a cursor of that shape.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(values, list) or len(values) != len(types):
+        raise ValueError("Invalid cursor")
+    try:
+        return tuple(
+            datetime.fromisoformat(value) if type_ is datetime else type_(value)
+            for type_, value in zip(types, values)
+        )
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
@@ -1,44 +1,113 @@
+"""Transactional email.
+
+Request handlers never talk to SMTP: they add a row to the email_outbox
+table (app.crud.email_outbox.enqueue_email) and return. The outbox worker
+(app.core.email_worker) delivers it through `SmtpTransport`, which keeps one
+SMTP connection open and reuses it across messages and batches.
+"""
+import asyncio
 import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+from typing import List, Optional, Sequence
+
 from app.core.config import settings
-# import logging
-async def send_email(to_email: str, subject: str, body: str):
-    smtp_user = settings.EMAIL_USERNAME
-    sender_email = settings.EMAIL_SENDER
-    smtp_pass = settings.EMAIL_PASSWORD
-    smtp_server = settings.EMAIL_HOST
-    smtp_port = settings.EMAIL_PORT
-
-    message = MIMEMultipart()
-    message["From"] = sender_email
+
+
+def build_message(to_email: str, subject: str, body: str, sender: Optional[str] = None) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = sender or settings.EMAIL_SENDER
     message["To"] = to_email
     message["Subject"] = subject
+    message.set_content(body)
+    return message
+
+
+class SmtpTransport:
+    """One reusable SMTP connection, driven from a single dedicated thread.
+
+    smtplib is blocking and not thread-safe, so every call runs on the same
+    one-thread executor. The connection is opened lazily, reopened once if the
+    server dropped it, and closed after `idle_timeout` seconds without use.
+    """
+
+    def __init__(self, host: str, port: int, username: str = "", password: str = "",
+                 use_tls: bool = True, timeout: float = 30.0, idle_timeout: float = 60.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.connections_opened = 0
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="smtp")
+
+    @classmethod
+    def from_settings(cls) -> "SmtpTransport":
+        return cls(
+            settings.EMAIL_HOST,
+            settings.EMAIL_PORT,
+            settings.EMAIL_USERNAME,
+            settings.EMAIL_PASSWORD,
+            use_tls=settings.EMAIL_USE_TLS,
+        )
+
+    def _connect(self) -> smtplib.SMTP:
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            smtp.starttls()
+        if self.username and self.password:
+            smtp.login(self.username, self.password)
+        self.connections_opened += 1
+        return smtp
+
+    def _close_sync(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except smtplib.SMTPException:
+                self._smtp.close()
+            except OSError:
+                pass
+            self._smtp = None
+
+    def _send_one(self, message: EmailMessage):
+        if self._smtp is None:
+            self._smtp = self._connect()
+        try:
+            self._smtp.send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            # Server closed an idle connection; reconnect once and retry
+            self._smtp = self._connect()
+            self._smtp.send_message(message)
+
+    def _send_batch_sync(self, messages: Sequence[EmailMessage]) -> List[Optional[Exception]]:
+        if self._smtp is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            self._close_sync()
+        results: List[Optional[Exception]] = []
+        for message in messages:
+            try:
+                self._send_one(message)
+                results.append(None)
+            except (smtplib.SMTPException, OSError) as e:
+                results.append(e)
+                if not isinstance(e, (smtplib.SMTPRecipientsRefused, smtplib.SMTPDataError)):
+                    self._close_sync()  # connection state unknown; start fresh for the next one
+        self._last_used = time.monotonic()
+        return results
+
+    async def send_batch(self, messages: Sequence[EmailMessage]) -> List[Optional[Exception]]:
+        """Send in order over the shared connection; one result (None or the error) per message."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._send_batch_sync, list(messages))
+
+    async def close_if_idle(self):
+        if self._smtp is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            await self.close()
 
-    message.attach(MIMEText(body, "plain"))
-
-    # logger = logging.getLogger("app.core.email")
-
-    try:
-        print(f"Connecting to SMTP server {smtp_server}:{smtp_port}")
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            print("Connected to SMTP server successfully.")
-            starttls()
-            print("Started TLS session with SMTP ")
-            login(smtp_user, smtp_pass)
-            print("Logged in to SMTP server successfully.")
-            sendmail(sender_email, to_email, message.as_string())
-        print(f"Email sent successfully to {to_email}")
-        return True
-    except smtplib.SMTPAuthenticationError as e:
-        print(f"SMTP Authentication Error: Could not authenticate with the SMTP  Check username and password. Error: {e}")
-        return False
-    except smtplib.SMTPConnectError as e:
-        print(f"SMTP Connection Error: Could not connect to the SMTP  Check host and port. Error: {e}")
-        return False
-    except smtplib.SMTPException as e:
-        print(f"SMTP Error: An SMTP error occurred while sending email to {to_email}. Error: {e}")
-        return False
-    except Exception as e:
-        print(f"General Error: An unexpected error occurred while sending email to {to_email}. Error: {e}")
-        return False
+    async def close(self):
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._close_sync)
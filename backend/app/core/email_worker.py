@@ -0,0 +1,161 @@
+"""Background delivery of the email outbox.
+
+One asyncio task per process drains email_outbox in batches: claim up to
+EMAIL_OUTBOX_BATCH_SIZE due rows, send them over the shared SMTP connection,
+then mark them sent or schedule a retry with exponential backoff
+(EMAIL_OUTBOX_RETRY_BASE * 2**(attempt-1), capped at an hour). After
+EMAIL_OUTBOX_MAX_ATTEMPTS a row is marked failed. Table access goes through
+run_db; SKIP LOCKED claims make it safe to run in every uvicorn worker.
+
+`notify()` wakes the worker straight away after an enqueue in this process;
+otherwise it polls every EMAIL_OUTBOX_POLL_INTERVAL seconds.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from app.core.config import settings
+from app.core.email import SmtpTransport, build_message
+from app.crud import email_outbox as outbox_crud
+from app.database.base import SessionLocal
+from app.database.executor import run_db
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRY_DELAY = timedelta(hours=1)
+
+
+class EmailOutboxWorker:
+    def __init__(self, session_factory, transport: SmtpTransport, batch_size: int = 20,
+                 poll_interval: float = 2.0, max_attempts: int = 6, retry_base: float = 30.0,
+                 lease: timedelta = timedelta(minutes=5)):
+        self.session_factory = session_factory
+        self.transport = transport
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.lease = lease
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.batches = 0
+        self.delivery_seconds_sum = 0.0  # enqueue -> accepted by SMTP
+        self.delivery_seconds_max = 0.0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def retry_delay(self, attempts: int) -> timedelta:
+        return min(timedelta(seconds=self.retry_base * 2 ** (attempts - 1)), MAX_RETRY_DELAY)
+
+    def notify(self):
+        self._wakeup.set()
+
+    def _claim(self):
+        with self.session_factory() as db:
+            return outbox_crud.claim_batch(db, self.batch_size, self.lease)
+
+    def _record(self, sent_ids, failures):
+        with self.session_factory() as db:
+            outbox_crud.mark_sent(db, sent_ids)
+            for email_id, error, retry_in in failures:
+                outbox_crud.mark_failed(db, email_id, error, retry_in)
+
+    async def process_batch(self) -> int:
+        """Send one batch; returns how many rows were claimed."""
+        rows = await run_db(self._claim)
+        if not rows:
+            return 0
+        results = await self.transport.send_batch(
+            [build_message(row.to_email, row.subject, row.body) for row in rows]
+        )
+        now = datetime.now(timezone.utc)
+        sent_ids, failures = [], []
+        for row, error in zip(rows, results):
+            if error is None:
+                sent_ids.append(row.id)
+                created_at = row.created_at if row.created_at.tzinfo else row.created_at.replace(tzinfo=timezone.utc)
+                delivery = (now - created_at).total_seconds()
+                self.delivery_seconds_sum += delivery
+                self.delivery_seconds_max = max(self.delivery_seconds_max, delivery)
+            elif row.attempts >= self.max_attempts:
+                failures.append((row.id, repr(error), None))
+                logger.error(f"Giving up on email {row.id} to {row.to_email} after {row.attempts} attempts: {error}")
+            else:
+                failures.append((row.id, repr(error), self.retry_delay(row.attempts)))
+        await run_db(self._record, sent_ids, failures)
+        self.batches += 1
+        self.sent += len(sent_ids)
+        self.failed += sum(1 for failure in failures if failure[2] is None)
+        self.retried += sum(1 for failure in failures if failure[2] is not None)
+        return len(rows)
+
+    async def run(self):
+        while True:
+            try:
+                claimed = await self.process_batch()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.exception(f"Email outbox batch failed: {e}")
+                claimed = 0
+            if claimed >= self.batch_size:
+                continue  # probably more waiting
+            await self.transport.close_if_idle()
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run(), name="email-outbox")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.transport.close()
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# TYPE email_outbox_sent_total counter",
+            f"email_outbox_sent_total {self.sent}",
+            "# TYPE email_outbox_retried_total counter",
+            f"email_outbox_retried_total {self.retried}",
+            "# TYPE email_outbox_failed_total counter",
+            f"email_outbox_failed_total {self.failed}",
+            "# TYPE email_outbox_batches_total counter",
+            f"email_outbox_batches_total {self.batches}",
+            "# TYPE email_outbox_smtp_connections_total counter",
+            f"email_outbox_smtp_connections_total {self.transport.connections_opened}",
+            "# TYPE email_outbox_delivery_seconds_total counter",
+            f"email_outbox_delivery_seconds_total {self.delivery_seconds_sum:.6f}",
+            "# TYPE email_outbox_delivery_seconds_max gauge",
+            f"email_outbox_delivery_seconds_max {self.delivery_seconds_max:.6f}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+_worker: Optional[EmailOutboxWorker] = None
+
+
+def get_email_worker() -> EmailOutboxWorker:
+    """The process-wide worker, built from settings on first use."""
+    global _worker
+    if _worker is None:
+        _worker = EmailOutboxWorker(
+            SessionLocal,
+            SmtpTransport.from_settings(),
+            batch_size=settings.EMAIL_OUTBOX_BATCH_SIZE,
+            poll_interval=settings.EMAIL_OUTBOX_POLL_INTERVAL,
+            max_attempts=settings.EMAIL_OUTBOX_MAX_ATTEMPTS,
+            retry_base=settings.EMAIL_OUTBOX_RETRY_BASE,
+        )
+    return _worker
@@ -0,0 +1,142 @@
+"""Per-user chat inbox (room list) cache.
+
+The room list is loaded on every app open. The first INBOX_ROOMS rooms of
+a user's inbox are cached for CHAT_INBOX_CACHE_TTL seconds and kept current
+in place: ChatCRUD.send_message moves the room to the top with the new
+preview and bumps the other participants' unread counts, and
+mark_messages_as_read clears the reader's. Creating a room drops its
+participants' entries. Users with more rooms than that are not cached,
+since a message in a room past the cached window could not be placed.
+
+Updates only reach this worker's cache; other workers catch up within the
+TTL, as with the auth cache. The room -> users index is cleaned up when a
+user is forgotten, and swept of users whose entry expired or was evicted
+once per TTL.
+"""
+import time
+from typing import Any, Dict, List, Optional, Set
+
+from app.core.auth_cache import TTLCache
+from app.core.config import settings
+
+INBOX_ROOMS = 100  # rooms cached per user; the room list endpoint's max limit
+
+# Same previews as the update_chat_room_last_message trigger
+_PREVIEWS = {'image': '📷 Photo', 'file': '📎 File', 'location': '📍 Location'}
+
+
+def _inbox_order(room: Dict[str, Any]):
+    return bool(room['is_pinned']), room['last_message_at'] or room['created_at']
+
+
+class InboxCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.entries = TTLCache(maxsize, ttl)  # user_id -> rooms, in inbox order
+        # room_id -> users whose cached inbox lists it; may hold users whose entry expired until the next sweep
+        self.room_users: Dict[str, Set[str]] = {}
+        self.updates = 0
+        self._next_sweep = time.monotonic() + ttl
+
+    def get(self, user_id, skip: int, limit: int) -> Optional[List[Dict[str, Any]]]:
+        """A page of the cached inbox, or None if it is not cached or the page is past the window."""
+        if skip + limit > INBOX_ROOMS:
+            return None
+        rooms = self.entries.get(str(user_id))
+        if rooms is None:
+            return None
+        return [dict(room) for room in rooms[skip:skip + limit]]
+
+    def remember(self, user_id, rooms: List[Dict[str, Any]]):
+        """Cache a user's inbox loaded with limit INBOX_ROOMS + 1; a full window is not cached."""
+        if len(rooms) > INBOX_ROOMS:
+            return
+        if time.monotonic() >= self._next_sweep:
+            self.sweep()
+        user_id = str(user_id)
+        self._unlink(user_id)
+        self.entries.set(user_id, [dict(room) for room in rooms])
+        for room in rooms:
+            self.room_users.setdefault(str(room['id']), set()).add(user_id)
+
+    def forget(self, *user_ids):
+        for user_id in user_ids:
+            user_id = str(user_id)
+            self._unlink(user_id)
+            self.entries.pop(user_id)
+
+    def sweep(self) -> int:
+        """Drop users whose cached inbox expired or was evicted from room_users; returns how many."""
+        self._next_sweep = time.monotonic() + self.entries.ttl
+        live: Dict[str, bool] = {}
+        dropped = 0
+        for room_id, users in tuple(self.room_users.items()):
+            for user_id in tuple(users):
+                if user_id not in live:
+                    live[user_id] = self.entries.peek(user_id) is not None
+                if not live[user_id]:
+                    users.discard(user_id)
+                    dropped += 1
+            if not users:
+                del self.room_users[room_id]
+        return dropped
+
+    def _unlink(self, user_id: str):
+        for room in self.entries.peek(user_id) or ():
+            users = self.room_users.get(str(room['id']))
+            if users is not None:
+                users.discard(user_id)
+                if not users:
+                    del self.room_users[str(room['id'])]
+
+    def _cached_rooms(self, room_id: str):
+        users = self.room_users.get(room_id)
+        if not users:
+            return
+        for user_id in tuple(users):
+            rooms = self.entries.peek(user_id)
+            room = next((r for r in rooms if str(r['id']) == room_id), None) if rooms is not None else None
+            if room is None:
+                users.discard(user_id)
+                continue
+            yield user_id, rooms, room
+        if not users:
+            del self.room_users[room_id]
+
+    def message_sent(self, message: Dict[str, Any]):
+        """Apply a new message to every cached inbox that lists its room."""
+        room_id, sender_id = str(message['room_id']), str(message['sender_id'])
+        message_type = str(getattr(message['message_type'], 'value', message['message_type']))
+        preview = _PREVIEWS.get(message_type, message['content'])
+        for user_id, rooms, room in self._cached_rooms(room_id):
+            room['last_message_at'] = message['created_at']
+            room['last_message_content'] = preview
+            room['last_message_sender_id'] = message['sender_id']
+            room['updated_at'] = message['created_at']
+            if user_id != sender_id:
+                room['unread_count'] = (room['unread_count'] or 0) + 1
+            rooms.sort(key=_inbox_order, reverse=True)
+            self.updates += 1
+
+    def room_read(self, room_id, user_id, unread_count: int = 0):
+        """The user read (part of) the room; `unread_count` is what is left (mark_messages_as_read)."""
+        rooms = self.entries.peek(str(user_id))
+        for room in rooms or ():
+            if str(room['id']) == str(room_id):
+                room['unread_count'] = unread_count
+                self.updates += 1
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# TYPE chat_inbox_cache_hits_total counter",
+            f"chat_inbox_cache_hits_total {self.entries.hits}",
+            "# TYPE chat_inbox_cache_misses_total counter",
+            f"chat_inbox_cache_misses_total {self.entries.misses}",
+            "# TYPE chat_inbox_cache_updates_total counter",
+            f"chat_inbox_cache_updates_total {self.updates}",
+            "# TYPE chat_inbox_cache_entries gauge",
+            f"chat_inbox_cache_entries {len(self.entries)}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+inbox_cache = InboxCache(settings.CHAT_INBOX_CACHE_SIZE, settings.CHAT_INBOX_CACHE_TTL)
@@ -0,0 +1,123 @@
+"""bcrypt hashing and verification off the event loop.
+
+A bcrypt call takes ~100-300 ms of CPU at cost 12. Calls run on a small
+dedicated thread pool (bcrypt releases the GIL) rather than on the event loop
+or the DB threadpool, so a burst of logins cannot stall WebSockets or starve
+queries. At most PASSWORD_HASH_WORKERS hashes run at once. Once
+PASSWORD_HASH_MAX_QUEUE calls are waiting, further callers get
+PasswordHasherBusy, which the app turns into a 503.
+
+The cost comes from BCRYPT_ROUNDS (see app.core.auth.pwd_context). A login
+whose stored hash uses a different cost returns a fresh hash for the caller
+to save.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+from app.core.auth import pwd_context
+from app.core.config import settings
+
+
+class PasswordHasherBusy(Exception):
+    """Too many hashes already queued; retry shortly."""
+
+
+class PasswordHasher:
+    def __init__(self, context: CryptContext, workers: int, max_queue: int):
+        self.context = context
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.in_flight = 0  # submitted and not finished (running + queued)
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.max_queue_depth = 0
+        self.wait_seconds_sum = 0.0
+        self.hash_seconds_sum = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return max(self.in_flight - self.running, 0)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, func, *args):
+        if self.queue_depth >= self.max_queue:
+            self.rejected += 1
+            raise PasswordHasherBusy()
+        submitted = time.perf_counter()
+
+        def work():
+            started = time.perf_counter()
+            with self._lock:
+                self.running += 1
+            try:
+                return func(*args)
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self.running -= 1
+                    self.completed += 1
+                    self.wait_seconds_sum += started - submitted
+                    self.hash_seconds_sum += finished - started
+
+        self.in_flight += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), work)
+        finally:
+            self.in_flight -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password: str, password_hash: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """(matches, new_hash). new_hash is set when the stored hash should be replaced."""
+        if not password_hash:
+            return False, None  # Google sign-in accounts have no password
+        verified, new_hash = await self._run(self.context.verify_and_update, password, password_hash)
+        if new_hash is not None:
+            self.rehashed += 1
+        return verified, new_hash
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# TYPE password_hash_workers gauge",
+            f"password_hash_workers {self.workers}",
+            "# TYPE password_hash_running gauge",
+            f"password_hash_running {self.running}",
+            "# TYPE password_hash_queue_depth gauge",
+            f"password_hash_queue_depth {self.queue_depth}",
+            "# TYPE password_hash_queue_depth_max gauge",
+            f"password_hash_queue_depth_max {self.max_queue_depth}",
+            "# TYPE password_hash_completed_total counter",
+            f"password_hash_completed_total {self.completed}",
+            "# TYPE password_hash_rejected_total counter",
+            f"password_hash_rejected_total {self.rejected}",
+            "# TYPE password_hash_rehashed_total counter",
+            f"password_hash_rehashed_total {self.rehashed}",
+            "# TYPE password_hash_wait_seconds_total counter",
+            f"password_hash_wait_seconds_total {self.wait_seconds_sum:.6f}",
+            "# TYPE password_hash_seconds_total counter",
+            f"password_hash_seconds_total {self.hash_seconds_sum:.6f}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+password_hasher = PasswordHasher(pwd_context, settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_QUEUE)
@@ -0,0 +1,99 @@
+"""Minimal local SMTP server that accepts and keeps every message.
+
+A stand-in for a real mail server in tests, benchmarks and local development:
+
+    python -m app.core.smtp_sink --port 1025
+    EMAIL_HOST=localhost EMAIL_PORT=1025 EMAIL_USE_TLS=false uvicorn app.main:app
+
+Speaks just enough SMTP for smtplib (EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP,
+QUIT); no TLS or AUTH. `fail_next` makes the next N transactions get a 451
+so retry paths can be exercised.
+"""
+import argparse
+import asyncio
+from email import message_from_bytes
+from email.message import Message
+from typing import List, Optional
+
+
+class SmtpSink:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self.messages: List[Message] = []
+        self.connections = 0
+        self.fail_next = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> "SmtpSink":
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+
+        async def reply(line: str):
+            writer.write(f"{line}\r\n".encode())
+            await writer.drain()
+
+        await reply("220 smtp-sink ready")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode(errors="replace").strip().upper()
+                if command.startswith("EHLO"):
+                    await reply("250-smtp-sink")
+                    await reply("250 8BITMIME")
+                elif command.startswith(("HELO", "MAIL", "RCPT", "RSET", "NOOP")):
+                    await reply("250 OK")
+                elif command == "DATA":
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    data = bytearray()
+                    while True:
+                        chunk = await reader.readline()
+                        if chunk in (b".\r\n", b".\n", b""):
+                            break
+                        data += chunk[1:] if chunk.startswith(b"..") else chunk
+                    if self.fail_next > 0:
+                        self.fail_next -= 1
+                        await reply("451 Temporary failure, try again")
+                    else:
+                        self.messages.append(message_from_bytes(bytes(data)))
+                        await reply("250 OK queued")
+                elif command == "QUIT":
+                    await reply("221 Bye")
+                    break
+                else:
+                    await reply("502 Command not implemented")
+        finally:
+            writer.close()
+
+
+async def _serve(host: str, port: int):
+    sink = await SmtpSink(host, port).start()
+    print(f"SMTP sink listening on {sink.host}:{sink.port}")
+    try:
+        while True:
+            count = len(sink.messages)
+            await asyncio.sleep(1)
+            for message in sink.messages[count:]:
+                print(f"To: {message['To']} | Subject: {message['Subject']}")
+    finally:
+        await sink.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local SMTP sink")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    args = parser.parse_args()
+    asyncio.run(_serve(args.host, args.port))
@@ -3,9 +3,12 @@ from sqlalchemy import select, update, delete, and_, or_, func, text, case, exis
 from sqlalchemy.orm import selectinload, joinedload
 from typing import List, Optional, Dict, Any, Tuple
 from uuid import UUID, uuid4
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import json
 
+from app.core.config import settings
+from app.core.cursors import decode_cursor, encode_cursor
+from app.core.inbox_cache import INBOX_ROOMS, inbox_cache
 from app.models_db import User
 from app.schemas.chat import (
     ChatRoomCreate, ChatRoomResponse, MessageCreate, MessageResponse,
@@ -39,6 +42,7 @@ class ChatCRUD:
         
         room_id = result.scalar()
         await db.commit()
+        inbox_cache.forget(current_user_id, other_user_id)
         
         # Return the room details
         return await self.get_chat_room_details(db, UUID(room_id), current_user_id)
@@ -49,42 +53,42 @@ class ChatCRUD:
         current_user_id: UUID,
         room_data: ChatRoomCreate
     ) -> Dict[str, Any]:
-        """Create a new group chat room"""
+        """Create a new group chat room, in one transaction of two statements.
+
+        The room and all of its participants (the creator as admin) are
+        inserted by one statement, however many members there are; the
+        hydrated room is read back before the commit.
+        """
         
         room_id = uuid4()
+        # Creator first; duplicate ids would violate the participants' primary key
+        member_ids = [user_id for user_id in dict.fromkeys(room_data.participant_ids) if user_id != current_user_id]
+        participant_ids = [current_user_id] + member_ids
         
-        # Create the room
-        insert_room = text("""
-            INSERT INTO chat_rooms (id, type, name, description, image_url, created_by)
-            VALUES (:id, 'group', :name, :description, :image_url, :created_by)
+        create_room = text("""
+            WITH room AS (
+                INSERT INTO chat_rooms (id, type, name, description, image_url, created_by)
+                VALUES (CAST(:id AS uuid), 'group', :name, :description, :image_url, CAST(:created_by AS uuid))
+                RETURNING id
+            )
+            INSERT INTO chat_participants (room_id, user_id, role)
+            SELECT room.id, member.user_id, CAST(CASE WHEN member.n = 1 THEN 'admin' ELSE 'member' END AS participant_role)
+            FROM room, unnest(CAST(:user_ids AS uuid[])) WITH ORDINALITY AS member(user_id, n)
         """)
         
-        await db.execute(insert_room, {
+        await db.execute(create_room, {
             'id': str(room_id),
             'name': room_data.name,
             'description': room_data.description,
             'image_url': room_data.image_url,
-            'created_by': str(current_user_id)
+            'created_by': str(current_user_id),
+            'user_ids': [str(user_id) for user_id in participant_ids]
         })
         
-        # Add participants (including creator as admin)
-        participants = [(current_user_id, 'admin')] + [(pid, 'member') for pid in room_data.participant_ids if pid != current_user_id]
-        
-        for user_id, role in participants:
-            insert_participant = text("""
-                INSERT INTO chat_participants (room_id, user_id, role)
-                VALUES (:room_id, :user_id, :role)
-            """)
-            
-            await db.execute(insert_participant, {
-                'room_id': str(room_id),
-                'user_id': str(user_id),
-                'role': role
-            })
-        
+        room = await self.get_chat_room_details(db, room_id, current_user_id)
         await db.commit()
-        
-        return await self.get_chat_room_details(db, room_id, current_user_id)
+        inbox_cache.forget(*participant_ids)
+        return room
     
     async def get_user_chat_rooms(
         self,
@@ -93,66 +97,81 @@ class ChatCRUD:
         skip: int = 0,
         limit: int = 50
     ) -> List[Dict[str, Any]]:
-        """Get all chat rooms for a user"""
+        """Get all chat rooms for a user; served from inbox_cache when possible"""
         
+        rooms = inbox_cache.get(user_id, skip, limit)
+        if rooms is not None:
+            return rooms
+        
+        if skip + limit > INBOX_ROOMS:
+            return await self._load_user_chat_rooms(db, user_id, skip, limit)
+        
+        # Load the whole cached window once; later pages and app opens read the cache
+        rooms = await self._load_user_chat_rooms(db, user_id, 0, INBOX_ROOMS + 1)
+        inbox_cache.remember(user_id, rooms)
+        return rooms[skip:skip + limit]
+    
+    async def _load_user_chat_rooms(
+        self,
+        db: AsyncSession,
+        user_id: UUID,
+        skip: int,
+        limit: int
+    ) -> List[Dict[str, Any]]:
+        # The page is picked first; the other participant (direct chats) and
+        # the member count are then looked up once per room on that page
         query = text("""
+            WITH page AS (
+                SELECT 
+                    cr.id,
+                    cr.type,
+                    cr.name,
+                    cr.description,
+                    cr.image_url,
+                    cr.created_by,
+                    cr.created_at,
+                    cr.updated_at,
+                    cr.last_message_at,
+                    cr.last_message_content,
+                    cr.last_message_sender_id,
+                    cr.is_archived,
+                    cp.unread_count,
+                    cp.is_muted,
+                    cp.is_pinned,
+                    cp.last_read_at
+                FROM chat_participants cp
+                JOIN chat_rooms cr ON cr.id = cp.room_id
+                WHERE cp.user_id = :user_id 
+                AND cp.left_at IS NULL
+                AND cr.is_archived = FALSE
+                ORDER BY 
+                    cp.is_pinned DESC,
+                    COALESCE(cr.last_message_at, cr.created_at) DESC
+                LIMIT :limit OFFSET :skip
+            )
             SELECT 
-                cr.id,
-                cr.type,
-                cr.name,
-                cr.description,
-                cr.image_url,
-                cr.created_by,
-                cr.created_at,
-                cr.updated_at,
-                cr.last_message_at,
-                cr.last_message_content,
-                cr.last_message_sender_id,
-                cr.is_archived,
-                cp.unread_count,
-                cp.is_muted,
-                cp.is_pinned,
-                cp.last_read_at,
-                -- For direct chats, get the other user's info
-                CASE 
-                    WHEN cr.type = 'direct' THEN (
-                        SELECT u.username FROM users u 
-                        JOIN chat_participants cp2 ON cp2.user_id = u.id 
-                        WHERE cp2.room_id = cr.id AND cp2.user_id != :user_id
-                        LIMIT 1
-                    )
-                    ELSE cr.name 
-                END as display_name,
-                CASE 
-                    WHEN cr.type = 'direct' THEN (
-                        SELECT p.display_name FROM users u 
-                        JOIN profiles p ON p.user_id = u.id
-                        JOIN chat_participants cp2 ON cp2.user_id = u.id 
-                        WHERE cp2.room_id = cr.id AND cp2.user_id != :user_id
-                        LIMIT 1
-                    )
-                    ELSE NULL 
-                END as other_user_display_name,
-                CASE 
-                    WHEN cr.type = 'direct' THEN (
-                        SELECT p.profile_picture_url FROM users u 
-                        JOIN profiles p ON p.user_id = u.id
-                        JOIN chat_participants cp2 ON cp2.user_id = u.id 
-                        WHERE cp2.room_id = cr.id AND cp2.user_id != :user_id
-                        LIMIT 1
-                    )
-                    ELSE cr.image_url 
-                END as display_image,
-                (SELECT COUNT(*) FROM chat_participants cp3 WHERE cp3.room_id = cr.id AND cp3.left_at IS NULL) as participant_count
-            FROM chat_rooms cr
-            JOIN chat_participants cp ON cp.room_id = cr.id
-            WHERE cp.user_id = :user_id 
-            AND cp.left_at IS NULL
-            AND cr.is_archived = FALSE
+                page.*,
+                -- For direct chats, the other user's info
+                CASE WHEN page.type = 'direct' THEN other.username ELSE page.name END as display_name,
+                other.display_name as other_user_display_name,
+                CASE WHEN page.type = 'direct' THEN other.profile_picture_url ELSE page.image_url END as display_image,
+                members.participant_count
+            FROM page
+            LEFT JOIN LATERAL (
+                SELECT u.username, p.display_name, p.profile_picture_url
+                FROM chat_participants cp2
+                JOIN users u ON u.id = cp2.user_id
+                LEFT JOIN profiles p ON p.user_id = u.id
+                WHERE cp2.room_id = page.id AND cp2.user_id != :user_id
+                LIMIT 1
+            ) other ON page.type = 'direct'
+            CROSS JOIN LATERAL (
+                SELECT COUNT(*) as participant_count FROM chat_participants cp3
+                WHERE cp3.room_id = page.id AND cp3.left_at IS NULL
+            ) members
             ORDER BY 
-                cp.is_pinned DESC,
-                COALESCE(cr.last_message_at, cr.created_at) DESC
-            LIMIT :limit OFFSET :skip
+                page.is_pinned DESC,
+                COALESCE(page.last_message_at, page.created_at) DESC
         """)
         
         result = await db.execute(query, {
@@ -190,47 +209,28 @@ class ChatCRUD:
         room_id: UUID,
         current_user_id: UUID
     ) -> Dict[str, Any]:
-        """Get detailed information about a chat room"""
-        
-        # Check if user is participant
-        check_participant = text("""
-            SELECT 1 FROM chat_participants 
-            WHERE room_id = :room_id AND user_id = :user_id AND left_at IS NULL
-        """)
-        
-        result = await db.execute(check_participant, {
-            'room_id': str(room_id),
-            'user_id': str(current_user_id)
-        })
-        
-        if not result.fetchone():
-            raise ValueError("User is not a participant in this room")
+        """Get detailed information about a chat room, in one query.
+
+        One row per current participant, each carrying the room's columns;
+        the membership check is part of the WHERE clause, so a user who is
+        not in the room gets no rows. The room-level unread_count, is_muted
+        and is_pinned are the current user's own participant row.
+        """
         
-        # Get room details
         room_query = text("""
             SELECT 
-                cr.*,
-                cp.unread_count,
-                cp.is_muted,
-                cp.is_pinned,
-                cp.last_read_at
-            FROM chat_rooms cr
-            JOIN chat_participants cp ON cp.room_id = cr.id
-            WHERE cr.id = :room_id AND cp.user_id = :user_id
-        """)
-        
-        room_result = await db.execute(room_query, {
-            'room_id': str(room_id),
-            'user_id': str(current_user_id)
-        })
-        
-        room_row = room_result.fetchone()
-        if not room_row:
-            raise ValueError("Room not found")
-        
-        # Get participants
-        participants_query = text("""
-            SELECT 
+                cr.id,
+                cr.type,
+                cr.name,
+                cr.description,
+                cr.image_url,
+                cr.created_by,
+                cr.created_at,
+                cr.updated_at,
+                cr.last_message_at,
+                cr.last_message_content,
+                cr.last_message_sender_id,
+                cr.is_archived,
                 cp.user_id,
                 cp.role,
                 cp.joined_at,
@@ -244,20 +244,31 @@ class ChatCRUD:
                 p.profile_picture_url,
                 uos.is_online,
                 uos.last_seen
-            FROM chat_participants cp
+            FROM chat_rooms cr
+            JOIN chat_participants cp ON cp.room_id = cr.id AND cp.left_at IS NULL
             JOIN users u ON u.id = cp.user_id
             LEFT JOIN profiles p ON p.user_id = u.id
             LEFT JOIN user_online_status uos ON uos.user_id = u.id
-            WHERE cp.room_id = :room_id AND cp.left_at IS NULL
+            WHERE cr.id = :room_id
+            AND EXISTS (
+                SELECT 1 FROM chat_participants me
+                WHERE me.room_id = cr.id AND me.user_id = :user_id AND me.left_at IS NULL
+            )
             ORDER BY cp.role DESC, cp.joined_at ASC
         """)
         
-        participants_result = await db.execute(participants_query, {
-            'room_id': str(room_id)
-        })
+        rows = (await db.execute(room_query, {
+            'room_id': str(room_id),
+            'user_id': str(current_user_id)
+        })).fetchall()
         
+        if not rows:
+            raise ValueError("User is not a participant in this room")
+        
+        room_row = rows[0]
+        own_row = next(p for p in rows if str(p.user_id) == str(current_user_id))
         participants = []
-        for p in participants_result.fetchall():
+        for p in rows:
             participants.append({
                 'user_id': p.user_id,
                 'username': p.username,
@@ -287,9 +298,9 @@ class ChatCRUD:
             'last_message_content': room_row.last_message_content,
             'last_message_sender_id': room_row.last_message_sender_id,
             'is_archived': room_row.is_archived,
-            'unread_count': room_row.unread_count,
-            'is_muted': room_row.is_muted,
-            'is_pinned': room_row.is_pinned,
+            'unread_count': own_row.unread_count,
+            'is_muted': own_row.is_muted,
+            'is_pinned': own_row.is_pinned,
             'participants': participants
         }
     
@@ -298,35 +309,59 @@ class ChatCRUD:
         db: AsyncSession,
         room_id: UUID,
         sender_id: UUID,
-        message_data: MessageCreate
+        message_data: MessageCreate,
+        check_membership: bool = True
     ) -> Dict[str, Any]:
-        """Send a message to a chat room"""
-        
-        # Verify user is participant
-        check_participant = text("""
-            SELECT 1 FROM chat_participants 
-            WHERE room_id = :room_id AND user_id = :sender_id AND left_at IS NULL
-        """)
-        
-        result = await db.execute(check_participant, {
-            'room_id': str(room_id),
-            'sender_id': str(sender_id)
-        })
-        
-        if not result.fetchone():
-            raise ValueError("User is not a participant in this room")
-        
-        message_id = uuid4()
+        """Send a message to a chat room, in one statement.
+
+        The INSERT only happens if the sender is a current participant, and
+        RETURNING is joined to the sender's profile, so the caller gets the
+        full message without a second query. Callers that have already
+        verified membership (the WebSocket handler caches it per socket) can
+        pass check_membership=False to drop the guard.
+        """
+        membership_guard = """
+            WHERE EXISTS (
+                SELECT 1 FROM chat_participants 
+                WHERE room_id = CAST(:room_id AS uuid) AND user_id = CAST(:sender_id AS uuid) AND left_at IS NULL
+            )
+        """ if check_membership else ""
         
-        # Insert message
-        insert_message = text("""
-            INSERT INTO chat_messages 
-            (id, room_id, sender_id, message_type, content, media_urls, metadata, reply_to_id, forwarded_from_id)
-            VALUES (:id, :room_id, :sender_id, :message_type, :content, :media_urls, :metadata, :reply_to_id, :forwarded_from_id)
+        insert_message = text(f"""
+            WITH inserted AS (
+                INSERT INTO chat_messages 
+                (id, room_id, sender_id, message_type, content, media_urls, metadata, reply_to_id, forwarded_from_id)
+                SELECT CAST(:id AS uuid), CAST(:room_id AS uuid), CAST(:sender_id AS uuid), :message_type, :content,
+                       CAST(:media_urls AS text[]), CAST(:metadata AS jsonb),
+                       CAST(:reply_to_id AS uuid), CAST(:forwarded_from_id AS uuid)
+                {membership_guard}
+                RETURNING *
+            )
+            SELECT 
+                cm.id,
+                cm.room_id,
+                cm.sender_id,
+                cm.message_type,
+                cm.content,
+                cm.media_urls,
+                cm.metadata as metadata,
+                cm.reply_to_id,
+                cm.forwarded_from_id,
+                cm.created_at,
+                cm.edited_at,
+                cm.is_deleted,
+                cm.deleted_at,
+                u.username as sender_username,
+                p.display_name as sender_display_name,
+                p.profile_picture_url as sender_avatar,
+                FALSE as is_read_by_current_user
+            FROM inserted cm
+            JOIN users u ON u.id = cm.sender_id
+            LEFT JOIN profiles p ON p.user_id = u.id
         """)
         
-        await db.execute(insert_message, {
-            'id': str(message_id),
+        result = await db.execute(insert_message, {
+            'id': str(uuid4()),
             'room_id': str(room_id),
             'sender_id': str(sender_id),
             'message_type': message_data.message_type.value,
@@ -337,24 +372,48 @@ class ChatCRUD:
             'forwarded_from_id': str(message_data.forwarded_from_id) if message_data.forwarded_from_id else None
         })
         
-        await db.commit()
+        row = result.fetchone()
+        if not row:
+            await db.rollback()
+            raise ValueError("User is not a participant in this room")
         
-        # Return the created message
-        return await self.get_message_details(db, message_id, sender_id)
+        await db.commit()
+        message = self._message_from_row(row)
+        inbox_cache.message_sent(message)
+        return message
     
     async def get_room_messages(
         self,
         db: AsyncSession,
         room_id: UUID,
         user_id: UUID,
-        before_message_id: Optional[UUID] = None,
-        limit: int = 50
-    ) -> List[Dict[str, Any]]:
-        """Get messages for a chat room with pagination"""
+        cursor: Optional[str] = None,
+        direction: str = "older",
+        limit: int = 50,
+        before_message_id: Optional[UUID] = None
+    ) -> Dict[str, Any]:
+        """Get a page of messages for a chat room, in chronological order.
+
+        Pages are keyed on (created_at, id) and walk from an opaque cursor
+        towards "older" or "newer" messages; without a cursor, "older"
+        starts at the newest message and "newer" at the first. Each page
+        costs the same wherever it is in the room's history. Reactions and
+        read receipts for the page are loaded in one extra query.
+
+        chat_messages is partitioned by month; the cursor also bounds
+        created_at on its own so only the partitions from the cursor onwards
+        are scanned. With CHAT_ARCHIVE_AFTER_MONTHS set, the walk continues
+        into chat_messages_archive once it runs past the oldest partition.
+
+        Returns {'messages', 'older_cursor', 'newer_cursor', 'has_more'}:
+        the cursors point at the page's first and last message, and has_more
+        tells whether the walk in `direction` can continue. A bad cursor
+        raises ValueError.
+        """
         
-        # Verify user is participant
+        # Verify user is participant; their read mark decides is_read_by_current_user
         check_participant = text("""
-            SELECT 1 FROM chat_participants 
+            SELECT last_read_at FROM chat_participants 
             WHERE room_id = :room_id AND user_id = :user_id AND left_at IS NULL
         """)
         
@@ -363,17 +422,46 @@ class ChatCRUD:
             'user_id': str(user_id)
         })
         
-        if not result.fetchone():
+        participant = result.fetchone()
+        if not participant:
             raise ValueError("User is not a participant in this room")
         
-        # Build query with optional pagination
+        newer = direction == "newer"
         where_clause = "WHERE cm.room_id = :room_id AND cm.is_deleted = FALSE"
-        params = {'room_id': str(room_id), 'user_id': str(user_id), 'limit': limit}
+        params = {'room_id': str(room_id), 'limit': limit + 1}
+        position = None
         
-        if before_message_id:
-            where_clause += " AND cm.created_at < (SELECT created_at FROM chat_messages WHERE id = :before_message_id)"
+        if cursor:
+            position = decode_cursor(cursor, datetime, UUID)
+            params['cursor_at'], params['cursor_id'] = position[0], str(position[1])
+            # The plain created_at bound is what lets the planner prune partitions
+            where_clause += f""" AND cm.created_at {'>=' if newer else '<='} :cursor_at
+                AND (cm.created_at, cm.id) {'>' if newer else '<'} (:cursor_at, CAST(:cursor_id AS uuid))"""
+        elif before_message_id:
+            # Deprecated: same keyset walk, starting from a message id
+            where_clause += """ AND (cm.created_at, cm.id) < (
+                SELECT created_at, id FROM chat_messages WHERE id = CAST(:before_message_id AS uuid)
+            )"""
             params['before_message_id'] = str(before_message_id)
+            newer = False
         
+        # Archived months are all older than the oldest partition: "newer"
+        # reads them first when the cursor is before the archive cutoff,
+        # "older" after the partitions run out
+        archived = []
+        use_archive = settings.CHAT_ARCHIVE_AFTER_MONTHS > 0 and not before_message_id
+        if use_archive and newer and (
+            position is None or position[0].replace(tzinfo=position[0].tzinfo or timezone.utc) < self._archive_cutoff()
+        ):
+            archived = await self._load_archived_messages(db, room_id, position, True, limit + 1)
+            if archived:
+                where_clause += """ AND cm.created_at >= :archived_at
+                    AND (cm.created_at, cm.id) > (:archived_at, CAST(:archived_id AS uuid))"""
+                params['archived_at'], params['archived_id'] = archived[-1].created_at, str(archived[-1].id)
+                params['limit'] = limit + 1 - len(archived)
+        
+        # Served by (room_id, created_at, id), scanned backwards for "older"
+        order = "ASC" if newer else "DESC"
         messages_query = text(f"""
             SELECT 
                 cm.id,
@@ -392,10 +480,6 @@ class ChatCRUD:
                 u.username as sender_username,
                 p.display_name as sender_display_name,
                 p.profile_picture_url as sender_avatar,
-                EXISTS(
-                    SELECT 1 FROM message_read_receipts mrr 
-                    WHERE mrr.message_id = cm.id AND mrr.user_id = :user_id
-                ) as is_read_by_current_user,
                 -- Reply-to message info
                 reply_cm.content as reply_to_content,
                 reply_cm.sender_id as reply_to_sender_id,
@@ -406,14 +490,27 @@ class ChatCRUD:
             LEFT JOIN chat_messages reply_cm ON reply_cm.id = cm.reply_to_id
             LEFT JOIN users reply_u ON reply_u.id = reply_cm.sender_id
             {where_clause}
-            ORDER BY cm.created_at DESC
+            ORDER BY cm.created_at {order}, cm.id {order}
             LIMIT :limit
         """)
         
-        messages_result = await db.execute(messages_query, params)
+        rows = archived
+        if params['limit'] > 0:
+            rows = rows + (await db.execute(messages_query, params)).fetchall()
+        if use_archive and not newer and len(rows) <= limit:
+            after = (rows[-1].created_at, rows[-1].id) if rows else position
+            rows = rows + await self._load_archived_messages(db, room_id, after, False, limit + 1 - len(rows))
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if not newer:
+            # Chronological order
+            rows.reverse()
+        
+        reactions, receipts = await self._load_page_extras(db, room_id, rows)
+        last_read_at = participant.last_read_at
         
         messages = []
-        for row in messages_result.fetchall():
+        for row in rows:
             message = {
                 'id': row.id,
                 'room_id': row.room_id,
@@ -431,9 +528,12 @@ class ChatCRUD:
                 'edited_at': row.edited_at,
                 'is_deleted': row.is_deleted,
                 'deleted_at': row.deleted_at,
-                'is_read_by_current_user': row.is_read_by_current_user,
-                'reactions': [],
-                'read_receipts': []
+                'is_read_by_current_user': (
+                    (last_read_at is not None and row.created_at <= last_read_at)
+                    or any(str(receipt['user_id']) == str(user_id) for receipt in receipts.get(row.id, ()))
+                ),
+                'reactions': reactions.get(row.id, []),
+                'read_receipts': receipts.get(row.id, [])
             }
             
             # Add reply-to info if exists
@@ -447,8 +547,165 @@ class ChatCRUD:
             
             messages.append(message)
         
-        # Reverse to get chronological order
-        return list(reversed(messages))
+        return {
+            'messages': messages,
+            'older_cursor': encode_cursor(rows[0].created_at, rows[0].id) if rows else None,
+            'newer_cursor': encode_cursor(rows[-1].created_at, rows[-1].id) if rows else None,
+            'has_more': has_more
+        }
+    
+    @staticmethod
+    def _archive_cutoff() -> datetime:
+        """Messages before this may have been moved to chat_messages_archive."""
+        now = datetime.now(timezone.utc)
+        months = now.year * 12 + now.month - 1 - settings.CHAT_ARCHIVE_AFTER_MONTHS
+        return datetime(months // 12, months % 12 + 1, 1, tzinfo=timezone.utc)
+    
+    async def _load_archived_messages(
+        self,
+        db: AsyncSession,
+        room_id: UUID,
+        position: Optional[Tuple[datetime, UUID]],
+        newer: bool,
+        limit: int
+    ) -> List[Any]:
+        """Up to `limit` archived messages past `position`, in walk order.
+
+        Rows have the columns of get_room_messages' page query; replies are
+        not resolved (reply_to_content and friends are NULL). Archiving
+        deletes a month's reactions and receipts, so archived messages have
+        none; last_read_at marks still count as receipts.
+        """
+        order = "ASC" if newer else "DESC"
+        where_clause = "WHERE a.room_id = :room_id"
+        params = {'room_id': str(room_id), 'limit': limit}
+        if position:
+            params['cursor_at'], params['cursor_id'] = position[0], str(position[1])
+            # Skip whole months before looking inside them
+            where_clause += f""" AND a.month {'>=' if newer else '<='} CAST(date_trunc('month', CAST(:cursor_at AS timestamptz) AT TIME ZONE 'UTC') AS date)
+                AND (e.created_at, e.id) {'>' if newer else '<'} (:cursor_at, CAST(:cursor_id AS uuid))"""
+        
+        # The month order comes from the (room_id, month) primary key, so only
+        # the months the page reaches are unpacked and sorted
+        query = text(f"""
+            SELECT
+                e.id,
+                e.room_id,
+                e.sender_id,
+                e.message_type,
+                e.content,
+                e.media_urls,
+                e.metadata,
+                e.reply_to_id,
+                e.forwarded_from_id,
+                e.created_at,
+                e.edited_at,
+                FALSE as is_deleted,
+                CAST(NULL AS timestamptz) as deleted_at,
+                u.username as sender_username,
+                p.display_name as sender_display_name,
+                p.profile_picture_url as sender_avatar,
+                CAST(NULL AS text) as reply_to_content,
+                CAST(NULL AS uuid) as reply_to_sender_id,
+                CAST(NULL AS text) as reply_to_sender_username
+            FROM (
+                SELECT a.room_id, e.*
+                FROM chat_messages_archive a
+                CROSS JOIN LATERAL jsonb_to_recordset(a.messages) AS e(
+                    id uuid, sender_id uuid, message_type chat_message_type, content text,
+                    media_urls text[], metadata jsonb, reply_to_id uuid, forwarded_from_id uuid,
+                    created_at timestamptz, edited_at timestamptz
+                )
+                {where_clause}
+                ORDER BY a.month {order}, e.created_at {order}, e.id {order}
+                LIMIT :limit
+            ) e
+            JOIN users u ON u.id = e.sender_id
+            LEFT JOIN profiles p ON p.user_id = u.id
+            ORDER BY e.created_at {order}, e.id {order}
+        """)
+        return (await db.execute(query, params)).fetchall()
+    
+    async def _load_page_extras(
+        self,
+        db: AsyncSession,
+        room_id: UUID,
+        rows
+    ) -> Tuple[Dict[UUID, List[Dict[str, Any]]], Dict[UUID, List[Dict[str, Any]]]]:
+        """Reactions and read receipts for a page of messages, in one query.
+
+        A participant whose last_read_at is at or after a message has read
+        it even without a receipt row (see mark_messages_as_read), so their
+        mark is returned as a receipt for every such message they did not
+        send.
+        """
+        if not rows:
+            return {}, {}
+        
+        extras_query = text("""
+            SELECT 'reaction' AS kind, mr.message_id, mr.id AS reaction_id, mr.user_id,
+                   mr.reaction_type, mr.emoji, mr.created_at AS at, u.username, p.display_name
+            FROM message_reactions mr
+            JOIN users u ON u.id = mr.user_id
+            LEFT JOIN profiles p ON p.user_id = u.id
+            WHERE mr.message_id = ANY(CAST(:message_ids AS uuid[]))
+            UNION ALL
+            SELECT 'receipt', mrr.message_id, NULL, mrr.user_id,
+                   NULL, NULL, mrr.read_at, u.username, p.display_name
+            FROM message_read_receipts mrr
+            JOIN users u ON u.id = mrr.user_id
+            LEFT JOIN profiles p ON p.user_id = u.id
+            WHERE mrr.message_id = ANY(CAST(:message_ids AS uuid[]))
+            UNION ALL
+            SELECT 'mark', NULL, NULL, cp.user_id,
+                   NULL, NULL, cp.last_read_at, u.username, p.display_name
+            FROM chat_participants cp
+            JOIN users u ON u.id = cp.user_id
+            LEFT JOIN profiles p ON p.user_id = u.id
+            WHERE cp.room_id = :room_id AND cp.left_at IS NULL AND cp.last_read_at >= :oldest
+        """)
+        
+        result = await db.execute(extras_query, {
+            'message_ids': [str(row.id) for row in rows],
+            'room_id': str(room_id),
+            'oldest': rows[0].created_at
+        })
+        
+        reactions: Dict[UUID, List[Dict[str, Any]]] = {}
+        receipts: Dict[UUID, Dict[UUID, Dict[str, Any]]] = {}
+        marks = []
+        for extra in result.fetchall():
+            if extra.kind == 'reaction':
+                reactions.setdefault(extra.message_id, []).append({
+                    'id': extra.reaction_id,
+                    'user_id': extra.user_id,
+                    'username': extra.username,
+                    'display_name': extra.display_name,
+                    'reaction_type': extra.reaction_type,
+                    'emoji': extra.emoji,
+                    'created_at': extra.at
+                })
+            elif extra.kind == 'receipt':
+                receipts.setdefault(extra.message_id, {})[extra.user_id] = {
+                    'user_id': extra.user_id,
+                    'username': extra.username,
+                    'display_name': extra.display_name,
+                    'read_at': extra.at
+                }
+            else:
+                marks.append(extra)
+        
+        for row in rows:
+            for mark in marks:
+                if mark.at >= row.created_at and mark.user_id != row.sender_id:
+                    receipts.setdefault(row.id, {}).setdefault(mark.user_id, {
+                        'user_id': mark.user_id,
+                        'username': mark.username,
+                        'display_name': mark.display_name,
+                        'read_at': mark.at
+                    })
+        
+        return reactions, {message_id: list(by_user.values()) for message_id, by_user in receipts.items()}
     
     async def mark_messages_as_read(
         self,
@@ -457,55 +714,287 @@ class ChatCRUD:
         user_id: UUID,
         message_ids: Optional[List[UUID]] = None
     ) -> bool:
-        """Mark messages as read for a user"""
+        """Mark messages as read for a user, in one statement.
+
+        chat_participants.last_read_at is the high-water mark: everything
+        created before it counts as read. Listed messages newer than the
+        previous mark get per-message receipts, and the mark moves up to the
+        newest of them, not past it: messages the client has not reported
+        stay unread, and unread_count is recounted from the new mark.
+        Without ids the whole room is read and the mark moves to now.
+        """
+        params = {'room_id': str(room_id), 'user_id': str(user_id)}
         
         if message_ids:
-            # Mark specific messages as read
-            for message_id in message_ids:
-                insert_receipt = text("""
+            # One set-based insert for all ids; the CTEs all see the mark as it was before the UPDATE
+            statement = text("""
+                WITH previous AS (
+                    SELECT last_read_at FROM chat_participants
+                    WHERE room_id = :room_id AND user_id = :user_id
+                ), receipts AS (
                     INSERT INTO message_read_receipts (message_id, user_id)
-                    VALUES (:message_id, :user_id)
+                    SELECT cm.id, CAST(:user_id AS uuid)
+                    FROM chat_messages cm
+                    WHERE cm.id = ANY(CAST(:message_ids AS uuid[]))
+                    AND cm.room_id = :room_id
+                    AND cm.created_at > COALESCE((SELECT last_read_at FROM previous), '-infinity')
                     ON CONFLICT (message_id, user_id) DO NOTHING
-                """)
-                
-                await db.execute(insert_receipt, {
-                    'message_id': str(message_id),
-                    'user_id': str(user_id)
-                })
-        else:
-            # Mark all messages in room as read
-            mark_all_read = text("""
-                INSERT INTO message_read_receipts (message_id, user_id)
-                SELECT cm.id, :user_id
-                FROM chat_messages cm
-                WHERE cm.room_id = :room_id 
-                AND cm.sender_id != :user_id
-                AND NOT EXISTS (
-                    SELECT 1 FROM message_read_receipts mrr 
-                    WHERE mrr.message_id = cm.id AND mrr.user_id = :user_id
+                ), mark AS (
+                    -- GREATEST skips the NULL of ids from other rooms; NULLIF keeps an unset mark unset
+                    SELECT NULLIF(GREATEST(
+                        COALESCE((SELECT last_read_at FROM previous), CAST('-infinity' AS timestamptz)),
+                        (SELECT max(cm.created_at) FROM chat_messages cm
+                         WHERE cm.id = ANY(CAST(:message_ids AS uuid[])) AND cm.room_id = :room_id)
+                    ), CAST('-infinity' AS timestamptz)) AS read_at
                 )
+                UPDATE chat_participants
+                SET last_read_at = (SELECT read_at FROM mark),
+                    unread_count = CASE WHEN (SELECT read_at FROM mark) IS NULL THEN unread_count ELSE (
+                        SELECT count(*) FROM chat_messages cm
+                        WHERE cm.room_id = :room_id AND cm.sender_id <> :user_id AND cm.is_deleted = FALSE
+                        AND cm.created_at > (SELECT read_at FROM mark)
+                    ) END
+                WHERE room_id = :room_id AND user_id = :user_id
+                RETURNING unread_count
+            """)
+            params['message_ids'] = [str(message_id) for message_id in message_ids]
+        else:
+            statement = text("""
+                UPDATE chat_participants 
+                SET unread_count = 0, last_read_at = CURRENT_TIMESTAMP
+                WHERE room_id = :room_id AND user_id = :user_id
+                RETURNING unread_count
             """)
-            
-            await db.execute(mark_all_read, {
-                'room_id': str(room_id),
-                'user_id': str(user_id)
-            })
-        
-        # Update participant's unread count and last read time
-        update_participant = text("""
-            UPDATE chat_participants 
-            SET unread_count = 0, last_read_at = CURRENT_TIMESTAMP
-            WHERE room_id = :room_id AND user_id = :user_id
-        """)
         
-        await db.execute(update_participant, {
-            'room_id': str(room_id),
-            'user_id': str(user_id)
-        })
+        unread_count = (await db.execute(statement, params)).scalar()
         
         await db.commit()
+        if unread_count is not None:
+            inbox_cache.room_read(room_id, user_id, unread_count)
         return True
-    
+
+    async def get_changes_since(
+        self,
+        db: AsyncSession,
+        user_id: UUID,
+        cursor: Optional[str] = None,
+        limit: int = 500
+    ) -> Dict[str, Any]:
+        """The next `limit` changes across all of the user's rooms, in one query.
+
+        Changes are new or edited/deleted messages, added and removed
+        reactions, and participants' read state (last_read_at, left_at,
+        role; mute/pin and unread_count on the user's own rows), in the
+        order they were made. The triggers stamp each row with
+        (change_xid, change_seq) and the cursor is the last stamp returned.
+        Only changes of transactions older than the oldest one still running
+        are returned, so a concurrent write can never commit behind the
+        cursor; it shows up in a later call instead.
+
+        Returns {'changes', 'next_cursor', 'has_more'}; each change is a JSON
+        object rendered by the database, {"type", "room_id", "data"}. A bad
+        cursor raises ValueError.
+        """
+        if cursor:
+            cursor_xid, cursor_seq = decode_cursor(cursor, int, int)
+        else:
+            cursor_xid, cursor_seq = 0, 0
+
+        # Each branch walks its (…, change_xid, change_seq) index from the cursor
+        after_cursor = """({alias}.change_xid, {alias}.change_seq) > (CAST(CAST(:cursor_xid AS text) AS xid8), :cursor_seq)
+                AND {alias}.change_xid < (SELECT xmin FROM horizon)
+                ORDER BY {alias}.change_xid, {alias}.change_seq
+                LIMIT :limit"""
+        changes_query = text(f"""
+            WITH my_rooms AS (
+                SELECT room_id FROM chat_participants
+                WHERE user_id = :user_id AND left_at IS NULL
+            ), horizon AS (
+                SELECT pg_snapshot_xmin(pg_current_snapshot()) AS xmin
+            ), changes AS (
+                (SELECT 'message' AS type, cm.room_id, cm.change_xid, cm.change_seq,
+                        jsonb_build_object(
+                            'id', cm.id,
+                            'sender_id', cm.sender_id,
+                            'sender_name', u.username,
+                            'sender_display_name', p.display_name,
+                            'sender_avatar', p.profile_picture_url,
+                            'message_type', cm.message_type,
+                            'content', CASE WHEN cm.is_deleted THEN NULL ELSE cm.content END,
+                            'media_urls', CASE WHEN cm.is_deleted THEN NULL ELSE cm.media_urls END,
+                            'metadata', CASE WHEN cm.is_deleted THEN NULL ELSE cm.metadata END,
+                            'reply_to_id', cm.reply_to_id,
+                            'forwarded_from_id', cm.forwarded_from_id,
+                            'created_at', cm.created_at,
+                            'edited_at', cm.edited_at,
+                            'is_deleted', cm.is_deleted,
+                            'deleted_at', cm.deleted_at
+                        ) AS data
+                 FROM chat_messages cm
+                 JOIN users u ON u.id = cm.sender_id
+                 LEFT JOIN profiles p ON p.user_id = u.id
+                 WHERE cm.room_id IN (SELECT room_id FROM my_rooms)
+                 AND {after_cursor.format(alias='cm')})
+                UNION ALL
+                (SELECT 'reaction', cm.room_id, mr.change_xid, mr.change_seq,
+                        jsonb_build_object(
+                            'id', mr.id,
+                            'message_id', mr.message_id,
+                            'user_id', mr.user_id,
+                            'reaction_type', mr.reaction_type,
+                            'emoji', mr.emoji,
+                            'created_at', mr.created_at
+                        )
+                 FROM message_reactions mr
+                 JOIN chat_messages cm ON cm.id = mr.message_id
+                 WHERE cm.room_id IN (SELECT room_id FROM my_rooms)
+                 AND {after_cursor.format(alias='mr')})
+                UNION ALL
+                (SELECT 'reaction_removed', rt.room_id, rt.change_xid, rt.change_seq,
+                        jsonb_build_object(
+                            'id', rt.reaction_id,
+                            'message_id', rt.message_id,
+                            'user_id', rt.user_id,
+                            'reaction_type', rt.reaction_type,
+                            'deleted_at', rt.deleted_at
+                        )
+                 FROM chat_reaction_tombstones rt
+                 WHERE rt.room_id IN (SELECT room_id FROM my_rooms)
+                 AND {after_cursor.format(alias='rt')})
+                UNION ALL
+                -- The user's own rows also cover rooms they have left
+                (SELECT 'read_state', cp.room_id, cp.change_xid, cp.change_seq,
+                        jsonb_build_object(
+                            'user_id', cp.user_id,
+                            'role', cp.role,
+                            'last_read_at', cp.last_read_at,
+                            'left_at', cp.left_at
+                        ) || CASE WHEN cp.user_id = :user_id THEN jsonb_build_object(
+                            'unread_count', cp.unread_count,
+                            'is_muted', cp.is_muted,
+                            'is_pinned', cp.is_pinned
+                        ) ELSE '{{}}'::jsonb END
+                 FROM chat_participants cp
+                 WHERE (cp.room_id IN (SELECT room_id FROM my_rooms) OR cp.user_id = :user_id)
+                 AND {after_cursor.format(alias='cp')})
+            )
+            SELECT change_xid::text AS xid, change_seq AS seq,
+                   jsonb_build_object('type', type, 'room_id', room_id, 'data', data)::text AS change
+            FROM changes
+            ORDER BY change_xid, change_seq
+            LIMIT :limit
+        """)
+
+        result = await db.execute(changes_query, {
+            'user_id': str(user_id),
+            'cursor_xid': str(cursor_xid),
+            'cursor_seq': cursor_seq,
+            'limit': limit + 1
+        })
+        rows = result.fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        return {
+            'changes': [row.change for row in rows],
+            'next_cursor': encode_cursor(int(rows[-1].xid), rows[-1].seq) if rows else cursor,
+            'has_more': has_more
+        }
+
+    async def search_messages(
+        self,
+        db: AsyncSession,
+        user_id: UUID,
+        query: str,
+        room_id: Optional[UUID] = None,
+        cursor: Optional[str] = None,
+        limit: int = 20
+    ) -> Dict[str, Any]:
+        """Full-text search over the messages of the user's rooms, best match first.
+
+        The user's room ids are the room_id condition of the GIN index on
+        (room_id, content_tsv), so only their rooms' postings are read.
+        Pass room_id to search one room (still only if the user is in it).
+        Results are ranked with ts_rank and paged on (rank, created_at, id);
+        the highlighted snippet is only computed for the page.
+
+        Returns {'messages', 'next_cursor', 'has_more'}. A bad cursor raises
+        ValueError.
+        """
+        params = {'user_id': str(user_id), 'query': query, 'limit': limit + 1}
+        room_filter = ""
+        if room_id:
+            room_filter = "AND room_id = :room_id"
+            params['room_id'] = str(room_id)
+        cursor_filter = ""
+        if cursor:
+            cursor_rank, cursor_at, cursor_id = decode_cursor(cursor, float, datetime, UUID)
+            params.update(cursor_rank=cursor_rank, cursor_at=cursor_at, cursor_id=str(cursor_id))
+            cursor_filter = "AND (m.rank, m.created_at, m.id) < (CAST(:cursor_rank AS real), :cursor_at, CAST(:cursor_id AS uuid))"
+
+        search_query = text(f"""
+            WITH q AS (
+                SELECT websearch_to_tsquery('simple', :query) AS query
+            ), matches AS (
+                SELECT cm.id, cm.room_id, cm.sender_id, cm.message_type, cm.content, cm.created_at,
+                       ts_rank(cm.content_tsv, q.query) AS rank
+                FROM chat_messages cm, q
+                WHERE cm.room_id = ANY(ARRAY(
+                    SELECT room_id FROM chat_participants
+                    WHERE user_id = :user_id AND left_at IS NULL {room_filter}
+                ))
+                AND cm.content_tsv @@ q.query
+                AND cm.is_deleted = FALSE
+            ), page AS (
+                SELECT * FROM matches m
+                WHERE TRUE {cursor_filter}
+                ORDER BY m.rank DESC, m.created_at DESC, m.id DESC
+                LIMIT :limit
+            )
+            SELECT
+                page.id,
+                page.room_id,
+                page.sender_id,
+                page.message_type,
+                page.content,
+                page.created_at,
+                page.rank,
+                ts_headline('simple', page.content, q.query, 'MaxFragments=1, MinWords=5, MaxWords=20') as highlight,
+                u.username as sender_username,
+                p.display_name as sender_display_name,
+                p.profile_picture_url as sender_avatar
+            FROM page
+            CROSS JOIN q
+            JOIN users u ON u.id = page.sender_id
+            LEFT JOIN profiles p ON p.user_id = u.id
+            ORDER BY page.rank DESC, page.created_at DESC, page.id DESC
+        """)
+
+        rows = (await db.execute(search_query, params)).fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        messages = [
+            {
+                'id': row.id,
+                'room_id': row.room_id,
+                'sender_id': row.sender_id,
+                'sender_name': row.sender_username,
+                'sender_display_name': row.sender_display_name,
+                'sender_avatar': row.sender_avatar,
+                'message_type': row.message_type,
+                'content': row.content,
+                'highlight': row.highlight,
+                'created_at': row.created_at
+            }
+            for row in rows
+        ]
+        return {
+            'messages': messages,
+            'next_cursor': encode_cursor(rows[-1].rank, rows[-1].created_at, rows[-1].id) if has_more else None,
+            'has_more': has_more
+        }
+
     async def get_message_details(
         self,
         db: AsyncSession,
@@ -532,10 +1021,16 @@ class ChatCRUD:
                 u.username as sender_username,
                 p.display_name as sender_display_name,
                 p.profile_picture_url as sender_avatar,
-                EXISTS(
-                    SELECT 1 FROM message_read_receipts mrr 
-                    WHERE mrr.message_id = cm.id AND mrr.user_id = :user_id
-                ) as is_read_by_current_user
+                (
+                    cm.created_at <= (
+                        SELECT cp_read.last_read_at FROM chat_participants cp_read
+                        WHERE cp_read.room_id = cm.room_id AND cp_read.user_id = :user_id
+                    )
+                    OR EXISTS(
+                        SELECT 1 FROM message_read_receipts mrr 
+                        WHERE mrr.message_id = cm.id AND mrr.user_id = :user_id
+                    )
+                ) IS TRUE as is_read_by_current_user
             FROM chat_messages cm
             JOIN users u ON u.id = cm.sender_id
             LEFT JOIN profiles p ON p.user_id = u.id
@@ -551,6 +1046,9 @@ class ChatCRUD:
         if not row:
             raise ValueError("Message not found")
         
+        return self._message_from_row(row)
+    
+    def _message_from_row(self, row) -> Dict[str, Any]:
         return {
             'id': row.id,
             'room_id': row.room_id,
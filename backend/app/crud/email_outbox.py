@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta, timezone
+from typing import List, Sequence
+
+from sqlalchemy import select, update
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+from app.models_db import EmailOutbox
+
+# Plain (sync) functions; the outbox worker calls them through run_db.
+# A claimed row stays 'pending' with next_attempt_at pushed out by the lease,
+# so if a worker dies mid-send the row becomes due again on its own.
+
+
+def enqueue_email(db: Session, to_email: str, subject: str, body: str) -> EmailOutbox:
+    row = EmailOutbox(to_email=to_email, subject=subject, body=body)
+    db.add(row)
+    db.commit()
+    return row
+
+
+def claim_batch(db: Session, limit: int, lease: timedelta) -> List[Row]:
+    """Lease up to `limit` due emails. SKIP LOCKED lets several workers drain the table.
+
+    Returns plain rows (id, to_email, subject, body, attempts, created_at), usable after commit.
+    """
+    now = datetime.now(timezone.utc)
+    due = (
+        select(EmailOutbox.id)
+        .where(EmailOutbox.status == 'pending', EmailOutbox.next_attempt_at <= now)
+        .order_by(EmailOutbox.next_attempt_at, EmailOutbox.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    rows = db.execute(
+        update(EmailOutbox)
+        .where(EmailOutbox.id.in_(due.scalar_subquery()))
+        .values(next_attempt_at=now + lease, attempts=EmailOutbox.attempts + 1)
+        .returning(
+            EmailOutbox.id, EmailOutbox.to_email, EmailOutbox.subject, EmailOutbox.body,
+            EmailOutbox.attempts, EmailOutbox.created_at,
+        )
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.commit()
+    return sorted(rows, key=lambda row: row.id)
+
+
+def mark_sent(db: Session, ids: Sequence[int]):
+    if ids:
+        db.execute(
+            update(EmailOutbox)
+            .where(EmailOutbox.id.in_(ids))
+            .values(status='sent', sent_at=datetime.now(timezone.utc), last_error=None)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+
+
+def mark_failed(db: Session, email_id: int, error: str, retry_in: timedelta = None):
+    """Schedule a retry after `retry_in`, or give up for good when it is None."""
+    values = {'last_error': error[:2000]}
+    if retry_in is None:
+        values['status'] = 'failed'
+    else:
+        values['next_attempt_at'] = datetime.now(timezone.utc) + retry_in
+    db.execute(
+        update(EmailOutbox)
+        .where(EmailOutbox.id == email_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
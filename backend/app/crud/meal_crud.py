@@ -48,7 +48,7 @@ async def get_meals_by_user(
     db: AsyncSession, user_id: UUID, skip: int = 0, limit: int = 100
 ) -> List[MealInDB]:
     """Retrieves a list of meals for a specific user, including their food items."""
-    result = db.execute(
+    result = await db.execute(
         select(Meal)
         .options(selectinload(Meal.food_items))
         .where(Meal.user_id == user_id)
@@ -267,12 +267,6 @@ def get_public_feed(db: Session, skip: int = 0, limit: int = 30):
     """
     Retrieves public posts for the main feed, including author details, comment counts, and react counts.
     """
-    print(f"DEBUG: get_public_feed called with skip={skip}, limit={limit}")
-    
-    # First, let's get a simple count of public posts
-    total_public_posts = db.query(Post).filter(Post.privacy == 'public').count()
-    print(f"DEBUG: Total public posts in database: {total_public_posts}")
-    
     # Subquery for comment counts
     comment_count_sq = db.query(
         Comment.post_id,
@@ -285,13 +279,6 @@ def get_public_feed(db: Session, skip: int = 0, limit: int = 30):
         func.count(React.user_id).label("react_count") # Counting distinct users who reacted
     ).group_by(React.post_id).subquery()
 
-    # Build the main query step by step for better debugging
-    base_query = db.query(Post).filter(Post.privacy == 'public')
-    
-    # Check if we have any posts after the privacy filter
-    posts_after_privacy_filter = base_query.count()
-    print(f"DEBUG: Posts after privacy filter: {posts_after_privacy_filter}")
-    
     # Add joins - use LEFT JOIN to ensure we don't lose posts
     query = db.query(
         Post,
@@ -14,7 +14,11 @@ from app.models.trainer import (
 )
 from app.schemas import trainer as schemas
 
+# Plain (sync) functions: these run blocking ORM queries, so callers should be
+# sync route handlers (run in the threadpool) or go through app.database.executor.run_db.
 
+def create_trainer_application(
+    db: Session, application: schemas.TrainerApplicationCreate, user_id: UUID
 ) -> TrainerApplication:
     """Create a new trainer application"""
     db_application = TrainerApplication(
@@ -28,7 +32,7 @@ from app.schemas import trainer as schemas
     return db_application
 
 
-async def get_trainer_application_status(
+def get_trainer_application_status(
     db: Session, user_id: UUID
 ) -> schemas.TrainerApplicationStatus:
     """Get the status of a trainer application"""
@@ -43,7 +47,7 @@ async def get_trainer_application_status(
     return application
 
 
-async def is_trainer(db: Session, user_id: UUID) -> bool:
+def is_trainer(db: Session, user_id: UUID) -> bool:
     """Check if a user is an approved trainer"""
     trainer = (
         db.query(TrainerProfile)
@@ -58,7 +62,7 @@ async def is_trainer(db: Session, user_id: UUID) -> bool:
     return bool(trainer)
 
 
-async def create_trainer_post(
+def create_trainer_post(
     db: Session, post: schemas.TrainerPostCreate, trainer_id: UUID
 ) -> TrainerPost:
     """Create a new trainer post"""
@@ -72,7 +76,7 @@ async def create_trainer_post(
     return db_post
 
 
-async def get_trainer_posts(
+def get_trainer_posts(
     db: Session,
     trainer_id: Optional[UUID] = None,
     category: Optional[str] = None,
@@ -90,7 +94,7 @@ async def get_trainer_posts(
     return query.offset((page - 1) * limit).limit(limit).all()
 
 
-async def create_verification_request(
+def create_verification_request(
     db: Session,
     request: schemas.PlanVerificationRequest,
     user_id: UUID,
@@ -107,7 +111,7 @@ async def create_verification_request(
     return db_request
 
 
-async def get_verification_requests(
+def get_verification_requests(
     db: Session,
     trainer_id: Optional[UUID] = None,
     status: Optional[str] = None,
@@ -123,7 +127,7 @@ async def get_verification_requests(
     return query.order_by(desc(PlanVerification.created_at)).all()
 
 
-async def submit_verification_feedback(
+def submit_verification_feedback(
     db: Session,
     request_id: UUID,
     feedback: schemas.PlanVerificationResponse,
@@ -150,7 +154,7 @@ async def submit_verification_feedback(
     return request
 
 
-async def get_chat_rooms(db: Session, user_id: UUID) -> List[TrainerChatRoom]:
+def get_chat_rooms(db: Session, user_id: UUID) -> List[TrainerChatRoom]:
     """Get chat rooms for a user"""
     return (
         db.query(TrainerChatRoom)
@@ -165,7 +169,7 @@ async def get_chat_rooms(db: Session, user_id: UUID) -> List[TrainerChatRoom]:
     )
 
 
-async def get_chat_messages(
+def get_chat_messages(
     db: Session, room_id: UUID, limit: int = 50
 ) -> List[TrainerChat]:
     """Get messages from a chat room"""
@@ -178,7 +182,7 @@ async def get_chat_messages(
     )
 
 
-async def send_chat_message(db: Session, message: schemas.TrainerChat) -> TrainerChat:
+def send_chat_message(db: Session, message: schemas.TrainerChat) -> TrainerChat:
     """Send a message in a chat room"""
     db_message = TrainerChat(**message.dict(exclude_unset=True))
     db.add(db_message)
@@ -197,7 +201,7 @@ async def send_chat_message(db: Session, message: schemas.TrainerChat) -> Traine
     return db_message
 
 
-async def can_access_chat_room(db: Session, room_id: UUID, user_id: UUID) -> bool:
+def can_access_chat_room(db: Session, room_id: UUID, user_id: UUID) -> bool:
     """Check if a user can access a chat room"""
     room = (
         db.query(TrainerChatRoom)
@@ -1,16 +1,77 @@
+from contextlib import asynccontextmanager
+from functools import partial
+
+import anyio
+import anyio.to_thread
+from anyio.lowlevel import RunVar
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from dotenv import load_dotenv
-import os 
 
-load_dotenv()
+from app.core.config import settings
+from app.database.pool_metrics import InstrumentedAsyncQueuePool, InstrumentedQueuePool, pool_status
+from app.database.query_stats import install_query_hooks
+
+db_url = settings.DATABASE_URL
+
+_ASYNC_DRIVERS = {
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def get_async_database_url(url: str):
+    """Rewrite a sync DATABASE_URL for its asyncio driver.
+
+    Returns ``(url, connect_args)``. asyncpg does not understand libpq's
+    ``sslmode`` query parameter, so it is moved into ``connect_args``.
+    """
+    parsed = make_url(url)
+    connect_args = {}
+    drivername = _ASYNC_DRIVERS.get(parsed.drivername, parsed.drivername)
+    if drivername == "postgresql+asyncpg" and "sslmode" in parsed.query:
+        connect_args["ssl"] = parsed.query["sslmode"]
+        parsed = parsed.difference_update_query(["sslmode"])
+    return parsed.set(drivername=drivername), connect_args
 
-db_url = os.getenv("DATABASE_URL")
+def create_db_engine(url: str = None, use_async: bool = False):
+    """The one place engines are built; pool settings come from Settings.
 
-# print(db_url)
+    Both the sync (psycopg2) and async (asyncpg) engines go through here so
+    they share pool sizing, recycling and the per-statement timeout.
+    """
+    url = url or settings.DATABASE_URL
+    connect_args = {}
+    if use_async:
+        url, connect_args = get_async_database_url(url)
+    url = make_url(url)
 
-engine = create_engine(db_url, pool_pre_ping=True)
+    timeout_ms = settings.DB_STATEMENT_TIMEOUT_MS
+    if timeout_ms and url.get_backend_name() == "postgresql":
+        if url.get_driver_name() == "asyncpg":
+            connect_args.setdefault("server_settings", {})["statement_timeout"] = str(timeout_ms)
+        else:
+            connect_args["options"] = f"-c statement_timeout={timeout_ms}"
+
+    engine_kwargs = dict(
+        poolclass=InstrumentedAsyncQueuePool if use_async else InstrumentedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+        connect_args=connect_args,
+    )
+    if use_async:
+        return create_async_engine(url, **engine_kwargs)
+    return create_engine(url, **engine_kwargs)
+
+install_query_hooks() # per-request query counts, see app.database.query_stats
+
+engine = create_db_engine()
 
 SessionLocal = sessionmaker(autocommit=False,autoflush=False,bind=engine)
 
@@ -21,4 +82,111 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# --- Async session layer ----------------------------------------------------
+# chat_crud, friends_crud and meal_crud are written against AsyncSession, so
+# they get a real asyncpg-backed session instead of the psycopg2 one above.
+#
+# DB_SESSION_MODE=async (default) -> AsyncSession on asyncpg
+# DB_SESSION_MODE=sync            -> the sync SessionLocal, with every call
+#                                    pushed to the threadpool (for benchmarks)
+DB_SESSION_MODE = settings.DB_SESSION_MODE.lower()
+
+async_engine = create_db_engine(use_async=True)
+
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
+
+# Threads for calls on a ThreadedSession that already holds a pooled
+# connection. Committing or closing gives the connection back, so it must not
+# queue behind threads in the default limiter that are blocked waiting for a
+# connection: with both limiters sized to the pool that is a deadlock.
+_connection_holders = RunVar("db_connection_holders")
+
+
+def _holder_limiter() -> anyio.CapacityLimiter:
+    try:
+        return _connection_holders.get()
+    except LookupError:
+        limiter = anyio.CapacityLimiter(settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW)
+        _connection_holders.set(limiter)
+        return limiter
+
+
+class ThreadedSession:
+    """Awaitable facade over a sync Session (DB_SESSION_MODE=sync).
+
+    Exposes the subset of the AsyncSession API the async CRUD modules use,
+    running each blocking call in the threadpool. Once a call has checked a
+    connection out, later calls run under a separate limiter until it is
+    returned by commit, rollback or close.
+    """
+
+    def __init__(self, session):
+        self.sync_session = session
+        self._holding = False
+
+    async def _run(self, func, *args, releases: bool = False, **kwargs):
+        limiter = _holder_limiter() if self._holding else None
+        try:
+            return await anyio.to_thread.run_sync(partial(func, *args, **kwargs), limiter=limiter)
+        finally:
+            self._holding = not releases
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    async def execute(self, statement, params=None, **kwargs):
+        return await self._run(self.sync_session.execute, statement, params, **kwargs)
+
+    async def scalar(self, statement, params=None, **kwargs):
+        return await self._run(self.sync_session.scalar, statement, params, **kwargs)
+
+    async def commit(self):
+        await self._run(self.sync_session.commit, releases=True)
+
+    async def rollback(self):
+        await self._run(self.sync_session.rollback, releases=True)
+
+    async def refresh(self, instance, attribute_names=None):
+        await self._run(self.sync_session.refresh, instance, attribute_names)
+
+    async def close(self):
+        await self._run(self.sync_session.close, releases=True)
+
+
+@asynccontextmanager
+async def async_session_scope():
+    """A session for the async CRUD modules, honouring DB_SESSION_MODE.
+
+    For work outside a request's dependencies (WebSocket events, background
+    flushes); the connection goes back to the pool when the block exits.
+    """
+    if DB_SESSION_MODE == "sync":
+        db = ThreadedSession(SessionLocal())
+        try:
+            yield db
+        finally:
+            await db.close()
+        return
+
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_async_db():
+    """Yield a session for the async CRUD modules, honouring DB_SESSION_MODE."""
+    async with async_session_scope() as db:
+        yield db
+
+
+def get_pool_stats():
+    """Snapshot of both engines' pools, for /internal/db/pool."""
+    return {
+        "sync": pool_status(engine.pool),
+        "async": pool_status(async_engine.sync_engine.pool),
+    }
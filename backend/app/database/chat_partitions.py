@@ -0,0 +1,107 @@
+"""Upkeep of the monthly chat_messages partitions.
+
+chat_messages is range-partitioned on created_at, one partition per UTC month
+(chat_messages_pYYYYMM), with no default partition: an insert for a month
+without a partition fails. `ChatPartitionMaintainer` runs once at startup and
+then every `interval` seconds, and
+
+- creates the partitions for this month and the next `months_ahead` months
+  (create_chat_message_partitions() in the schema), and
+- when `archive_after_months` is set, folds every month older than that into
+  chat_messages_archive and drops its partition
+  (archive_chat_message_partitions()).
+
+Both functions take an advisory lock and skip work already done, so every
+worker can run the maintainer.
+"""
+import asyncio
+import logging
+from typing import Optional
+
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.database.base import async_session_scope
+
+logger = logging.getLogger(__name__)
+
+
+class ChatPartitionMaintainer:
+    def __init__(self, session_scope, interval: float = 3600.0, months_ahead: int = 3,
+                 archive_after_months: int = 0):
+        self.session_scope = session_scope
+        self.interval = interval
+        self.months_ahead = months_ahead
+        self.archive_after_months = archive_after_months  # 0 keeps every month in chat_messages
+        self.runs = 0
+        self.partitions_created = 0
+        self.partitions_archived = 0
+        self.errors = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self):
+        """Create upcoming partitions and archive expired ones; returns (created, archived)."""
+        async with self.session_scope() as db:
+            created = (await db.execute(
+                text("SELECT create_chat_message_partitions(:months_ahead)"),
+                {"months_ahead": self.months_ahead},
+            )).scalar_one()
+            await db.commit()
+            archived = 0
+            if self.archive_after_months > 0:
+                archived = (await db.execute(
+                    text("SELECT archive_chat_message_partitions(:keep_months)"),
+                    {"keep_months": self.archive_after_months},
+                )).scalar_one()
+                await db.commit()
+        self.runs += 1
+        self.partitions_created += created
+        self.partitions_archived += archived
+        if created or archived:
+            logger.info(f"chat_messages partitions: {created} created, {archived} archived")
+        return created, archived
+
+    async def run(self):
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"chat_messages partition maintenance failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run(), name="chat-partitions")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# TYPE chat_partition_maintenance_runs_total counter",
+            f"chat_partition_maintenance_runs_total {self.runs}",
+            "# TYPE chat_partition_maintenance_errors_total counter",
+            f"chat_partition_maintenance_errors_total {self.errors}",
+            "# TYPE chat_partitions_created_total counter",
+            f"chat_partitions_created_total {self.partitions_created}",
+            "# TYPE chat_partitions_archived_total counter",
+            f"chat_partitions_archived_total {self.partitions_archived}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+chat_partitions = ChatPartitionMaintainer(
+    async_session_scope,
+    interval=settings.CHAT_PARTITION_INTERVAL,
+    months_ahead=settings.CHAT_PARTITION_MONTHS_AHEAD,
+    archive_after_months=settings.CHAT_ARCHIVE_AFTER_MONTHS,
+)
@@ -1,23 +1,8 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from dotenv import load_dotenv
-import os
+# Kept for existing imports; the engine and session factory live in
+# app.database.base so each worker holds a single pool.
+from app.database.base import engine, SessionLocal, get_db
+from app.core.config import settings
 
-load_dotenv()
 
-# Read DATABASE_URL from environment
-DATABASE_URL = os.getenv("DATABASE_URL")
-
-if not DATABASE_URL:
-    raise RuntimeError("DATABASE_URL environment variable is not set for database connection")
-
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
-
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+def get_database_url() -> str:
+    return settings.DATABASE_URL
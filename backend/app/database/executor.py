@@ -0,0 +1,42 @@
+"""Keep blocking ORM work off the event loop.
+
+Route handlers that use the sync ``Session`` are plain ``def`` functions, which
+FastAPI runs in the anyio worker threadpool. Code that has to stay ``async``
+(it also awaits something) wraps its sync DB calls in :func:`run_db`.
+
+:func:`run_db` has its own limiter, sized above the DB connection pool
+(DB_THREADPOOL_SIZE), so pool checkout is what actually bounds DB work. The
+default limiter is left alone: it also runs sync dependencies and Starlette's
+file and upload I/O, and a request that holds a connection from one thread
+hop must always be able to get a token for the next. Functions passed to
+run_db should commit or close their session before returning, so no
+connection stays checked out while the caller awaits something else.
+"""
+from functools import partial
+
+import anyio
+import anyio.to_thread
+from anyio.lowlevel import RunVar
+
+from app.core.config import settings
+
+_db_limiter = RunVar("db_threadpool_limiter")
+
+
+def db_threadpool_size() -> int:
+    return settings.DB_THREADPOOL_SIZE or 2 * (settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW)
+
+
+def db_threadpool_limiter() -> anyio.CapacityLimiter:
+    """The run_db limiter of the running event loop."""
+    try:
+        return _db_limiter.get()
+    except LookupError:
+        limiter = anyio.CapacityLimiter(db_threadpool_size())
+        _db_limiter.set(limiter)
+        return limiter
+
+
+async def run_db(func, *args, **kwargs):
+    """Run a blocking DB call in a worker thread and await its result."""
+    return await anyio.to_thread.run_sync(partial(func, *args, **kwargs), limiter=db_threadpool_limiter())
@@ -0,0 +1,106 @@
+"""Per-request SQL statistics collected from SQLAlchemy cursor events.
+
+`track_queries()` opens a collection scope in a ContextVar; every statement
+executed inside it (on any engine, including sync handlers running in the
+threadpool, which inherit the request context) is counted, timed and
+fingerprinted. Outside a scope the event hooks return immediately.
+
+A fingerprint that repeats `threshold` or more times in one scope is
+reported as a likely N+1 pattern.
+
+`capture_all_queries()` is the test-side variant: it sees statements from
+every thread and context (e.g. an app running behind TestClient's portal).
+"""
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_NUMBER = re.compile(r"\b\d+(\.\d+)?\b")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_SPACE = re.compile(r"\s+")
+_IN_LIST = re.compile(r"\bIN\s*\((?:\s*\?\s*,?)+\)", re.IGNORECASE)
+
+
+def fingerprint(statement: str) -> str:
+    """Normalise a statement so the same query with different literals compares equal."""
+    statement = _STRING.sub("?", statement)
+    statement = _NUMBER.sub("?", statement)
+    statement = _SPACE.sub(" ", statement).strip()
+    return _IN_LIST.sub("IN (...)", statement)
+
+
+class QueryStats:
+    __slots__ = ("count", "duration", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements: Counter = Counter()
+
+    def record(self, statement_fingerprint: str, duration: float):
+        self.count += 1
+        self.duration += duration
+        self.statements[statement_fingerprint] += 1
+
+    def repeated(self, threshold: int = 2) -> List[Tuple[str, int]]:
+        """Fingerprints executed at least `threshold` times, most frequent first."""
+        return [(sql, n) for sql, n in self.statements.most_common() if n >= threshold]
+
+    @property
+    def max_repeat(self) -> int:
+        return max(self.statements.values(), default=0)
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+_global: List[QueryStats] = []
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def capture_all_queries() -> Iterator[QueryStats]:
+    stats = QueryStats()
+    _global.append(stats)
+    try:
+        yield stats
+    finally:
+        _global.remove(stats)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None or _global:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is None and not _global:
+        return
+    starts = conn.info.get("query_start")
+    duration = time.perf_counter() - starts.pop() if starts else 0.0
+    statement_fingerprint = fingerprint(statement)
+    if stats is not None:
+        stats.record(statement_fingerprint, duration)
+    for captured in _global:
+        captured.record(statement_fingerprint, duration)
+
+
+def install_query_hooks():
+    """Listen on every Engine (sync engines and the sync side of async engines). Idempotent."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
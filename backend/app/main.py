@@ -1,4 +1,5 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
@@ -18,29 +19,25 @@ from app.api.v1.endpoints import exercise_library # Enhanced exercise library ro
 from app.api.v1.endpoints import chat # NEW: Import chat router
 from app.api.v1.endpoints import friends # NEW: Import friends router
 from app.api.v1.endpoints import social # NEW: Import social router
-from app.websocket.chat_websocket import websocket_endpoint # NEW: Import WebSocket endpoint
-from app.database.base import Base, engine # Imports Base and engine
-import app.models_db # This import ensures all models in models_db.py are registered with Base
-from app.middleware.logger import LoggerMiddleware
-import cloudinary
+from app.api.v1.endpoints import internal # Operational endpoints (pool stats)
+from app.websocket.chat_websocket import heartbeat, manager, presence, read_receipts, websocket_endpoint # NEW: Import WebSocket endpoint
+from app.database.base import async_engine
+from app.database.chat_partitions import chat_partitions
+from app.middleware.observability import ObservabilityMiddleware, start_access_log, stop_access_log
+from app.middleware.rate_limit import RateLimitMiddleware, build_rate_limit_store, parse_limits
 from app.core.config import settings
+from app.core.password_hashing import PasswordHasherBusy, password_hasher
+from app.core.email_worker import get_email_worker
 
 
 load_dotenv()
 
-cloudinary.config(
-    cloud_name=settings.CLOUDINARY_CLOUD_NAME,
-    api_key=settings.CLOUDINARY_API_KEY,
-    api_secret=settings.CLOUDINARY_API_SECRET,
-    secure=True
-)
+# Firebase Admin and Cloudinary are configured on first use (app.core.clients).
+# The schema is managed with Alembic (`alembic upgrade head`), not at import time.
 origins = [
     '*'
 ]
 
-##Creates tables
-Base.metadata.create_all(bind=engine)
-
 app = FastAPI(
     title="Fitnation Backend",
     description="Backend of Fitnation App",
@@ -71,12 +68,59 @@ app.include_router(posts.router, prefix="/api/v1/posts", tags=["posts"]) # Inclu
 app.include_router(nutrition.router, prefix="/api/v1/nutrition", tags=["nutrition"]) # Include new nutrition router
 app.include_router(exercise.router, prefix="/api/v1/exercises", tags=["exercises"]) # Legacy exercise router
 app.include_router(exercise_library.router, prefix="/api/v1/exercise-library", tags=["Exercise Library"]) # Enhanced exercise library
+app.include_router(internal.router, prefix="/internal", tags=["internal"], include_in_schema=False)
+app.include_router(internal.metrics_router, tags=["internal"], include_in_schema=False) # GET /metrics
 # app.include_router(exercise.router,prefix="/api/v1/exercises",tags=["exercises"])
 # app.include_router(workoutHistory.router,prefix="/api/v1/workoutHistory",tags=["workoutHistory"])
 
 # WebSocket endpoint for real-time chat
 app.websocket("/ws/chat")(websocket_endpoint)
-app.add_middleware(LoggerMiddleware)
+if settings.RATE_LIMIT_ENABLED:
+    app.add_middleware(
+        RateLimitMiddleware,
+        store=build_rate_limit_store(settings),
+        limits=parse_limits(settings.RATE_LIMITS),
+    )
+app.add_middleware(
+    ObservabilityMiddleware, # outermost, so 429s are counted too
+    debug_headers=settings.DEBUG,
+    repeat_threshold=settings.DB_REPEATED_QUERY_THRESHOLD,
+)
+
+
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy(request: Request, exc: PasswordHasherBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many sign-in attempts in progress, please retry"},
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.on_event("startup")
+async def on_startup():
+    start_access_log()
+    if settings.EMAIL_OUTBOX_ENABLED:
+        get_email_worker().start()
+    await manager.broker.start()
+    presence.start()
+    heartbeat.start()
+    if settings.CHAT_PARTITION_MAINTENANCE_ENABLED:
+        chat_partitions.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await chat_partitions.stop()
+    await heartbeat.stop()
+    await read_receipts.flush_all()
+    await presence.stop()
+    await manager.broker.stop()
+    if settings.EMAIL_OUTBOX_ENABLED:
+        await get_email_worker().stop()
+    await async_engine.dispose()
+    password_hasher.shutdown()
+    stop_access_log()
 
 
 @app.get("/")
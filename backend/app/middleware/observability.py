@@ -0,0 +1,260 @@
+"""Pure ASGI request metrics and access logging.
+
+Replaces the old BaseHTTPMiddleware logger: no per-request task, no response
+buffering, and no print() on the hot path. Each request costs a few dict
+updates; access log records go through a QueueHandler and are written by a
+background QueueListener thread.
+
+Metrics are per process and exported in Prometheus text format on /metrics.
+SQL statements issued while handling a request are counted per route (see
+app.database.query_stats); with `debug_headers` they are also returned as
+x-db-* response headers.
+"""
+import json
+import logging
+import queue
+import sys
+import time
+from bisect import bisect_left
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Optional, Tuple
+
+from app.database.query_stats import QueryStats, track_queries
+
+logger = logging.getLogger(__name__)
+
+access_logger = logging.getLogger("app.access")
+
+# Latency histogram bucket upper bounds, seconds. The last bucket is +Inf.
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25,
+    0.5, 0.75, 1.0, 2.5, 5.0, 10.0,
+)
+QUANTILES = (0.5, 0.95, 0.99)
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class RouteStats:
+    __slots__ = (
+        "count", "errors", "duration_sum", "buckets", "request_bytes", "response_bytes",
+        "db_queries", "db_duration_sum", "n_plus_one",
+    )
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.duration_sum = 0.0
+        self.buckets: List[int] = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.db_queries = 0
+        self.db_duration_sum = 0.0
+        self.n_plus_one = 0
+
+    def observe(self, duration: float, status: int, request_bytes: int, response_bytes: int,
+                queries: Optional[QueryStats] = None, repeat_threshold: int = 0):
+        self.count += 1
+        if status >= 500:
+            self.errors += 1
+        self.duration_sum += duration
+        self.buckets[bisect_left(LATENCY_BUCKETS, duration)] += 1
+        self.request_bytes += request_bytes
+        self.response_bytes += response_bytes
+        if queries is not None:
+            self.db_queries += queries.count
+            self.db_duration_sum += queries.duration
+            if repeat_threshold and queries.max_repeat >= repeat_threshold:
+                self.n_plus_one += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimate a latency quantile from the histogram (linear within a bucket)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for i, bucket_count in enumerate(self.buckets):
+            upper = LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else LATENCY_BUCKETS[-1]
+            if bucket_count and seen + bucket_count >= rank:
+                return lower + (upper - lower) * ((rank - seen) / bucket_count)
+            seen += bucket_count
+            lower = upper
+        return LATENCY_BUCKETS[-1]
+
+
+class MetricsRegistry:
+    """In-process request metrics. Only touched from the event loop thread."""
+
+    def __init__(self):
+        self.routes: Dict[Tuple[str, str], RouteStats] = {}
+        self.in_flight = 0
+        self.started_at = time.time()
+
+    def observe(self, method: str, route: str, duration: float, status: int,
+                request_bytes: int, response_bytes: int,
+                queries: Optional[QueryStats] = None, repeat_threshold: int = 0):
+        key = (method, route)
+        stats = self.routes.get(key)
+        if stats is None:
+            stats = self.routes[key] = RouteStats()
+        stats.observe(duration, status, request_bytes, response_bytes, queries, repeat_threshold)
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+            "# TYPE http_requests_total counter",
+            "# TYPE http_request_errors_total counter",
+            "# TYPE http_request_bytes_total counter",
+            "# TYPE http_response_bytes_total counter",
+            "# TYPE http_request_duration_seconds histogram",
+            "# TYPE http_request_duration_quantile_seconds gauge",
+            "# TYPE http_request_db_queries_total counter",
+            "# TYPE http_request_db_seconds_total counter",
+            "# TYPE http_request_n_plus_one_total counter",
+        ]
+        for (method, route), stats in sorted(self.routes.items()):
+            labels = f'method="{method}",route="{_escape(route)}"'
+            lines.append(f"http_requests_total{{{labels}}} {stats.count}")
+            lines.append(f"http_request_errors_total{{{labels}}} {stats.errors}")
+            lines.append(f"http_request_bytes_total{{{labels}}} {stats.request_bytes}")
+            lines.append(f"http_response_bytes_total{{{labels}}} {stats.response_bytes}")
+            lines.append(f"http_request_db_queries_total{{{labels}}} {stats.db_queries}")
+            lines.append(f"http_request_db_seconds_total{{{labels}}} {stats.db_duration_sum:.6f}")
+            lines.append(f"http_request_n_plus_one_total{{{labels}}} {stats.n_plus_one}")
+            cumulative = 0
+            for bound, bucket_count in zip(LATENCY_BUCKETS, stats.buckets):
+                cumulative += bucket_count
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {stats.count}')
+            lines.append(f"http_request_duration_seconds_sum{{{labels}}} {stats.duration_sum:.6f}")
+            lines.append(f"http_request_duration_seconds_count{{{labels}}} {stats.count}")
+            for q in QUANTILES:
+                lines.append(
+                    f'http_request_duration_quantile_seconds{{{labels},quantile="{q}"}} {stats.quantile(q):.6f}'
+                )
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+metrics = MetricsRegistry()
+
+
+class ObservabilityMiddleware:
+    """Times every HTTP request, counts bytes and SQL queries, and queues a structured access log line.
+
+    A request that runs the same statement fingerprint `repeat_threshold` or
+    more times is counted (and logged) as a likely N+1.
+    """
+
+    def __init__(self, app, registry: MetricsRegistry = metrics, debug_headers: bool = False,
+                 repeat_threshold: int = 5):
+        self.app = app
+        self.registry = registry
+        self.debug_headers = debug_headers
+        self.repeat_threshold = repeat_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        registry = self.registry
+        start = time.perf_counter()
+        status = 500
+        request_bytes = 0
+        response_bytes = 0
+        queries: Optional[QueryStats] = None
+
+        async def counting_receive():
+            nonlocal request_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                request_bytes += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            nonlocal status, response_bytes
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-process-time", f"{time.perf_counter() - start:.6f}".encode()))
+                if self.debug_headers and queries is not None:
+                    headers.append((b"x-db-queries", str(queries.count).encode()))
+                    headers.append((b"x-db-time-ms", f"{queries.duration * 1000:.3f}".encode()))
+                    headers.append((b"x-db-max-repeat", str(queries.max_repeat).encode()))
+                message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        registry.in_flight += 1
+        try:
+            with track_queries() as queries:
+                await self.app(scope, counting_receive, counting_send)
+        finally:
+            registry.in_flight -= 1
+            duration = time.perf_counter() - start
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or UNMATCHED_ROUTE
+            registry.observe(scope["method"], route_path, duration, status, request_bytes, response_bytes,
+                             queries, self.repeat_threshold)
+            if queries is not None and self.repeat_threshold:
+                for statement, times in queries.repeated(self.repeat_threshold):
+                    logger.warning(f"Possible N+1 on {scope['method']} {route_path}: {times}x {statement[:200]}")
+            if access_logger.isEnabledFor(logging.INFO):
+                client = scope.get("client")
+                access_logger.info(
+                    "request",
+                    extra={
+                        "access": {
+                            "method": scope["method"],
+                            "path": scope["path"],
+                            "route": route_path,
+                            "status": status,
+                            "duration_ms": round(duration * 1000, 3),
+                            "request_bytes": request_bytes,
+                            "response_bytes": response_bytes,
+                            "client": client[0] if client else None,
+                            "db_queries": queries.count if queries is not None else 0,
+                            "db_time_ms": round(queries.duration * 1000, 3) if queries is not None else 0,
+                        }
+                    },
+                )
+
+
+class JsonAccessFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {"ts": round(record.created, 3), "level": record.levelname, "msg": record.getMessage()}
+        payload.update(getattr(record, "access", {}))
+        return json.dumps(payload, separators=(",", ":"))
+
+
+_listener: Optional[QueueListener] = None
+
+
+def start_access_log(stream=None, level: int = logging.INFO):
+    """Route app.access through a queue so the event loop never blocks on I/O."""
+    global _listener
+    if _listener is not None:
+        return
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(JsonAccessFormatter())
+    _listener = QueueListener(log_queue, handler, respect_handler_level=False)
+    access_logger.handlers = [QueueHandler(log_queue)]
+    access_logger.setLevel(level)
+    access_logger.propagate = False
+    _listener.start()
+
+
+def stop_access_log():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,186 @@
+"""Token-bucket rate limiting per client and route group.
+
+Each (route group, client IP) pair gets a bucket of ``capacity`` tokens that
+refills over ``period`` seconds. Buckets live in a fixed-capacity LRU, so
+memory stays bounded however many clients show up. A client evicted from the
+LRU simply starts again with a full bucket.
+
+With RATE_LIMIT_BACKEND=postgres the buckets are kept in the (UNLOGGED)
+``rate_limit_buckets`` table instead, so limits hold across uvicorn workers
+and pods. Each request then costs one upsert. If the table cannot be
+reached, the limiter lets the request through rather than failing it.
+"""
+import json
+import logging
+import math
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Pattern, Sequence, Tuple
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RouteGroup:
+    name: str
+    methods: Tuple[str, ...]
+    pattern: Pattern[str]
+
+    def matches(self, method: str, path: str) -> bool:
+        return method in self.methods and self.pattern.match(path) is not None
+
+
+ROUTE_GROUPS: Sequence[RouteGroup] = (
+    RouteGroup("auth", ("POST",), re.compile(r"^/api/v1/auth/")),
+    RouteGroup("chat_send", ("POST",), re.compile(r"^/api/v1/chat/rooms/[^/]+/messages$")),
+    RouteGroup("shop_orders", ("POST",), re.compile(r"^/api/v1/shop/orders")),
+    RouteGroup("feed_reads", ("GET",), re.compile(r"^/api/v1/(posts(/|$)|social/stories/feed)")),
+)
+DEFAULT_GROUP = "default"
+
+# (capacity, period in seconds) per route group; override with RATE_LIMITS,
+# e.g. RATE_LIMITS='{"auth": "5/60", "default": "200/1"}'.
+DEFAULT_LIMITS: Dict[str, Tuple[int, float]] = {
+    "auth": (10, 60),
+    "chat_send": (30, 10),
+    "shop_orders": (10, 60),
+    "feed_reads": (120, 60),
+    DEFAULT_GROUP: (100, 1),
+}
+
+EXEMPT_PREFIXES = ("/metrics", "/internal/", "/docs", "/redoc", "/openapi.json")
+
+
+def parse_limits(overrides: Dict[str, str]) -> Dict[str, Tuple[int, float]]:
+    limits = dict(DEFAULT_LIMITS)
+    for group, spec in overrides.items():
+        capacity, _, period = str(spec).partition("/")
+        limits[group] = (int(capacity), float(period or 1))
+    return limits
+
+
+def classify(method: str, path: str) -> str:
+    for group in ROUTE_GROUPS:
+        if group.matches(method, path):
+            return group.name
+    return DEFAULT_GROUP
+
+
+class MemoryBucketStore:
+    """Token buckets in an LRU capped at ``max_keys`` entries (~100 bytes each)."""
+
+    def __init__(self, max_keys: int = 50_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._buckets)
+
+    async def take(self, key: str, capacity: int, period: float, now: Optional[float] = None) -> Tuple[bool, float]:
+        """Spend one token. Returns (allowed, seconds until a token is available)."""
+        now = time.monotonic() if now is None else now
+        rate = capacity / period
+        buckets = self._buckets
+        state = buckets.get(key)
+        if state is None:
+            tokens = float(capacity)
+            if len(buckets) >= self.max_keys:
+                buckets.popitem(last=False)
+                self.evictions += 1
+        else:
+            tokens, updated = state
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            buckets.move_to_end(key)
+
+        if tokens >= 1:
+            buckets[key] = (tokens - 1, now)
+            return True, 0.0
+        buckets[key] = (tokens, now)
+        return False, (1 - tokens) / rate
+
+
+class PostgresBucketStore:
+    """Token buckets shared by all workers, updated with one atomic upsert."""
+
+    PRUNE_INTERVAL = 600  # seconds between deletes of idle buckets
+
+    _TAKE = text("""
+        INSERT INTO rate_limit_buckets AS b (key, tokens, allowed, updated_at)
+        VALUES (:key, :capacity - 1, TRUE, clock_timestamp())
+        ON CONFLICT (key) DO UPDATE SET
+            tokens = CASE
+                WHEN LEAST(:capacity, b.tokens + EXTRACT(EPOCH FROM clock_timestamp() - b.updated_at) * :rate) >= 1
+                THEN LEAST(:capacity, b.tokens + EXTRACT(EPOCH FROM clock_timestamp() - b.updated_at) * :rate) - 1
+                ELSE LEAST(:capacity, b.tokens + EXTRACT(EPOCH FROM clock_timestamp() - b.updated_at) * :rate)
+            END,
+            allowed = LEAST(:capacity, b.tokens + EXTRACT(EPOCH FROM clock_timestamp() - b.updated_at) * :rate) >= 1,
+            updated_at = clock_timestamp()
+        RETURNING allowed, tokens
+    """)
+    _PRUNE = text("DELETE FROM rate_limit_buckets WHERE updated_at < clock_timestamp() - INTERVAL '1 hour'")
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._last_prune = time.monotonic()
+
+    async def take(self, key: str, capacity: int, period: float, now: Optional[float] = None) -> Tuple[bool, float]:
+        rate = capacity / period
+        try:
+            async with self.engine.begin() as conn:
+                row = (await conn.execute(self._TAKE, {"key": key, "capacity": capacity, "rate": rate})).one()
+                if time.monotonic() - self._last_prune > self.PRUNE_INTERVAL:
+                    self._last_prune = time.monotonic()
+                    await conn.execute(self._PRUNE)
+        except Exception as e:
+            logger.warning(f"Rate limit store unavailable, allowing request: {e}")
+            return True, 0.0
+        allowed, tokens = row
+        return allowed, 0.0 if allowed else (1 - float(tokens)) / rate
+
+
+class RateLimitMiddleware:
+    """Pure ASGI middleware answering 429 with Retry-After once a bucket is empty."""
+
+    def __init__(self, app, store=None, limits: Optional[Dict[str, Tuple[int, float]]] = None):
+        self.app = app
+        self.store = store or MemoryBucketStore()
+        self.limits = limits or dict(DEFAULT_LIMITS)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(EXEMPT_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        group = classify(scope["method"], scope["path"])
+        capacity, period = self.limits.get(group, self.limits[DEFAULT_GROUP])
+        client = scope.get("client")
+        key = f"{group}:{client[0] if client else 'unknown'}"
+
+        allowed, retry_after = await self.store.take(key, capacity, period)
+        if allowed:
+            await self.app(scope, receive, send)
+            return
+
+        body = json.dumps({"detail": f"Rate limit exceeded for {group}: {capacity} requests per {period:g}s"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def build_rate_limit_store(settings):
+    if settings.RATE_LIMIT_BACKEND == "postgres":
+        from app.database.base import async_engine
+        return PostgresBucketStore(async_engine)
+    return MemoryBucketStore(max_keys=settings.RATE_LIMIT_MAX_KEYS)
@@ -3,8 +3,9 @@ from sqlalchemy import Column,ForeignKey,DateTime
 from datetime import datetime
 
 from sqlalchemy import (
-    Column, String, Integer, Float, Double, Text, Boolean, DateTime, Time, ForeignKey, Enum, UniqueConstraint, Index, JSON, TIMESTAMP
+    Column, String, Integer, BigInteger, Float, Double, Text, Boolean, DateTime, Time, ForeignKey, Enum, UniqueConstraint, Index, JSON, TIMESTAMP
 )
+from sqlalchemy import func
 from sqlalchemy.dialects.postgresql import UUID, ENUM as PGEnum, JSONB, ARRAY
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -350,6 +351,24 @@ class RefreshToken(Base):
 
     user = relationship("User", back_populates="refresh_tokens")
 
+class EmailOutbox(Base):
+    """Transactional email waiting to be (re)sent by the outbox worker (app.core.email_worker)."""
+    __tablename__ = 'email_outbox'
+    id = Column(BigInteger().with_variant(Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    to_email = Column(String(255), nullable=False)
+    subject = Column(String(255), nullable=False)
+    body = Column(Text, nullable=False)
+    status = Column(String(20), nullable=False, default='pending') # pending | sent | failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now()) # also the claim lease
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index('idx_email_outbox_pending', 'next_attempt_at', postgresql_where=(status == 'pending')),
+    )
+
 # class RideActivityParticipant(Base):
 #     __tablename__ = 'ride_activity_participants'
 #     ride_activity_id = Column(UUID(as_uuid=True), ForeignKey('rides_activities.id', ondelete='CASCADE'), primary_key=True)
@@ -0,0 +1,259 @@
+"""Pub/sub between uvicorn workers for WebSocket delivery.
+
+ConnectionManager only knows the sockets connected to its own process, so
+room broadcasts and personal messages are published on a channel,
+"room:<room_id>" or "user:<user_id>", and every worker delivers what it
+receives to its local sockets. A worker subscribes to a room channel while
+at least one member of the room is connected to it, and to a user channel
+while that user has a socket on it.
+
+Brokers are bound to one handler, `handler(channel, payload, exclude_user_id,
+droppable)`, and `publish()` never waits: the publishing worker delivers to
+its own sockets straight away and ships the payload to the others in the
+background.
+
+InProcessBroker (WS_BROKER=memory) is the single-worker default.
+PostgresBroker (WS_BROKER=postgres) uses LISTEN/NOTIFY on the application
+database, so several workers or pods need no extra service. NOTIFY is
+fire-and-forget: a worker that is reconnecting misses what was sent
+meanwhile, and clients catch up from message history as they do after any
+reconnect.
+"""
+import asyncio
+import logging
+import uuid
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[str, str, Optional[str], bool], None]
+
+
+def room_channel(room_id) -> str:
+    return f"room:{room_id}"
+
+
+def user_channel(user_id) -> str:
+    return f"user:{user_id}"
+
+
+class InProcessBroker:
+    """Single worker: publishing is a direct call to the local handler."""
+
+    def __init__(self):
+        self.handler: Optional[Handler] = None
+        self.published = 0
+
+    def bind(self, handler: Handler):
+        self.handler = handler
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def subscribe(self, channel: str):
+        pass
+
+    def unsubscribe(self, channel: str):
+        pass
+
+    def publish(self, channel: str, payload: str, exclude_user_id: Optional[str] = None,
+                droppable: bool = False):
+        self.published += 1
+        self.handler(channel, payload, exclude_user_id, droppable)
+
+    def render_prometheus(self) -> str:
+        return "# TYPE ws_broker_published_total counter\n" f"ws_broker_published_total {self.published}\n"
+
+
+class PostgresBroker:
+    """LISTEN/NOTIFY on two dedicated asyncpg connections (outside the SQLAlchemy pool).
+
+    The listener connection LISTENs on exactly the channels this worker has
+    local subscribers for and reconnects with `reconnect_delay` when dropped.
+    The publisher drains a queue and sends up to `batch_size` notifications
+    per round trip. A notification is
+
+        "<origin> <key> <index> <total> <chunk>"
+
+    where the chunks joined together are "<exclude_user_id or -> <0|1> <payload>".
+    Payloads over NOTIFY's 8000-byte limit are split into several chunks in
+    the same statement, and therefore the same transaction, so they arrive
+    together and in order. Payloads are ASCII (json.dumps escapes the rest),
+    so characters and bytes are the same thing here.
+    """
+
+    CHUNK_SIZE = 7800
+    MAX_CHANNEL_BYTES = 63  # Postgres identifier limit
+
+    def __init__(self, dsn: str, connect_args: Optional[dict] = None, batch_size: int = 100,
+                 max_pending: int = 10000, reconnect_delay: float = 1.0):
+        self.dsn = dsn
+        self.connect_args = connect_args or {}
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.reconnect_delay = reconnect_delay
+        self.origin = uuid.uuid4().hex[:12]
+        self.handler: Optional[Handler] = None
+        self.channels: Set[str] = set()  # wanted
+        self._listening: Set[str] = set()  # LISTENed on the current connection
+        self._next_key = 0
+        self._partial: Dict[Tuple[str, str], Dict[int, str]] = {}
+        self._outbox: Deque[Tuple[str, str]] = deque()
+        self._outbox_ready = asyncio.Event()
+        self._channels_changed = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self.published = 0
+        self.received = 0
+        self.dropped = 0
+        self.publish_errors = 0
+        self.reconnects = 0
+
+    def bind(self, handler: Handler):
+        self.handler = handler
+
+    async def start(self):
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._listen(), name="ws-broker-listen"),
+                asyncio.create_task(self._publish(), name="ws-broker-publish"),
+            ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def subscribe(self, channel: str):
+        if channel not in self.channels:
+            self.channels.add(channel)
+            self._channels_changed.set()
+
+    def unsubscribe(self, channel: str):
+        if channel in self.channels:
+            self.channels.discard(channel)
+            self._channels_changed.set()
+
+    def publish(self, channel: str, payload: str, exclude_user_id: Optional[str] = None,
+                droppable: bool = False):
+        self.handler(channel, payload, exclude_user_id, droppable)  # our own sockets need no round trip
+        if len(channel.encode()) > self.MAX_CHANNEL_BYTES:
+            logger.warning(f"Channel name too long for NOTIFY, delivered locally only: {channel[:80]}")
+            return
+        body = f"{exclude_user_id or '-'} {int(droppable)} {payload}"
+        chunks = [body[i:i + self.CHUNK_SIZE] for i in range(0, len(body), self.CHUNK_SIZE)]
+        self._next_key += 1
+        for index, chunk in enumerate(chunks):
+            self._outbox.append((channel, f"{self.origin} {self._next_key} {index} {len(chunks)} {chunk}"))
+        while len(self._outbox) > self.max_pending:
+            self._outbox.popleft()
+            self.dropped += 1
+        self._outbox_ready.set()
+
+    def _on_notify(self, connection, pid, channel: str, notification: str):
+        origin, key, index, total, chunk = notification.split(" ", 4)
+        if origin == self.origin:
+            return
+        if total != "1":
+            parts = self._partial.setdefault((origin, key), {})
+            parts[int(index)] = chunk
+            if len(parts) < int(total):
+                return
+            del self._partial[(origin, key)]
+            chunk = "".join(parts[i] for i in range(int(total)))
+        exclude_user_id, droppable, payload = chunk.split(" ", 2)
+        self.received += 1
+        self.handler(channel, payload, None if exclude_user_id == "-" else exclude_user_id, droppable == "1")
+
+    async def _connect(self):
+        return await asyncpg.connect(self.dsn, **self.connect_args)
+
+    async def _listen(self):
+        while True:
+            connection = None
+            try:
+                connection = await self._connect()
+                connection.add_termination_listener(lambda _: self._channels_changed.set())
+                self._listening = set()
+                while not connection.is_closed():
+                    self._channels_changed.clear()
+                    for channel in self.channels - self._listening:
+                        await connection.add_listener(channel, self._on_notify)
+                        self._listening.add(channel)
+                    for channel in self._listening - self.channels:
+                        await connection.remove_listener(channel, self._on_notify)
+                        self._listening.discard(channel)
+                    await self._channels_changed.wait()
+            except asyncio.CancelledError:
+                if connection is not None:
+                    connection.terminate()
+                raise
+            except Exception as e:
+                logger.warning(f"WebSocket broker listener lost its connection: {e}")
+            self.reconnects += 1
+            self._partial.clear()
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def _publish(self):
+        connection = None
+        try:
+            while True:
+                if not self._outbox:
+                    self._outbox_ready.clear()
+                    await self._outbox_ready.wait()
+                    continue
+                batch = [self._outbox.popleft() for _ in range(min(len(self._outbox), self.batch_size))]
+                try:
+                    if connection is None or connection.is_closed():
+                        connection = await self._connect()
+                    # One statement: notifications are queued in array order and
+                    # delivered together when it commits
+                    await connection.execute(
+                        "SELECT pg_notify(c, p) FROM unnest($1::text[], $2::text[]) AS t(c, p)",
+                        [channel for channel, _ in batch],
+                        [notification for _, notification in batch],
+                    )
+                    self.published += len(batch)
+                except Exception as e:
+                    self.publish_errors += len(batch)
+                    logger.warning(f"WebSocket broker dropped {len(batch)} notifications: {e}")
+                    if connection is not None:
+                        connection.terminate()
+                        connection = None
+                    await asyncio.sleep(self.reconnect_delay)
+        finally:
+            if connection is not None:
+                connection.terminate()
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# TYPE ws_broker_published_total counter",
+            f"ws_broker_published_total {self.published}",
+            "# TYPE ws_broker_received_total counter",
+            f"ws_broker_received_total {self.received}",
+            "# TYPE ws_broker_dropped_total counter",
+            f"ws_broker_dropped_total {self.dropped + self.publish_errors}",
+            "# TYPE ws_broker_reconnects_total counter",
+            f"ws_broker_reconnects_total {self.reconnects}",
+            "# TYPE ws_broker_pending gauge",
+            f"ws_broker_pending {len(self._outbox)}",
+            "# TYPE ws_broker_channels gauge",
+            f"ws_broker_channels {len(self.channels)}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+def build_broker(settings):
+    if settings.WS_BROKER == "postgres":
+        from app.database.base import get_async_database_url
+
+        url, connect_args = get_async_database_url(settings.DATABASE_URL)
+        dsn = url.set(drivername="postgresql").render_as_string(hide_password=False)
+        return PostgresBroker(dsn, connect_args)
+    return InProcessBroker()
@@ -1,26 +1,78 @@
-from fastapi import WebSocket, WebSocketDisconnect, Depends, HTTPException, status
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import WebSocket, WebSocketDisconnect, HTTPException, status
 from typing import Dict, List, Set
+import time
 import json
 import logging
 from uuid import UUID
 import asyncio
 
-from app.database.base import get_db
+from app.core.config import settings
+from app.database.base import SessionLocal, async_session_scope
 from app.dependencies import get_current_user_from_token
 from app.crud.chat_crud import chat_crud
 from app.schemas.chat import MessageType, WebSocketEventType
+from app.websocket.broker import InProcessBroker, build_broker, room_channel, user_channel
+from app.websocket.heartbeat import HEARTBEAT_TYPES, HeartbeatMonitor
+from app.websocket.outbound import DROPPABLE_TYPES, TRY_AGAIN_LATER, ClientConnection, encode
+from app.websocket.presence import PresenceRegistry
+from app.websocket.read_receipts import ReadReceiptBatcher
+from app.websocket.typing_indicators import TypingTracker
 
 logger = logging.getLogger(__name__)
 
+POLICY_VIOLATION = 1008
+
 class ConnectionManager:
-    def __init__(self):
+    """
+    Per-process registry of sockets and room subscriptions.
+
+    Messages are published through `broker` on a room or user channel and
+    delivered to local sockets in `deliver()`, so recipients connected to
+    other workers get them too (see app.websocket.broker). This worker stays
+    subscribed to a channel while it has a local socket that wants it.
+
+    `user_rooms` and `room_members` are two views of the same subscriptions
+    and are updated together on join/leave/disconnect, so a room broadcast
+    touches only that room's members, not every connected user.
+
+    Sends never await the socket: a message is encoded once and queued on
+    each recipient's ClientConnection, whose writer task delivers it (see
+    app.websocket.outbound). Replies to the sending socket go through the
+    same queue via `reply()` so frames on a socket stay ordered.
+
+    A worker holds at most WS_MAX_CONNECTIONS sockets; further ones are
+    refused with 1013 before authentication. A user holds at most
+    WS_MAX_CONNECTIONS_PER_USER sockets per worker; connecting another one
+    closes their oldest with 1008, which is usually a socket a reconnecting
+    client left behind.
+    """
+    def __init__(self, broker=None):
         # Store active connections by user_id
         self.active_connections: Dict[str, Set[WebSocket]] = {}
         # Store user_id by websocket for cleanup
         self.websocket_users: Dict[WebSocket, str] = {}
         # Store room subscriptions by user
         self.user_rooms: Dict[str, Set[str]] = {}
+        # Reverse index: subscribed user_ids by room
+        self.room_members: Dict[str, Set[str]] = {}
+        # Outbound queue + writer task per websocket
+        self.clients: Dict[WebSocket, ClientConnection] = {}
+        # Rooms each websocket's user was confirmed a participant of, with expiry
+        self.verified_rooms: Dict[WebSocket, Dict[str, float]] = {}
+        self.broker = broker or InProcessBroker()
+        self.broker.bind(self.deliver)
+        self.refused = 0
+        self.evicted = 0
+
+    def at_capacity(self) -> bool:
+        """Whether this worker already holds WS_MAX_CONNECTIONS sockets"""
+        return 0 < settings.WS_MAX_CONNECTIONS <= len(self.clients)
+
+    async def refuse(self, websocket: WebSocket):
+        """Turn a socket away while at_capacity(), with a code the client can back off on"""
+        self.refused += 1
+        await websocket.accept()
+        await websocket.close(code=TRY_AGAIN_LATER, reason="Too many connections")
 
     async def connect(self, websocket: WebSocket, user_id: str):
         """Accept WebSocket connection and add user to active connections"""
@@ -29,15 +81,32 @@ class ConnectionManager:
         # Add to active connections
         if user_id not in self.active_connections:
             self.active_connections[user_id] = set()
+            self.broker.subscribe(user_channel(user_id))
         self.active_connections[user_id].add(websocket)
         
         # Track user for this websocket
         self.websocket_users[websocket] = user_id
+        client = ClientConnection(
+            websocket,
+            max_queue=settings.WS_SEND_QUEUE_SIZE,
+            max_lag=settings.WS_SLOW_CONSUMER_SECONDS,
+            on_close=self.disconnect,
+        )
+        self.clients[websocket] = client
+        client.start()
         
         # Initialize room subscriptions
         if user_id not in self.user_rooms:
             self.user_rooms[user_id] = set()
         
+        # Over the per-user cap: the oldest sockets go, after the new one is in
+        # so the user's subscriptions survive
+        sockets = self.active_connections[user_id]
+        while 0 < settings.WS_MAX_CONNECTIONS_PER_USER < len(sockets):
+            oldest = min(sockets, key=lambda ws: self.clients[ws].connected_at)
+            self.evicted += 1
+            self.clients[oldest].close_socket(POLICY_VIOLATION, "Too many connections")
+        
         logger.info(f"User {user_id} connected via WebSocket")
 
     def disconnect(self, websocket: WebSocket):
@@ -50,107 +119,167 @@ class ConnectionManager:
                 self.active_connections[user_id].discard(websocket)
                 if not self.active_connections[user_id]:
                     del self.active_connections[user_id]
+                    self.broker.unsubscribe(user_channel(user_id))
                     # Clean up room subscriptions if no active connections
-                    if user_id in self.user_rooms:
-                        del self.user_rooms[user_id]
+                    for room_id in self.user_rooms.pop(user_id, ()):
+                        self._remove_member(room_id, user_id)
             
             # Remove websocket tracking
             del self.websocket_users[websocket]
+            self.verified_rooms.pop(websocket, None)
+            client = self.clients.pop(websocket, None)
+            if client is not None:
+                client.close()
             
             logger.info(f"User {user_id} disconnected from WebSocket")
 
+    def _remove_member(self, room_id: str, user_id: str):
+        members = self.room_members.get(room_id)
+        if members is not None:
+            members.discard(user_id)
+            if not members:
+                del self.room_members[room_id]
+                self.broker.unsubscribe(room_channel(room_id))
+
     async def join_room(self, user_id: str, room_id: str):
         """Subscribe user to a chat room for real-time updates"""
         if user_id in self.user_rooms:
             self.user_rooms[user_id].add(room_id)
+            if room_id not in self.room_members:
+                self.room_members[room_id] = set()
+                self.broker.subscribe(room_channel(room_id))
+            self.room_members[room_id].add(user_id)
             logger.info(f"User {user_id} joined room {room_id}")
 
     async def leave_room(self, user_id: str, room_id: str):
         """Unsubscribe user from a chat room"""
         if user_id in self.user_rooms:
             self.user_rooms[user_id].discard(room_id)
+            self._remove_member(room_id, user_id)
             logger.info(f"User {user_id} left room {room_id}")
 
+    def touch(self, websocket: WebSocket, active: bool = True):
+        """The client sent a frame on this socket (see app.websocket.heartbeat)"""
+        client = self.clients.get(websocket)
+        if client is not None:
+            client.seen(active)
+
+    def is_verified_member(self, websocket: WebSocket, room_id: str) -> bool:
+        """Whether this socket's user was confirmed a participant of the room within WS_MEMBERSHIP_TTL"""
+        expires = self.verified_rooms.get(websocket, {}).get(room_id)
+        return expires is not None and expires > time.monotonic()
+
+    def verified_member(self, websocket: WebSocket, room_id: str):
+        if websocket in self.websocket_users:
+            self.verified_rooms.setdefault(websocket, {})[room_id] = time.monotonic() + settings.WS_MEMBERSHIP_TTL
+
+    def _enqueue(self, payload: str, user_id: str, droppable: bool):
+        # Snapshot: a slow consumer is disconnected inside enqueue
+        for websocket in tuple(self.active_connections.get(user_id, ())):
+            client = self.clients.get(websocket)
+            if client is not None:
+                client.enqueue(payload, droppable)
+
+    def deliver(self, channel: str, payload: str, exclude_user_id: str = None, droppable: bool = False):
+        """Broker callback: hand a published payload to this worker's sockets"""
+        kind, _, key = channel.partition(":")
+        if kind == "user":
+            self._enqueue(payload, key, droppable)
+        elif kind == "room":
+            for user_id in tuple(self.room_members.get(key, ())):
+                if user_id != exclude_user_id:
+                    self._enqueue(payload, user_id, droppable)
+
+    def publish(self, channel: str, message: dict, exclude_user_id: str = None):
+        """Encode a message and publish it on a room or user channel"""
+        self.broker.publish(
+            channel, encode(message), exclude_user_id, droppable=message.get("type") in DROPPABLE_TYPES
+        )
+
     async def send_personal_message(self, message: dict, user_id: str):
-        """Send a message to a specific user across all their connections"""
-        if user_id in self.active_connections:
-            disconnected = []
-            for websocket in self.active_connections[user_id]:
-                try:
-                    await websocket.send_text(json.dumps(message))
-                except Exception as e:
-                    logger.error(f"Error sending message to user {user_id}: {e}")
-                    disconnected.append(websocket)
-            
-            # Clean up disconnected websockets
-            for ws in disconnected:
-                self.disconnect(ws)
+        """Send a message to a specific user across all their connections, on any worker"""
+        self.publish(user_channel(user_id), message)
 
     async def broadcast_to_room(self, message: dict, room_id: str, exclude_user_id: str = None):
-        """Broadcast a message to all users in a specific room"""
-        for user_id, rooms in self.user_rooms.items():
-            if room_id in rooms and user_id != exclude_user_id:
-                await self.send_personal_message(message, user_id)
-
-    async def update_user_online_status(self, user_id: str, is_online: bool, db: AsyncSession):
-        """Update user's online status in database"""
-        try:
-            from sqlalchemy import text
-            
-            update_status = text("""
-                INSERT INTO user_online_status (user_id, is_online, last_seen, updated_at)
-                VALUES (:user_id, :is_online, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                ON CONFLICT (user_id) 
-                DO UPDATE SET 
-                    is_online = :is_online, 
-                    last_seen = CASE WHEN :is_online = false THEN CURRENT_TIMESTAMP ELSE user_online_status.last_seen END,
-                    updated_at = CURRENT_TIMESTAMP
-            """)
-            
-            await db.execute(update_status, {
-                'user_id': user_id,
-                'is_online': is_online
-            })
-            await db.commit()
-            
-            # Notify friends about status change
-            await self.broadcast_status_change(user_id, is_online)
-            
-        except Exception as e:
-            logger.error(f"Error updating online status for user {user_id}: {e}")
-
-    async def broadcast_status_change(self, user_id: str, is_online: bool):
-        """Notify friends when a user's online status changes"""
-        # This would require getting user's friends list and notifying them
-        status_message = {
-            "type": "user_status_change",
-            "data": {
-                "user_id": user_id,
-                "is_online": is_online
-            }
-        }
-        
-        # For now, we'll broadcast to all active users
-        # In production, you'd want to query friends and only notify them
-        for active_user_id in self.active_connections.keys():
-            if active_user_id != user_id:
-                await self.send_personal_message(status_message, active_user_id)
+        """Broadcast a message to all users in a specific room, on any worker"""
+        self.publish(room_channel(room_id), message, exclude_user_id)
+
+    async def send_to_users(self, message: dict, user_ids):
+        """Send one message to several users, encoded once"""
+        payload = encode(message)
+        droppable = message.get("type") in DROPPABLE_TYPES
+        for user_id in user_ids:
+            self.broker.publish(user_channel(user_id), payload, droppable=droppable)
+
+    async def reply(self, websocket: WebSocket, message: dict):
+        """Send a message to one socket, queued behind anything already pending for it"""
+        client = self.clients.get(websocket)
+        if client is not None:
+            client.enqueue(encode(message))
+
+    async def drain(self):
+        """Wait until every queued frame has been sent (tests, benchmarks)"""
+        await asyncio.gather(*(client.wait_idle() for client in tuple(self.clients.values())))
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# TYPE ws_connections gauge",
+            f"ws_connections {len(self.clients)}",
+            "# TYPE ws_connected_users gauge",
+            f"ws_connected_users {len(self.active_connections)}",
+            "# TYPE ws_room_subscriptions gauge",
+            f"ws_room_subscriptions {sum(len(members) for members in self.room_members.values())}",
+            "# TYPE ws_connections_refused_total counter",
+            f"ws_connections_refused_total {self.refused}",
+            "# TYPE ws_connections_evicted_total counter",
+            f"ws_connections_evicted_total {self.evicted}",
+            # Outbound frames held for the busiest socket; the total is ws_outbound_queued_bytes
+            "# TYPE ws_connection_queued_bytes_max gauge",
+            f"ws_connection_queued_bytes_max {max((c.queued_bytes for c in self.clients.values()), default=0)}",
+        ]
+        return "\n".join(lines) + "\n"
 
 # Global connection manager instance
-manager = ConnectionManager()
+manager = ConnectionManager(build_broker(settings))
+presence = PresenceRegistry(
+    manager,
+    SessionLocal,
+    grace=settings.WS_PRESENCE_GRACE_SECONDS,
+    flush_interval=settings.WS_PRESENCE_FLUSH_SECONDS,
+    friends_ttl=settings.WS_PRESENCE_FRIENDS_TTL,
+)
+typing_tracker = TypingTracker(manager, ttl=settings.WS_TYPING_TTL, interval=settings.WS_TYPING_INTERVAL)
+read_receipts = ReadReceiptBatcher(manager, async_session_scope, interval=settings.WS_READ_FLUSH_INTERVAL)
+heartbeat = HeartbeatMonitor(
+    manager,
+    interval=settings.WS_HEARTBEAT_INTERVAL,
+    timeout=settings.WS_HEARTBEAT_TIMEOUT,
+    idle_timeout=settings.WS_IDLE_TIMEOUT,
+)
 
 async def websocket_endpoint(
     websocket: WebSocket,
-    token: str,
-    db: AsyncSession = Depends(get_db)
+    token: str
 ):
-    """Main WebSocket endpoint for chat functionality"""
+    """
+    Main WebSocket endpoint for chat functionality.
+
+    No database session is held for the life of the socket: authentication
+    borrows one at connect, and each event that needs the database opens
+    its own (async_session_scope), so an idle socket holds no pooled
+    connection.
+    """
     user = None
     user_id = None
     
+    if manager.at_capacity():
+        await manager.refuse(websocket)
+        return
+    
     try:
-        # Authenticate user from token
-        user = await get_current_user_from_token(token, db)
+        # Authenticate user from token; the session is released before accept
+        async with async_session_scope() as db:
+            user = await get_current_user_from_token(token, db)
         if not user:
             await websocket.close(code=4001, reason="Authentication failed")
             return
@@ -160,39 +289,40 @@ async def websocket_endpoint(
         # Accept connection
         await manager.connect(websocket, user_id)
         
-        # Update user online status
-        await manager.update_user_online_status(user_id, True, db)
+        # Online now, or still online if this is a reconnect within the grace period
+        presence.connected(user_id)
         
         # Send connection confirmation
-        await websocket.send_text(json.dumps({
+        await manager.reply(websocket, {
             "type": "connection_established",
             "data": {
                 "user_id": user_id,
                 "message": "Connected successfully"
             }
-        }))
+        })
         
         # Message handling loop
         while True:
             try:
                 data = await websocket.receive_text()
                 message_data = json.loads(data)
+                manager.touch(websocket, active=message_data.get("type") not in HEARTBEAT_TYPES)
                 
-                await handle_websocket_message(websocket, message_data, user_id, db)
+                await handle_websocket_message(websocket, message_data, user_id)
                 
             except WebSocketDisconnect:
                 break
             except json.JSONDecodeError:
-                await websocket.send_text(json.dumps({
+                await manager.reply(websocket, {
                     "type": "error",
                     "data": {"message": "Invalid JSON format"}
-                }))
+                })
             except Exception as e:
                 logger.error(f"Error processing WebSocket message: {e}")
-                await websocket.send_text(json.dumps({
+                await manager.reply(websocket, {
                     "type": "error",
                     "data": {"message": "Internal server error"}
-                }))
+                })
     
     except Exception as e:
         logger.error(f"WebSocket connection error: {e}")
@@ -201,14 +331,15 @@ async def websocket_endpoint(
         # Clean up connection
         manager.disconnect(websocket)
         if user_id:
-            # Update user offline status
-            await manager.update_user_online_status(user_id, False, db)
+            # Offline after the grace period, unless another socket is still open
+            presence.disconnected(user_id)
+            if user_id not in manager.active_connections:
+                typing_tracker.forget_user(user_id)
 
 async def handle_websocket_message(
     websocket: WebSocket, 
     message_data: dict, 
-    user_id: str, 
-    db: AsyncSession
+    user_id: str
 ):
     """Handle incoming WebSocket messages"""
     
@@ -220,54 +351,59 @@ async def handle_websocket_message(
             room_id = data.get("room_id")
             if room_id:
                 await manager.join_room(user_id, room_id)
-                await websocket.send_text(json.dumps({
+                await manager.reply(websocket, {
                     "type": "room_joined",
                     "data": {"room_id": room_id}
-                }))
+                })
         
         elif message_type == "leave_room":
             room_id = data.get("room_id")
             if room_id:
                 await manager.leave_room(user_id, room_id)
-                await websocket.send_text(json.dumps({
+                typing_tracker.stop(room_id, user_id, received=False)
+                await manager.reply(websocket, {
                     "type": "room_left",
                     "data": {"room_id": room_id}
-                }))
+                })
         
         elif message_type == "send_message":
-            await handle_send_message(websocket, data, user_id, db)
+            await handle_send_message(websocket, data, user_id)
         
         elif message_type == "typing_start":
-            await handle_typing_indicator(data, user_id, True)
+            handle_typing_indicator(data, user_id, True)
         
         elif message_type == "typing_stop":
-            await handle_typing_indicator(data, user_id, False)
+            handle_typing_indicator(data, user_id, False)
         
         elif message_type == "message_read":
-            await handle_message_read(data, user_id, db)
+            handle_message_read(data, user_id)
         
         elif message_type == "ping":
             # Keep-alive ping
-            await websocket.send_text(json.dumps({
+            await manager.reply(websocket, {
                 "type": "pong",
                 "data": {"timestamp": data.get("timestamp")}
-            }))
+            })
+        
+        elif message_type == "pong":
+            # Answer to a server heartbeat; touch() already recorded it
+            pass
         
         else:
-            await websocket.send_text(json.dumps({
+            await manager.reply(websocket, {
                 "type": "error",
                 "data": {"message": f"Unknown message type: {message_type}"}
-            }))
+            })
     
     except Exception as e:
         logger.error(f"Error handling WebSocket message {message_type}: {e}")
-        await websocket.send_text(json.dumps({
+        await manager.reply(websocket, {
             "type": "error",
             "data": {"message": f"Failed to process {message_type}"}
-        }))
+        })
 
-async def handle_send_message(websocket: WebSocket, data: dict, user_id: str, db: AsyncSession):
-    """Handle sending a new message"""
+async def handle_send_message(websocket: WebSocket, data: dict, user_id: str):
+    """Handle sending a new message, on a session of its own"""
     try:
         from app.schemas.chat import MessageCreate, MessageType
         
@@ -289,9 +425,14 @@ async def handle_send_message(websocket: WebSocket, data: dict, user_id: str, db
             metadata=data.get("metadata")
         )
         
-        message = await chat_crud.send_message(
-            db, UUID(room_id), UUID(user_id), message_data
-        )
+        # The first message in a room on this socket is guarded in SQL; later ones skip the check
+        verified = manager.is_verified_member(websocket, room_id)
+        async with async_session_scope() as db:
+            message = await chat_crud.send_message(
+                db, UUID(room_id), UUID(user_id), message_data, check_membership=not verified
+            )
+        if not verified:
+            manager.verified_member(websocket, room_id)
         
         # Broadcast message to room participants
         broadcast_message = {
@@ -300,59 +441,42 @@ async def handle_send_message(websocket: WebSocket, data: dict, user_id: str, db
         }
         
         await manager.broadcast_to_room(broadcast_message, room_id, exclude_user_id=user_id)
+        typing_tracker.stop(room_id, user_id, received=False)
         
         # Confirm message sent to sender
-        await websocket.send_text(json.dumps({
+        await manager.reply(websocket, {
             "type": "message_sent",
             "data": message
-        }))
+        })
         
     except Exception as e:
         logger.error(f"Error sending message: {e}")
-        await websocket.send_text(json.dumps({
+        await manager.reply(websocket, {
             "type": "error",
             "data": {"message": f"Failed to send message: {str(e)}"}
-        }))
+        })
 
-async def handle_typing_indicator(data: dict, user_id: str, is_typing: bool):
-    """Handle typing indicators"""
+def handle_typing_indicator(data: dict, user_id: str, is_typing: bool):
+    """Handle typing indicators; TypingTracker decides what is broadcast and when"""
     room_id = data.get("room_id")
-    if room_id:
-        typing_message = {
-            "type": "typing_indicator",
-            "data": {
-                "room_id": room_id,
-                "user_id": user_id,
-                "is_typing": is_typing
-            }
-        }
-        
-        await manager.broadcast_to_room(typing_message, room_id, exclude_user_id=user_id)
+    # Only rooms this user has joined on this connection
+    if room_id and room_id in manager.user_rooms.get(user_id, ()):
+        if is_typing:
+            typing_tracker.start(room_id, user_id)
+        else:
+            typing_tracker.stop(room_id, user_id)
 
-async def handle_message_read(data: dict, user_id: str, db: AsyncSession):
-    """Handle message read receipts"""
+def handle_message_read(data: dict, user_id: str):
+    """Handle message read receipts; ReadReceiptBatcher writes and broadcasts them in batches"""
     try:
         room_id = data.get("room_id")
-        message_ids = data.get("message_ids", [])
+        message_ids = data.get("message_ids") or []
         
         if room_id:
-            # Mark messages as read
-            await chat_crud.mark_messages_as_read(
-                db, UUID(room_id), UUID(user_id), 
-                [UUID(mid) for mid in message_ids] if message_ids else None
-            )
-            
-            # Broadcast read receipt to room participants
-            read_receipt_message = {
-                "type": "message_read_receipt",
-                "data": {
-                    "room_id": room_id,
-                    "user_id": user_id,
-                    "message_ids": message_ids
-                }
-            }
-            
-            await manager.broadcast_to_room(read_receipt_message, room_id, exclude_user_id=user_id)
+            # Reject malformed ids here rather than failing the whole batch later
+            UUID(room_id)
+            message_ids = [str(UUID(mid)) for mid in message_ids]
+            read_receipts.mark(room_id, user_id, message_ids)
     
     except Exception as e:
         logger.error(f"Error handling message read: {e}")
@@ -0,0 +1,99 @@
+"""Server-initiated heartbeats and reaping of dead or idle WebSocket connections.
+
+A TCP connection whose client vanished (phone out of coverage, laptop lid
+closed) gives no sign until a send fails, and until then it stays in the
+room index and gets every broadcast queued for it. `HeartbeatMonitor` walks
+this worker's connections every `interval / 2` seconds:
+
+- a socket the client has not sent anything on for `interval` seconds is
+  sent {"type": "ping"} (again every `interval` while it stays quiet); any
+  frame back, normally {"type": "pong"}, counts as a sign of life;
+- a socket silent for `timeout` seconds is reaped;
+- with `idle_timeout` set, a socket that sent nothing but heartbeats for
+  that long is reaped too.
+
+Reaping drops the connection from the ConnectionManager straight away (no
+more fan-out, queued frames freed) and sends close code 1001 in the
+background. One task per worker, whatever the number of sockets.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+from app.websocket.outbound import encode
+
+logger = logging.getLogger(__name__)
+
+# Frames that prove the client is alive but are not activity
+HEARTBEAT_TYPES = frozenset({"ping", "pong"})
+
+GOING_AWAY = 1001
+
+
+class HeartbeatMonitor:
+    def __init__(self, manager, interval: float = 25.0, timeout: float = 60.0, idle_timeout: float = 0.0):
+        self.manager = manager
+        self.interval = interval
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout  # 0 keeps sockets that answer heartbeats forever
+        self.pings_sent = 0
+        self.reaped: Dict[str, int] = {}  # by reason
+        self._task: Optional[asyncio.Task] = None
+
+    def check(self) -> int:
+        """Ping quiet sockets and reap dead or idle ones; returns how many were reaped."""
+        now = time.monotonic()
+        ping = None
+        reaped = 0
+        for client in tuple(self.manager.clients.values()):
+            if self.timeout and now - client.last_seen > self.timeout:
+                self._reap(client, now, "heartbeat_timeout", "Heartbeat timeout")
+                reaped += 1
+            elif self.idle_timeout and now - client.last_active > self.idle_timeout:
+                self._reap(client, now, "idle", "Idle timeout")
+                reaped += 1
+            elif now - client.last_seen >= self.interval and (
+                client.pinged_at is None or now - client.pinged_at >= self.interval
+            ):
+                if ping is None:
+                    ping = encode({"type": "ping", "data": {"timestamp": int(time.time() * 1000)}})
+                client.pinged_at = now
+                if client.enqueue(ping):
+                    self.pings_sent += 1
+        return reaped
+
+    def _reap(self, client, now: float, reason: str, message: str):
+        self.reaped[reason] = self.reaped.get(reason, 0) + 1
+        logger.info(f"Reaping WebSocket connection ({reason}, {now - client.last_seen:.0f}s since last frame)")
+        client.close_socket(GOING_AWAY, message)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval / 2)
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"WebSocket heartbeat check failed: {e}")
+
+    def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self.run(), name="ws-heartbeat")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# TYPE ws_heartbeat_pings_sent_total counter",
+            f"ws_heartbeat_pings_sent_total {self.pings_sent}",
+            "# TYPE ws_connections_reaped_total counter",
+        ]
+        lines += [f'ws_connections_reaped_total{{reason="{r}"}} {n}' for r, n in sorted(self.reaped.items())]
+        return "\n".join(lines) + "\n"
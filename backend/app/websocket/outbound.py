@@ -0,0 +1,238 @@
+"""Per-connection outbound queues for WebSocket fan-out.
+
+A broadcast is JSON-encoded once and the same string is queued on every
+recipient's ClientConnection. Each connection has a bounded queue drained by
+its own writer task, so a slow client only backs up its own queue and never
+delays delivery to the rest of the room. Frames on one socket are sent in
+order, by one task.
+
+Backpressure when a queue is full:
+  1. an incoming droppable frame (typing indicators) is dropped;
+  2. otherwise the oldest queued droppable frame is evicted to make room;
+  3. otherwise the client is disconnected with close code 1013 (try again later).
+A client is also disconnected when the frame it is being sent, or the oldest
+one queued for it, has waited longer than `max_lag` seconds. That check runs
+on enqueue, so the writer can await the socket directly: no wait_for (and no
+extra task) per frame.
+
+Each connection also records when the client was last heard from, for the
+heartbeat monitor (app.websocket.heartbeat), and how many bytes of frames it
+has queued. Broadcast frames are one string shared by every queue, so the
+per-connection byte counts add up to more than the process holds.
+
+Metrics are per process and exported on /metrics.
+"""
+import asyncio
+import json
+import logging
+import time
+from bisect import bisect_left
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from app.middleware.observability import LATENCY_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+# Frames that are only worth delivering promptly; shed first under backpressure
+DROPPABLE_TYPES = frozenset({"typing_indicator"})
+
+TRY_AGAIN_LATER = 1013
+
+
+def encode(message: dict) -> str:
+    # default=str: message rows carry datetimes and UUIDs straight from the database
+    return json.dumps(message, default=str)
+
+
+class FanoutMetrics:
+    """Outbound queue counters. Only touched from the event loop thread."""
+
+    def __init__(self):
+        self.enqueued = 0
+        self.delivered = 0
+        self.dropped: Dict[str, int] = {}  # by reason
+        self.disconnected: Dict[str, int] = {}  # slow consumers, by reason
+        self.queued = 0  # frames waiting across all connections
+        self.queued_bytes = 0  # their payload size, counted once per queue
+        self.queue_depth_max = 0  # deepest single queue seen
+        self.delivery_sum = 0.0
+        self.delivery_buckets: List[int] = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def drop(self, reason: str):
+        self.dropped[reason] = self.dropped.get(reason, 0) + 1
+
+    def disconnect(self, reason: str):
+        self.disconnected[reason] = self.disconnected.get(reason, 0) + 1
+
+    def observe_delivery(self, seconds: float):
+        self.delivered += 1
+        self.delivery_sum += seconds
+        self.delivery_buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# TYPE ws_frames_enqueued_total counter",
+            f"ws_frames_enqueued_total {self.enqueued}",
+            "# TYPE ws_frames_dropped_total counter",
+        ]
+        lines += [f'ws_frames_dropped_total{{reason="{r}"}} {n}' for r, n in sorted(self.dropped.items())]
+        lines.append("# TYPE ws_slow_consumer_disconnects_total counter")
+        lines += [
+            f'ws_slow_consumer_disconnects_total{{reason="{r}"}} {n}' for r, n in sorted(self.disconnected.items())
+        ]
+        lines += [
+            "# TYPE ws_outbound_queued_frames gauge",
+            f"ws_outbound_queued_frames {self.queued}",
+            "# TYPE ws_outbound_queue_depth_max gauge",
+            f"ws_outbound_queue_depth_max {self.queue_depth_max}",
+            "# TYPE ws_outbound_queued_bytes gauge",
+            f"ws_outbound_queued_bytes {self.queued_bytes}",
+            "# TYPE ws_delivery_seconds histogram",
+        ]
+        cumulative = 0
+        for bound, bucket_count in zip(LATENCY_BUCKETS, self.delivery_buckets):
+            cumulative += bucket_count
+            lines.append(f'ws_delivery_seconds_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'ws_delivery_seconds_bucket{{le="+Inf"}} {self.delivered}')
+        lines.append(f"ws_delivery_seconds_sum {self.delivery_sum:.6f}")
+        lines.append(f"ws_delivery_seconds_count {self.delivered}")
+        return "\n".join(lines) + "\n"
+
+
+fanout_metrics = FanoutMetrics()
+
+
+class ClientConnection:
+    """One socket's outbound queue and the writer task that drains it."""
+
+    def __init__(self, websocket: Any, max_queue: int = 256, max_lag: float = 10.0,
+                 on_close: Optional[Callable[[Any], None]] = None,
+                 metrics: FanoutMetrics = fanout_metrics):
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.max_lag = max_lag
+        self.on_close = on_close  # called with the websocket once the writer gives up on it
+        self.metrics = metrics
+        self.closed = False
+        self.queue: Deque[Tuple[str, bool, float]] = deque()  # (payload, droppable, enqueued_at)
+        self.queued_bytes = 0
+        self.connected_at = self.last_seen = self.last_active = time.monotonic()
+        self.pinged_at: Optional[float] = None  # last server heartbeat
+        self._sending_since: Optional[float] = None  # enqueued_at of the frame being sent
+        self._ready = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task: Optional[asyncio.Task] = None
+        self._closer: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._writer())
+
+    def seen(self, active: bool = True):
+        """The client sent a frame; `active` unless it was only a heartbeat."""
+        self.last_seen = time.monotonic()
+        if active:
+            self.last_active = self.last_seen
+
+    def enqueue(self, payload: str, droppable: bool = False) -> bool:
+        """Queue an encoded frame without waiting; False if it was dropped."""
+        if self.closed:
+            return False
+        now = time.monotonic()
+        oldest = self._sending_since if self._sending_since is not None else (
+            self.queue[0][2] if self.queue else None
+        )
+        if oldest is not None and now - oldest > self.max_lag:
+            self.abort("lagging")
+            return False
+        if len(self.queue) >= self.max_queue:
+            if droppable:
+                self.metrics.drop("queue_full")
+                return False
+            if not self._evict_droppable():
+                self.abort("queue_full")
+                return False
+        self.queue.append((payload, droppable, now))
+        self.queued_bytes += len(payload)
+        self.metrics.enqueued += 1
+        self.metrics.queued += 1
+        self.metrics.queued_bytes += len(payload)
+        self.metrics.queue_depth_max = max(self.metrics.queue_depth_max, len(self.queue))
+        self._idle.clear()
+        self._ready.set()
+        return True
+
+    def _evict_droppable(self) -> bool:
+        for i, (payload, droppable, _) in enumerate(self.queue):
+            if droppable:
+                del self.queue[i]
+                self.queued_bytes -= len(payload)
+                self.metrics.queued -= 1
+                self.metrics.queued_bytes -= len(payload)
+                self.metrics.drop("evicted")
+                return True
+        return False
+
+    async def _writer(self):
+        try:
+            while True:
+                if not self.queue:
+                    self._idle.set()
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+                payload, _, enqueued_at = self.queue.popleft()
+                self.queued_bytes -= len(payload)
+                self.metrics.queued -= 1
+                self.metrics.queued_bytes -= len(payload)
+                self._sending_since = enqueued_at
+                await self.websocket.send_text(payload)
+                self._sending_since = None
+                self.metrics.observe_delivery(time.monotonic() - enqueued_at)
+        except Exception as e:
+            logger.info(f"WebSocket send failed, dropping connection: {e}")
+            self.close()
+        finally:
+            self._idle.set()
+
+    def abort(self, reason: str):
+        """Disconnect a slow consumer: drop its queue and close the socket with 1013."""
+        if self.closed:
+            return
+        logger.warning(f"Disconnecting slow WebSocket consumer ({reason}, {len(self.queue)} frames queued)")
+        self.metrics.disconnect(reason)
+        self.close_socket(TRY_AGAIN_LATER, "Slow consumer")
+
+    def close_socket(self, code: int, reason: str):
+        """close(), then send the client a close frame in the background."""
+        if self.closed:
+            return
+        self.close()
+        self._closer = asyncio.create_task(self._close_socket(code, reason))
+
+    async def _close_socket(self, code: int, reason: str):
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code, reason=reason), timeout=1.0)
+        except Exception:
+            pass
+
+    def close(self):
+        """Stop the writer and discard queued frames. Idempotent; does not await."""
+        if self.closed:
+            return
+        self.closed = True
+        self.metrics.queued -= len(self.queue)
+        self.metrics.queued_bytes -= self.queued_bytes
+        self.queue.clear()
+        self.queued_bytes = 0
+        self._idle.set()
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+        if self.on_close is not None:
+            self.on_close(self.websocket)
+
+    async def wait_idle(self):
+        """Wait until everything queued so far has been sent (or the connection closed)."""
+        await self._idle.wait()
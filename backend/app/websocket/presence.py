@@ -0,0 +1,219 @@
+"""Online presence for chat users.
+
+`PresenceRegistry` keeps who is online in memory and is the source of truth
+for status changes; the user_online_status table is a persisted copy for the
+REST queries that join it.
+
+- A user goes online when their first socket connects. When their last socket
+  closes they stay online for `grace` seconds, so a phone that drops and
+  reconnects straight away produces no status change and no write.
+- Changes are announced only to the user's friends (accepted `buddies`
+  rows), loaded through run_db and cached for `friends_ttl` seconds. The
+  friends endpoints evict the cache when a friendship changes.
+- Changes are coalesced per user and written every `flush_interval` seconds
+  as one multi-row upsert.
+
+The registry is per worker: with several workers a user connected to two of
+them is reported offline by the first one they leave.
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.core.auth_cache import TTLCache
+from app.database.executor import run_db
+from app.models_db import Buddy, UserOnlineStatus
+
+logger = logging.getLogger(__name__)
+
+_UPSERTS = {"postgresql": pg_insert, "sqlite": sqlite_insert}
+
+FLUSH_CHUNK = 1000  # rows per upsert statement
+
+
+class PresenceRegistry:
+    def __init__(self, manager, session_factory, grace: float = 10.0, flush_interval: float = 5.0,
+                 friends_ttl: float = 300.0, friends_cache_size: int = 10000):
+        self.manager = manager
+        self.session_factory = session_factory
+        self.grace = grace
+        self.flush_interval = flush_interval
+        self.online: Dict[str, datetime] = {}  # user_id -> online since
+        self.friends = TTLCache(friends_cache_size, friends_ttl)
+        self._going_offline: Dict[str, asyncio.TimerHandle] = {}
+        self._announced_online: Set[str] = set()
+        self._dirty: Dict[str, Tuple[bool, datetime]] = {}
+        self._announcements: Set[asyncio.Task] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.status_changes = 0
+        self.reconnects_in_grace = 0
+        self.rows_flushed = 0
+        self.flushes = 0
+        self.flush_errors = 0
+
+    def is_online(self, user_id: str) -> bool:
+        return user_id in self.online
+
+    def connected(self, user_id: str):
+        """A socket for `user_id` opened on this worker."""
+        pending = self._going_offline.pop(user_id, None)
+        if pending is not None:
+            pending.cancel()
+            self.reconnects_in_grace += 1
+            return
+        if user_id not in self.online:
+            now = datetime.now(timezone.utc)
+            self.online[user_id] = now
+            self._changed(user_id, True, now)
+
+    def disconnected(self, user_id: str):
+        """A socket for `user_id` closed; goes offline after the grace period if it was the last."""
+        if user_id in self.manager.active_connections or user_id not in self.online:
+            return
+        if user_id not in self._going_offline:
+            self._going_offline[user_id] = asyncio.get_running_loop().call_later(
+                self.grace, self._expire, user_id
+            )
+
+    def _expire(self, user_id: str):
+        self._going_offline.pop(user_id, None)
+        if user_id in self.manager.active_connections:
+            return
+        if self.online.pop(user_id, None) is not None:
+            self._changed(user_id, False, datetime.now(timezone.utc))
+
+    def _changed(self, user_id: str, is_online: bool, at: datetime):
+        self.status_changes += 1
+        self._dirty[user_id] = (is_online, at)
+        task = asyncio.create_task(self._announce(user_id))
+        self._announcements.add(task)
+        task.add_done_callback(self._announcements.discard)
+
+    def _load_friends(self, user_id: str) -> List[str]:
+        with self.session_factory() as db:
+            rows = db.execute(
+                select(Buddy.buddy_user_id).where(
+                    Buddy.user_id == uuid.UUID(user_id), Buddy.status == 'accepted'
+                )
+            ).scalars()
+            return [str(friend_id) for friend_id in rows]
+
+    async def friend_ids(self, user_id: str) -> List[str]:
+        friends = self.friends.get(user_id)
+        if friends is None:
+            friends = await run_db(self._load_friends, user_id)
+            self.friends.set(user_id, friends)
+        return friends
+
+    def forget_friends(self, *user_ids):
+        """Drop cached friend lists after a friendship is created or removed."""
+        for user_id in user_ids:
+            self.friends.pop(str(user_id))
+
+    async def _announce(self, user_id: str):
+        try:
+            friends = await self.friend_ids(user_id)
+        except Exception as e:
+            logger.error(f"Could not load friends of {user_id} for a presence update: {e}")
+            return
+        # Send the state as of now, not as of the change: a quick online/offline
+        # pair whose friend lookups finish out of order still ends up correct
+        is_online = user_id in self.online
+        if is_online == (user_id in self._announced_online):
+            return
+        if is_online:
+            self._announced_online.add(user_id)
+        else:
+            self._announced_online.discard(user_id)
+        await self.manager.send_to_users(
+            {"type": "user_status_change", "data": {"user_id": user_id, "is_online": is_online}},
+            friends,
+        )
+
+    def _write(self, batch: Dict[str, Tuple[bool, datetime]]):
+        rows = [
+            {"user_id": uuid.UUID(user_id), "is_online": is_online, "last_seen": at, "updated_at": at}
+            for user_id, (is_online, at) in batch.items()
+        ]
+        with self.session_factory() as db:
+            upsert = _UPSERTS[db.get_bind().dialect.name]
+            for start in range(0, len(rows), FLUSH_CHUNK):
+                statement = upsert(UserOnlineStatus).values(rows[start:start + FLUSH_CHUNK])
+                db.execute(statement.on_conflict_do_update(
+                    index_elements=[UserOnlineStatus.user_id],
+                    set_={
+                        "is_online": statement.excluded.is_online,
+                        "last_seen": statement.excluded.last_seen,
+                        "updated_at": statement.excluded.updated_at,
+                    },
+                ))
+            db.commit()
+
+    async def flush(self) -> int:
+        """Write pending status changes; returns how many rows were written."""
+        if not self._dirty:
+            return 0
+        batch, self._dirty = self._dirty, {}
+        try:
+            await run_db(self._write, batch)
+        except Exception as e:
+            self.flush_errors += 1
+            logger.error(f"Presence flush of {len(batch)} rows failed: {e}")
+            for user_id, state in batch.items():
+                self._dirty.setdefault(user_id, state)  # newer changes win
+            return 0
+        self.flushes += 1
+        self.rows_flushed += len(batch)
+        return len(batch)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run(), name="presence-flush")
+
+    async def stop(self):
+        """Stop flushing; users still online here are written as offline."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for handle in self._going_offline.values():
+            handle.cancel()
+        self._going_offline.clear()
+        now = datetime.now(timezone.utc)
+        for user_id in self.online:
+            self._dirty[user_id] = (False, now)
+        self.online.clear()
+        await self.flush()
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# TYPE ws_presence_online_users gauge",
+            f"ws_presence_online_users {len(self.online)}",
+            "# TYPE ws_presence_status_changes_total counter",
+            f"ws_presence_status_changes_total {self.status_changes}",
+            "# TYPE ws_presence_reconnects_in_grace_total counter",
+            f"ws_presence_reconnects_in_grace_total {self.reconnects_in_grace}",
+            "# TYPE ws_presence_flushes_total counter",
+            f"ws_presence_flushes_total {self.flushes}",
+            "# TYPE ws_presence_rows_flushed_total counter",
+            f"ws_presence_rows_flushed_total {self.rows_flushed}",
+            "# TYPE ws_presence_flush_errors_total counter",
+            f"ws_presence_flush_errors_total {self.flush_errors}",
+            "# TYPE ws_presence_pending_writes gauge",
+            f"ws_presence_pending_writes {len(self._dirty)}",
+        ]
+        return "\n".join(lines) + "\n"
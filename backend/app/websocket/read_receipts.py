@@ -0,0 +1,107 @@
+"""Coalesced read receipts for chat rooms.
+
+Clients send `message_read` on every scroll step, often several per second
+while catching up on a busy room. `ReadReceiptBatcher` collects them per
+(room, user) and, `interval` seconds after the first one, writes them with a
+single `chat_crud.mark_messages_as_read` call and broadcasts one merged
+`message_read_receipt` to the room.
+
+A `message_read` without `message_ids` marks the whole room read; it
+supersedes any ids queued for the same room and user, so only the
+high-water mark moves and no per-message rows are written.
+"""
+import asyncio
+import logging
+from typing import Callable, Dict, Optional, Set, Tuple
+from uuid import UUID
+
+from app.crud.chat_crud import chat_crud
+from app.websocket.broker import room_channel
+
+logger = logging.getLogger(__name__)
+
+Key = Tuple[str, str]  # (room_id, user_id)
+
+
+class ReadReceiptBatcher:
+    def __init__(self, manager, session_scope: Callable, interval: float = 0.5):
+        self.manager = manager
+        self.session_scope = session_scope
+        self.interval = interval
+        # None: the whole room, otherwise the message ids read since the last flush
+        self.pending: Dict[Key, Optional[Set[str]]] = {}
+        self._timers: Dict[Key, asyncio.TimerHandle] = {}
+        self._flushing: Set[asyncio.Task] = set()
+        self.events_received = 0
+        self.flushes = 0
+        self.ids_flushed = 0
+        self.flush_errors = 0
+
+    def mark(self, room_id: str, user_id: str, message_ids=None):
+        """Queue a read event; written and broadcast on the next flush for this room and user."""
+        self.events_received += 1
+        key = (room_id, user_id)
+        if not message_ids:
+            self.pending[key] = None
+        elif key not in self.pending:
+            self.pending[key] = set(message_ids)
+        elif self.pending[key] is not None:
+            self.pending[key].update(message_ids)
+        if key not in self._timers:
+            self._timers[key] = asyncio.get_running_loop().call_later(self.interval, self._due, key)
+
+    def _due(self, key: Key):
+        self._timers.pop(key, None)
+        task = asyncio.create_task(self.flush(key))
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    async def flush(self, key: Key):
+        if key not in self.pending:
+            return
+        room_id, user_id = key
+        message_ids = self.pending.pop(key)
+        try:
+            async with self.session_scope() as db:
+                await chat_crud.mark_messages_as_read(
+                    db, UUID(room_id), UUID(user_id),
+                    [UUID(mid) for mid in message_ids] if message_ids else None,
+                )
+        except Exception as e:
+            self.flush_errors += 1
+            logger.error(f"Could not mark messages read in room {room_id} for {user_id}: {e}")
+            return
+        self.flushes += 1
+        self.ids_flushed += len(message_ids or ())
+        self.manager.publish(room_channel(room_id), {
+            "type": "message_read_receipt",
+            "data": {
+                "room_id": room_id,
+                "user_id": user_id,
+                "message_ids": sorted(message_ids or ()),
+            }
+        }, exclude_user_id=user_id)
+
+    async def flush_all(self):
+        """Write everything still queued (shutdown)."""
+        for handle in self._timers.values():
+            handle.cancel()
+        self._timers.clear()
+        await asyncio.gather(*tuple(self._flushing), return_exceptions=True)
+        for key in list(self.pending):
+            await self.flush(key)
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# TYPE ws_read_events_received_total counter",
+            f"ws_read_events_received_total {self.events_received}",
+            "# TYPE ws_read_flushes_total counter",
+            f"ws_read_flushes_total {self.flushes}",
+            "# TYPE ws_read_message_ids_flushed_total counter",
+            f"ws_read_message_ids_flushed_total {self.ids_flushed}",
+            "# TYPE ws_read_flush_errors_total counter",
+            f"ws_read_flush_errors_total {self.flush_errors}",
+            "# TYPE ws_read_pending gauge",
+            f"ws_read_pending {len(self.pending)}",
+        ]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,109 @@
+"""In-memory typing indicators.
+
+Clients send typing_start on (nearly) every keystroke and typing_stop when
+they pause or send. Rebroadcasting each frame made typing the largest share
+of WebSocket traffic in group chats, so `TypingTracker` keeps the state
+instead and broadcasts only transitions:
+
+- a typing_start from someone already shown as typing just extends their
+  expiry (`ttl` seconds); nothing is sent;
+- someone whose last typing_start is older than `ttl` stops typing on their
+  own, so a client that vanishes mid-word does not type forever;
+- while anyone is typing in a room, its changes go out at most once per
+  `interval` seconds. A start followed by a stop inside one interval sends
+  nothing at all.
+
+State is per worker and never touches the database (the typing_indicators
+table in the SQL schema is unused).
+"""
+import asyncio
+import time
+from typing import Dict, Set
+
+from app.websocket.broker import room_channel
+
+
+class TypingTracker:
+    def __init__(self, manager, ttl: float = 6.0, interval: float = 1.0):
+        self.manager = manager
+        self.ttl = ttl
+        self.interval = interval
+        self.typing: Dict[str, Dict[str, float]] = {}  # room_id -> user_id -> expires_at
+        self.announced: Dict[str, Set[str]] = {}  # room_id -> user_ids last broadcast as typing
+        self._last_sent: Dict[str, float] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self.frames_received = 0
+        self.events_sent = 0
+
+    def start(self, room_id: str, user_id: str):
+        self.frames_received += 1
+        now = time.monotonic()
+        self.typing.setdefault(room_id, {})[user_id] = now + self.ttl
+        if user_id in self.announced.get(room_id, ()):
+            self._schedule(room_id, now + self.ttl)  # no-op unless nothing is scheduled
+        else:
+            self._schedule(room_id, self._next_send(room_id, now))
+
+    def stop(self, room_id: str, user_id: str, received: bool = True):
+        """typing_stop, or `received=False` when the user sent a message / left the room."""
+        if received:
+            self.frames_received += 1
+        users = self.typing.get(room_id)
+        if users is not None and users.pop(user_id, None) is not None:
+            self._schedule(room_id, self._next_send(room_id, time.monotonic()))
+
+    def forget_user(self, user_id: str):
+        """The user's last socket on this worker closed."""
+        for room_id in [room_id for room_id, users in self.typing.items() if user_id in users]:
+            self.stop(room_id, user_id, received=False)
+
+    def _next_send(self, room_id: str, now: float) -> float:
+        return max(now, self._last_sent.get(room_id, 0.0) + self.interval)
+
+    def _schedule(self, room_id: str, when: float):
+        timer = self._timers.get(room_id)
+        if timer is not None:
+            if timer.when() <= when:
+                return
+            timer.cancel()
+        loop = asyncio.get_running_loop()
+        # TimerHandle.when() is on the loop clock; keep our monotonic times relative to it
+        self._timers[room_id] = loop.call_at(loop.time() + (when - time.monotonic()), self._flush, room_id)
+
+    def _flush(self, room_id: str):
+        self._timers.pop(room_id, None)
+        now = time.monotonic()
+        users = self.typing.get(room_id, {})
+        for user_id in [user_id for user_id, expires_at in users.items() if expires_at <= now]:
+            del users[user_id]
+        current = set(users)
+        announced = self.announced.get(room_id, set())
+        changes = [(user_id, True) for user_id in current - announced]
+        changes += [(user_id, False) for user_id in announced - current]
+        for user_id, is_typing in changes:
+            self.manager.publish(
+                room_channel(room_id),
+                {"type": "typing_indicator", "data": {"room_id": room_id, "user_id": user_id, "is_typing": is_typing}},
+                exclude_user_id=user_id,
+            )
+        self.events_sent += len(changes)
+        if changes:
+            self._last_sent[room_id] = now
+        if current:
+            self.announced[room_id] = current
+            self._schedule(room_id, min(users.values()))
+        else:
+            self.typing.pop(room_id, None)
+            self.announced.pop(room_id, None)
+            self._last_sent.pop(room_id, None)
+
+    def render_prometheus(self) -> str:
+        lines = [
+            "# TYPE ws_typing_frames_received_total counter",
+            f"ws_typing_frames_received_total {self.frames_received}",
+            "# TYPE ws_typing_events_sent_total counter",
+            f"ws_typing_events_sent_total {self.events_sent}",
+            "# TYPE ws_typing_active_rooms gauge",
+            f"ws_typing_active_rooms {len(self.typing)}",
+        ]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Email outbox: request-side latency and worker throughput against a local SMTP sink.
+
+Compares what the request pays per email, a fresh SMTP connection per
+message (the old send_email) versus one INSERT into email_outbox. It then
+drains the outbox with EmailOutboxWorker and reports emails/s, SMTP
+connections used and enqueue-to-delivery latency:
+
+    python benchmarks/bench_email_outbox.py --emails 500
+    python benchmarks/bench_email_outbox.py --database-url postgresql://... --emails 2000
+
+With --database-url the email_outbox table must exist (alembic upgrade head);
+rows created by the run are deleted afterwards.
+"""
+
+import argparse
+import asyncio
+import smtplib
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return statistics.median(samples) * 1000, samples[max(int(len(samples) * 0.95) - 1, 0)] * 1000
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--database-url", default=None, help="default: in-memory SQLite")
+    args = parser.parse_args()
+
+    from sqlalchemy import create_engine, delete
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+
+    from app.core.email import SmtpTransport, build_message
+    from app.core.email_worker import EmailOutboxWorker
+    from app.core.smtp_sink import SmtpSink
+    from app.crud.email_outbox import enqueue_email
+    from app.database.executor import run_db
+    from app.models_db import EmailOutbox
+
+    if args.database_url:
+        engine = create_engine(args.database_url)
+    else:
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        EmailOutbox.__table__.create(engine)
+    Session = sessionmaker(bind=engine)
+    sink = await SmtpSink().start()
+
+    def send_directly(i):
+        with smtplib.SMTP("127.0.0.1", sink.port) as smtp:
+            smtp.send_message(build_message(f"user{i}@example.com", "Reset", "link", sender="bench@example.com"))
+
+    def enqueue(i):
+        with Session() as db:
+            return enqueue_email(db, f"user{i}@example.com", "Reset", "link").id
+
+    direct, queued, ids = [], [], []
+    for i in range(min(args.emails, 200)):
+        start = time.perf_counter()
+        await run_db(send_directly, i)
+        direct.append(time.perf_counter() - start)
+    for i in range(args.emails):
+        start = time.perf_counter()
+        ids.append(await run_db(enqueue, i))
+        queued.append(time.perf_counter() - start)
+
+    print(f"{'per request':<28} {'p50 ms':>8} {'p95 ms':>8}")
+    print(f"{'SMTP connect + send':<28} {percentiles(direct)[0]:>8.2f} {percentiles(direct)[1]:>8.2f}")
+    print(f"{'outbox INSERT':<28} {percentiles(queued)[0]:>8.2f} {percentiles(queued)[1]:>8.2f}")
+
+    sink.messages.clear()
+    sink.connections = 0
+    worker = EmailOutboxWorker(
+        Session, SmtpTransport("127.0.0.1", sink.port, use_tls=False), batch_size=args.batch_size
+    )
+    start = time.perf_counter()
+    while await worker.process_batch():
+        pass
+    elapsed = time.perf_counter() - start
+    await worker.stop()
+    await sink.stop()
+
+    print(
+        f"\nworker: {worker.sent} emails in {elapsed:.2f}s = {worker.sent / elapsed:.0f} emails/s, "
+        f"{worker.batches} batches, {sink.connections} SMTP connection(s), "
+        f"mean enqueue->delivered {worker.delivery_seconds_sum / max(worker.sent, 1) * 1000:.0f} ms"
+    )
+
+    if args.database_url:
+        with Session() as db:
+            db.execute(delete(EmailOutbox).where(EmailOutbox.id.in_(ids)))
+            db.commit()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Login throughput and event-loop stall for password verification.
+
+In-process (no server or database needed): verify N bcrypt hashes
+concurrently, inline on the event loop versus through PasswordHasher, and
+report logins/s and the worst loop stall seen by a 5 ms ticker:
+
+    python benchmarks/bench_login.py --logins 64 --rounds 12
+
+Against a running API, with an existing account:
+
+    python benchmarks/bench_login.py --base-url http://localhost:8000 \\
+        --email user@example.com --password secret --concurrency 20
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+async def with_loop_lag(work):
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lags.append(time.perf_counter() - start - 0.005)
+
+    tick_task = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    await work()
+    elapsed = time.perf_counter() - start
+    done.set()
+    await tick_task
+    return elapsed, max(lags, default=0.0)
+
+
+async def bench_in_process(logins: int, rounds: int, workers: int):
+    from passlib.context import CryptContext
+
+    from app.core.password_hashing import PasswordHasher
+
+    context = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=rounds)
+    stored = context.hash("correct horse")
+    hasher = PasswordHasher(context, workers=workers, max_queue=logins)
+
+    async def inline():
+        for _ in range(logins):
+            context.verify("correct horse", stored)
+            await asyncio.sleep(0)
+
+    async def offloaded():
+        await asyncio.gather(*(hasher.verify("correct horse", stored) for _ in range(logins)))
+
+    try:
+        for label, work in (("inline", inline), (f"executor x{workers}", offloaded)):
+            elapsed, lag = await with_loop_lag(work)
+            print(f"{label:<14} {logins / elapsed:8.1f} logins/s   max loop stall {lag * 1000:8.1f} ms")
+    finally:
+        hasher.shutdown()
+
+
+async def bench_http(base_url: str, email: str, password: str, concurrency: int, duration: float):
+    import httpx
+
+    latencies, statuses = [], []
+
+    async def hammer(client, deadline):
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            response = await client.post("/api/v1/auth/login", json={"email": email, "password": password})
+            latencies.append(time.perf_counter() - start)
+            statuses.append(response.status_code)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(hammer(client, deadline) for _ in range(concurrency)))
+
+    latencies.sort()
+    ok = statuses.count(200)
+    print(
+        f"{ok / duration:.1f} logins/s (n={len(latencies)}, ok={ok}, 503={statuses.count(503)}, "
+        f"p50={statistics.median(latencies) * 1000:.1f}ms, "
+        f"p95={latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f}ms)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=32, help="in-process: verifications per mode")
+    parser.add_argument("--rounds", type=int, default=12, help="in-process: bcrypt cost factor")
+    parser.add_argument("--workers", type=int, default=2, help="in-process: PasswordHasher threads")
+    parser.add_argument("--base-url", default=None, help="benchmark a running API instead")
+    parser.add_argument("--email")
+    parser.add_argument("--password")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=15.0)
+    args = parser.parse_args()
+
+    if args.base_url:
+        if not (args.email and args.password):
+            parser.error("--base-url needs --email and --password")
+        asyncio.run(bench_http(args.base_url, args.email, args.password, args.concurrency, args.duration))
+    else:
+        asyncio.run(bench_in_process(args.logins, args.rounds, args.workers))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Requests/sec for the async-session routers under each DB_SESSION_MODE.
+
+Start the API once per mode, then point this script at it:
+
+    DB_SESSION_MODE=async uvicorn app.main:app --workers 1
+    python benchmarks/bench_session_modes.py --token <JWT> --label async
+
+    DB_SESSION_MODE=sync uvicorn app.main:app --workers 1
+    python benchmarks/bench_session_modes.py --token <JWT> --label sync
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+DEFAULT_PATHS = ["/api/v1/chat/rooms", "/api/v1/friends/"]
+
+
+async def hammer(client: httpx.AsyncClient, path: str, deadline: float, latencies: list, errors: list):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await client.get(path)
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            errors.append(response.status_code)
+
+
+async def bench_path(base_url: str, token: str, path: str, concurrency: int, duration: float):
+    latencies, errors = [], []
+    headers = {"Authorization": f"Bearer {token}"}
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=30) as client:
+        await client.get(path)  # warm up the pools
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(hammer(client, path, deadline, latencies, errors) for _ in range(concurrency)))
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "rps": len(latencies) / duration,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "errors": len(errors),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--token", required=True, help="Bearer token for an existing user")
+    parser.add_argument("--label", default="", help="Tag for the output, e.g. async or sync")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--path", action="append", dest="paths")
+    args = parser.parse_args()
+
+    for path in args.paths or DEFAULT_PATHS:
+        result = await bench_path(args.base_url, args.token, path, args.concurrency, args.duration)
+        print(
+            f"[{args.label or 'run'}] {path}: {result['rps']:.1f} req/s "
+            f"(n={result['requests']}, p50={result['p50_ms']:.1f}ms, "
+            f"p95={result['p95_ms']:.1f}ms, errors={result['errors']})"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
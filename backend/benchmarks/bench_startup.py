@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Cold-start profile of the API: import time per router module and for app.main.
+
+Each measurement runs in a fresh interpreter so module caches do not hide
+the cost. Router times are incremental: the shared stack (FastAPI,
+SQLAlchemy, settings, models) is imported first and reported separately.
+
+    python benchmarks/bench_startup.py                # report
+    python benchmarks/bench_startup.py --budget 2.5   # exit 1 if app.main import exceeds 2.5s
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+ENDPOINTS_DIR = BACKEND_DIR / "app" / "api" / "v1" / "endpoints"
+
+SHARED_IMPORTS = [
+    "fastapi",
+    "sqlalchemy.orm",
+    "app.core.config",
+    "app.database.base",
+    "app.models_db",
+]
+
+_TIMER = """
+import importlib, sys, time
+for name in {preload!r}:
+    importlib.import_module(name)
+start = time.perf_counter()
+importlib.import_module({target!r})
+print(time.perf_counter() - start)
+"""
+
+
+def time_import(target: str, preload=()) -> float:
+    code = _TIMER.format(preload=list(preload), target=target)
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=BACKEND_DIR,
+        env=os.environ.copy(),
+        capture_output=True,
+        text=True,
+    )
+    if out.returncode != 0:
+        raise RuntimeError(f"import of {target} failed:\n{out.stderr.strip()}")
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def router_modules():
+    from_main = (BACKEND_DIR / "app" / "main.py").read_text()
+    for path in sorted(ENDPOINTS_DIR.glob("*.py")):
+        if path.stem != "__init__" and f"import {path.stem}" in from_main:
+            yield f"app.api.v1.endpoints.{path.stem}"
+
+
+def best_of(runs: int, target: str, preload=()) -> float:
+    return min(time_import(target, preload) for _ in range(runs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters per measurement (best is kept)")
+    parser.add_argument("--budget", type=float, default=None, help="max seconds for importing app.main")
+    args = parser.parse_args()
+
+    shared = best_of(args.runs, SHARED_IMPORTS[-1], SHARED_IMPORTS[:-1])
+    rows = [(module, best_of(args.runs, module, SHARED_IMPORTS)) for module in router_modules()]
+    total = best_of(args.runs, "app.main")
+
+    print(f"{'module':<45} {'ms':>8}")
+    print(f"{'(shared stack, see SHARED_IMPORTS)':<45} {shared * 1000:>8.1f}")
+    for module, seconds in sorted(rows, key=lambda r: r[1], reverse=True):
+        print(f"{module:<45} {seconds * 1000:>8.1f}")
+    print(f"{'app.main (cold, total)':<45} {total * 1000:>8.1f}")
+
+    if args.budget is not None and total > args.budget:
+        print(f"FAIL: app.main import took {total:.2f}s, budget is {args.budget:.2f}s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Typing-indicator fan-out in a busy group chat.
+
+--typers of the --members in a room type in bursts, sending typing_start on
+every keystroke (--keystroke-ms apart) and a message at the end of each
+burst. The same --seconds of activity is replayed twice: once rebroadcasting
+every frame verbatim (the old handle_typing_indicator), once through
+TypingTracker. Reports frames delivered to room members:
+
+    python benchmarks/bench_typing.py
+    python benchmarks/bench_typing.py --members 200 --typers 20 --seconds 10
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_ws_fanout import NullWebSocket  # noqa: E402
+
+
+async def typist(user_id, args, on_keystroke, on_send, deadline, rng):
+    while time.monotonic() < deadline:
+        burst_end = time.monotonic() + rng.uniform(0.5, 2.5)
+        while time.monotonic() < min(burst_end, deadline):
+            on_keystroke(user_id)
+            await asyncio.sleep(args.keystroke_ms / 1000 * rng.uniform(0.5, 1.5))
+        on_send(user_id)
+        await asyncio.sleep(rng.uniform(0.5, 3.0))  # reading replies
+
+
+async def replay(args, label, make_handlers):
+    from app.websocket.chat_websocket import ConnectionManager
+
+    manager = ConnectionManager()
+    sockets = [NullWebSocket() for _ in range(args.members)]
+    for i, ws in enumerate(sockets):
+        await manager.connect(ws, f"user-{i}")
+        await manager.join_room(f"user-{i}", "room")
+    on_keystroke, on_send, tracker = make_handlers(manager)
+
+    rng = random.Random(args.seed)
+    deadline = time.monotonic() + args.seconds
+    await asyncio.gather(*(
+        typist(f"user-{i}", args, on_keystroke, on_send, deadline, rng) for i in range(args.typers)
+    ))
+    await asyncio.sleep(tracker.interval if tracker else 0)
+    await manager.drain()
+    frames = sum(ws.frames for ws in sockets)
+    for ws in list(manager.clients):
+        manager.disconnect(ws)
+    print(f"{label:<22} {frames:>9} frames  {frames / args.seconds:>9.0f} frames/s")
+    return frames
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=50)
+    parser.add_argument("--typers", type=int, default=5)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--keystroke-ms", type=float, default=150.0)
+    parser.add_argument("--ttl", type=float, default=6.0)
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    from app.websocket.typing_indicators import TypingTracker
+
+    def verbatim(manager):
+        def frame(user_id, is_typing):
+            manager.publish("room:room", {
+                "type": "typing_indicator",
+                "data": {"room_id": "room", "user_id": user_id, "is_typing": is_typing},
+            }, exclude_user_id=user_id)
+        return (lambda user_id: frame(user_id, True)), (lambda user_id: frame(user_id, False)), None
+
+    def tracked(manager):
+        tracker = TypingTracker(manager, ttl=args.ttl, interval=args.interval)
+        return (
+            lambda user_id: tracker.start("room", user_id),
+            lambda user_id: tracker.stop("room", user_id, received=False),
+            tracker,
+        )
+
+    print(f"{args.typers} of {args.members} members typing for {args.seconds:g}s")
+    before = await replay(args, "verbatim rebroadcast", verbatim)
+    after = await replay(args, "TypingTracker", tracked)
+    print(f"{before / max(after, 1):.1f}x fewer typing frames")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Room broadcast cost and delivery latency in ConnectionManager.
+
+Simulates --users connected users spread over --rooms rooms (each user joins
+--rooms-per-user rooms) using no-op sockets, then times --broadcasts room
+broadcasts through ConnectionManager.broadcast_to_room and through the old
+scan of every user's subscriptions. It then compares one --room-size room
+fanned out the old way (json.dumps per socket, sends awaited one by one)
+against encode-once + per-connection send queues, first with all clients
+fast and then with one client taking --slow-ms per frame, reporting the
+delivery latency the fast clients see:
+
+    python benchmarks/bench_ws_fanout.py                     # 10k users, 2k rooms
+    python benchmarks/bench_ws_fanout.py --users 50000 --rooms 10000
+    python benchmarks/bench_ws_fanout.py --room-size 500 --slow-ms 100
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+class NullWebSocket:
+    __slots__ = ("frames",)
+
+    def __init__(self):
+        self.frames = 0
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        self.frames += 1
+
+    async def send_bytes(self, data: bytes):
+        self.frames += 1
+
+    async def close(self, code: int = 1000, reason: str = None):
+        pass
+
+
+class TimedWebSocket(NullWebSocket):
+    """Records when each broadcast reached it; optionally slow to accept a frame."""
+    __slots__ = ("delay", "clock", "latencies")
+
+    def __init__(self, clock, delay=0.0):
+        super().__init__()
+        self.delay = delay
+        self.clock = clock
+        self.latencies = []
+
+    async def send_text(self, text: str):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.frames += 1
+        self.latencies.append(time.perf_counter() - self.clock[json.loads(text)["data"]["seq"]])
+
+
+async def legacy_broadcast(manager, message, room_id, exclude_user_id=None):
+    """broadcast_to_room before the room index: scan every connected user."""
+    for user_id, rooms in manager.user_rooms.items():
+        if room_id in rooms and user_id != exclude_user_id:
+            await manager.send_personal_message(message, user_id)
+
+
+async def sequential_broadcast(manager, message, room_id):
+    """broadcast_to_room before send queues: encode per socket, await each send in turn."""
+    for user_id in tuple(manager.room_members.get(room_id, ())):
+        for websocket in manager.active_connections.get(user_id, ()):
+            await websocket.send_text(json.dumps(message))
+
+
+def chat_message(seq):
+    return {
+        "type": "new_message",
+        "data": {
+            "seq": seq,
+            "id": "6f1c2a9e-0d55-4a63-9a57-3f1d2b7c8e90",
+            "room_id": "2b9d1e44-7c1a-4f0e-8d3b-5a6c7e8f9a0b",
+            "sender_id": "9e8d7c6b-5a4f-4e3d-2c1b-0a9f8e7d6c5b",
+            "sender_name": "runner42",
+            "sender_display_name": "Morning Runner",
+            "sender_avatar": "https://res.cloudinary.com/demo/image/upload/v1/avatars/runner42.jpg",
+            "message_type": "text",
+            "content": "See everyone at the track at 6? Bringing the new interval plan. " * 4,
+            "media_urls": [],
+            "metadata": None,
+            "created_at": "2024-05-01T06:00:00+00:00",
+        },
+    }
+
+
+async def room_index(args):
+    from app.websocket.chat_websocket import ConnectionManager
+
+    random.seed(args.seed)
+    manager = ConnectionManager()
+    sockets = []
+    for i in range(args.users):
+        ws = NullWebSocket()
+        sockets.append(ws)
+        await manager.connect(ws, f"user-{i}")
+        for room in random.sample(range(args.rooms), args.rooms_per_user):
+            await manager.join_room(f"user-{i}", f"room-{room}")
+
+    sizes = [len(members) for members in manager.room_members.values()]
+    print(f"{args.users} users, {len(sizes)} rooms, mean room size {sum(sizes) / len(sizes):.1f}")
+
+    targets = [f"room-{random.randrange(args.rooms)}" for _ in range(args.broadcasts)]
+    message = {"type": "typing_indicator", "data": {"is_typing": True}}
+    for label, broadcast in (
+        ("legacy full scan", lambda room: legacy_broadcast(manager, message, room)),
+        ("room index", lambda room: manager.broadcast_to_room(message, room)),
+    ):
+        before = sum(ws.frames for ws in sockets)
+        start = time.perf_counter()
+        for room in targets:
+            await broadcast(room)
+        await manager.drain()
+        elapsed = time.perf_counter() - start
+        frames = sum(ws.frames for ws in sockets) - before
+        print(
+            f"{label:<18} {args.broadcasts / elapsed:10.0f} broadcasts/s "
+            f"{elapsed / args.broadcasts * 1e6:10.1f} us/broadcast  ({frames} frames)"
+        )
+    for ws in list(manager.clients):
+        manager.disconnect(ws)
+
+
+async def one_room(args, slow_ms):
+    from app.websocket.chat_websocket import ConnectionManager
+
+    clock = {}
+    manager = ConnectionManager()
+    fast = [TimedWebSocket(clock) for _ in range(args.room_size)]
+    sockets = fast + ([TimedWebSocket(clock, slow_ms / 1000)] if slow_ms else [])
+    for i, ws in enumerate(sockets):
+        await manager.connect(ws, f"user-{i}")
+        await manager.join_room(f"user-{i}", "room")
+
+    results = {}
+    seq = 0
+    for label, broadcast in (
+        ("sequential, dumps each", lambda message: sequential_broadcast(manager, message, "room")),
+        ("encode once + queues", lambda message: manager.broadcast_to_room(message, "room")),
+    ):
+        for ws in fast:
+            ws.latencies.clear()
+        start = time.perf_counter()
+        for _ in range(args.room_broadcasts):
+            seq += 1
+            clock[seq] = time.perf_counter()
+            await broadcast(chat_message(seq))
+            await asyncio.sleep(0)  # other handlers get a turn between broadcasts
+        handler_time = time.perf_counter() - start
+        await asyncio.gather(*(manager.clients[ws].wait_idle() for ws in fast))
+        latencies = sorted(latency for ws in fast for latency in ws.latencies)
+        results[label] = (
+            handler_time / args.room_broadcasts * 1e3,
+            statistics.median(latencies) * 1e3,
+            latencies[int(len(latencies) * 0.99) - 1] * 1e3,
+        )
+    for ws in list(manager.clients):
+        manager.disconnect(ws)
+
+    title = f"{args.room_size} fast clients" + (f" + 1 client at {slow_ms:g} ms/frame" if slow_ms else "")
+    print(f"\n{title}, {args.room_broadcasts} broadcasts")
+    print(f"{'':<24} {'handler ms':>11} {'fast p50 ms':>12} {'fast p99 ms':>12}")
+    for label, (handler_ms, p50, p99) in results.items():
+        print(f"{label:<24} {handler_ms:>11.2f} {p50:>12.2f} {p99:>12.2f}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--rooms", type=int, default=2_000)
+    parser.add_argument("--rooms-per-user", type=int, default=5)
+    parser.add_argument("--broadcasts", type=int, default=2_000)
+    parser.add_argument("--room-size", type=int, default=200)
+    parser.add_argument("--room-broadcasts", type=int, default=50)
+    parser.add_argument("--slow-ms", type=float, default=50.0)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    await room_index(args)
+    await one_room(args, slow_ms=0)
+    await one_room(args, slow_ms=args.slow_ms)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,58 @@
+"""Throwaway chat data for the Postgres benchmarks.
+
+Plain SQL rather than the ORM: the chat tables use Postgres enum types
+(chat_friends_database_schema.sql) that the ORM models declare as strings.
+"""
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+
+async def seed_room(Session, members: int = 2, messages: int = 0, room_type: str = "group"):
+    """Create `members` users in one room; the first one sends `messages` messages, a second apart.
+
+    Returns (room_id, user_ids, message_ids).
+    """
+    tag = uuid.uuid4().hex[:8]
+    room_id = uuid.uuid4()
+    user_ids = [uuid.uuid4() for _ in range(members)]
+    message_ids = [uuid.uuid4() for _ in range(messages)]
+    start_at = datetime.now(timezone.utc) - timedelta(seconds=messages + 60)
+    async with Session() as db:
+        await db.execute(text("""
+            INSERT INTO users (id, username, email, role)
+            SELECT id, 'bench-' || :tag || '-' || n, 'bench-' || :tag || '-' || n || '@bench.invalid', 'user'
+            FROM unnest(CAST(:ids AS uuid[])) WITH ORDINALITY AS u(id, n)
+        """), {"tag": tag, "ids": [str(user_id) for user_id in user_ids]})
+        await db.execute(text("""
+            INSERT INTO chat_rooms (id, type, name, created_by)
+            VALUES (CAST(:id AS uuid), CAST(:type AS chat_room_type), :name, CAST(:created_by AS uuid))
+        """), {"id": str(room_id), "type": room_type, "name": f"bench-{tag}", "created_by": str(user_ids[0])})
+        await db.execute(text("""
+            INSERT INTO chat_participants (room_id, user_id, last_read_at)
+            SELECT CAST(:room_id AS uuid), id, NULL FROM unnest(CAST(:ids AS uuid[])) AS u(id)
+        """), {"room_id": str(room_id), "ids": [str(user_id) for user_id in user_ids]})
+        if message_ids:
+            await db.execute(text("""
+                INSERT INTO chat_messages (id, room_id, sender_id, content, created_at)
+                SELECT id, CAST(:room_id AS uuid), CAST(:sender_id AS uuid), 'message ' || n,
+                       CAST(:start_at AS timestamptz) + n * INTERVAL '1 second'
+                FROM unnest(CAST(:ids AS uuid[])) WITH ORDINALITY AS m(id, n)
+            """), {
+                "room_id": str(room_id), "sender_id": str(user_ids[0]), "start_at": start_at,
+                "ids": [str(message_id) for message_id in message_ids],
+            })
+        await db.commit()
+    return room_id, user_ids, message_ids
+
+
+async def drop_room(Session, room_id, user_ids):
+    """Delete a room from seed_room with its users; messages, receipts and participants cascade."""
+    async with Session() as db:
+        await db.execute(text("DELETE FROM chat_rooms WHERE id = CAST(:id AS uuid)"), {"id": str(room_id)})
+        await db.execute(
+            text("DELETE FROM users WHERE id = ANY(CAST(:ids AS uuid[]))"),
+            {"ids": [str(user_id) for user_id in user_ids]},
+        )
+        await db.commit()
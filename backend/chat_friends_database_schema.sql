@@ -1,12 +1,18 @@
 -- Chat and Friends Feature Database Migration
 -- Execute this script in your PostgreSQL database after existing tables
 
+-- GIN indexes over uuid columns (idx_chat_messages_search)
+CREATE EXTENSION IF NOT EXISTS btree_gin;
+
 -- Create enum types for chat system
 CREATE TYPE chat_room_type AS ENUM ('direct', 'group');
 CREATE TYPE chat_message_type AS ENUM ('text', 'image', 'file', 'location', 'system');
 CREATE TYPE participant_role AS ENUM ('admin', 'member');
 CREATE TYPE friend_request_status AS ENUM ('pending', 'accepted', 'declined', 'blocked');
 
+-- Orders chat changes for GET /api/v1/chat/sync (see stamp_chat_change)
+CREATE SEQUENCE IF NOT EXISTS chat_change_seq;
+
 -- Create chat_rooms table
 CREATE TABLE IF NOT EXISTS chat_rooms (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -34,29 +40,55 @@ CREATE TABLE IF NOT EXISTS chat_participants (
     unread_count INTEGER DEFAULT 0,
     is_muted BOOLEAN DEFAULT FALSE,
     is_pinned BOOLEAN DEFAULT FALSE,
+    change_seq BIGINT,
+    change_xid xid8,
     PRIMARY KEY (room_id, user_id)
 );
 
--- Create chat_messages table
+-- Create chat_messages table, partitioned by month of created_at (UTC).
+-- Unique constraints must contain the partition key, so nothing can
+-- reference chat_messages(id); cleanup_chat_message_references() does the
+-- ON DELETE work of those references.
 CREATE TABLE IF NOT EXISTS chat_messages (
-    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    id UUID NOT NULL DEFAULT gen_random_uuid(),
     room_id UUID NOT NULL REFERENCES chat_rooms(id) ON DELETE CASCADE,
     sender_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
     message_type chat_message_type DEFAULT 'text',
     content TEXT, -- Text content or file description
     media_urls TEXT[], -- Array of media URLs (images, files, etc.)
     metadata JSONB, -- Additional metadata (file sizes, dimensions, etc.)
-    reply_to_id UUID REFERENCES chat_messages(id) ON DELETE SET NULL,
-    forwarded_from_id UUID REFERENCES chat_messages(id) ON DELETE SET NULL,
+    reply_to_id UUID, -- chat_messages.id
+    forwarded_from_id UUID, -- chat_messages.id
     edited_at TIMESTAMP WITH TIME ZONE,
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
     is_deleted BOOLEAN DEFAULT FALSE,
-    deleted_at TIMESTAMP WITH TIME ZONE
-);
+    deleted_at TIMESTAMP WITH TIME ZONE,
+    change_seq BIGINT,
+    change_xid xid8,
+    -- Full-text search; 'simple' since chat is mixed-language
+    content_tsv tsvector GENERATED ALWAYS AS (to_tsvector('simple', coalesce(content, ''))) STORED,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- Months moved out of chat_messages by archive_chat_message_partitions():
+-- one JSON array per room and month, compressed once over 128 bytes.
+-- Archived messages keep no reactions or read receipts (read state is the
+-- participants' last_read_at). reply_to_id / forwarded_from_id pointing at
+-- an archived message keep its id, but no longer resolve to a message.
+CREATE TABLE IF NOT EXISTS chat_messages_archive (
+    room_id UUID NOT NULL REFERENCES chat_rooms(id) ON DELETE CASCADE,
+    month DATE NOT NULL,
+    message_count INTEGER NOT NULL,
+    messages JSONB NOT NULL,
+    archived_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (room_id, month)
+) WITH (toast_tuple_target = 128);
+-- Needs PostgreSQL 14+ built with lz4; drop this line to keep pglz
+ALTER TABLE chat_messages_archive ALTER COLUMN messages SET COMPRESSION lz4;
 
 -- Create message_read_receipts table
 CREATE TABLE IF NOT EXISTS message_read_receipts (
-    message_id UUID REFERENCES chat_messages(id) ON DELETE CASCADE,
+    message_id UUID, -- chat_messages.id
     user_id UUID REFERENCES users(id) ON DELETE CASCADE,
     read_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     PRIMARY KEY (message_id, user_id)
@@ -65,14 +97,28 @@ CREATE TABLE IF NOT EXISTS message_read_receipts (
 -- Create message_reactions table
 CREATE TABLE IF NOT EXISTS message_reactions (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-    message_id UUID NOT NULL REFERENCES chat_messages(id) ON DELETE CASCADE,
+    message_id UUID NOT NULL, -- chat_messages.id
     user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
     reaction_type VARCHAR(50) NOT NULL, -- 'like', 'love', 'laugh', etc.
     emoji VARCHAR(10) NOT NULL, -- The actual emoji
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    change_seq BIGINT,
+    change_xid xid8,
     UNIQUE(message_id, user_id, reaction_type)
 );
 
+-- Deleted reactions, kept for GET /api/v1/chat/sync
+CREATE TABLE IF NOT EXISTS chat_reaction_tombstones (
+    reaction_id UUID PRIMARY KEY,
+    message_id UUID NOT NULL,
+    room_id UUID NOT NULL,
+    user_id UUID NOT NULL,
+    reaction_type VARCHAR(50) NOT NULL,
+    deleted_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    change_seq BIGINT,
+    change_xid xid8
+);
+
 -- Enhance existing friend requests (extend buddy system)
 -- First, check if friend_requests table exists, if not create it
 CREATE TABLE IF NOT EXISTS friend_requests (
@@ -126,14 +172,20 @@ CREATE INDEX IF NOT EXISTS idx_chat_participants_room_id ON chat_participants(ro
 CREATE INDEX IF NOT EXISTS idx_chat_participants_unread ON chat_participants(user_id, unread_count) WHERE unread_count > 0;
 
 CREATE INDEX IF NOT EXISTS idx_chat_messages_room_id_created_at ON chat_messages(room_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_chat_messages_room_created_id ON chat_messages(room_id, created_at, id);
 CREATE INDEX IF NOT EXISTS idx_chat_messages_sender_id ON chat_messages(sender_id);
 CREATE INDEX IF NOT EXISTS idx_chat_messages_reply_to_id ON chat_messages(reply_to_id) WHERE reply_to_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_chat_messages_room_change ON chat_messages(room_id, change_xid, change_seq);
+CREATE INDEX IF NOT EXISTS idx_chat_messages_search ON chat_messages USING gin (room_id, content_tsv) WHERE is_deleted = FALSE;
+CREATE INDEX IF NOT EXISTS idx_chat_participants_room_change ON chat_participants(room_id, change_xid, change_seq);
 
 CREATE INDEX IF NOT EXISTS idx_message_read_receipts_message_id ON message_read_receipts(message_id);
 CREATE INDEX IF NOT EXISTS idx_message_read_receipts_user_id ON message_read_receipts(user_id);
 
 CREATE INDEX IF NOT EXISTS idx_message_reactions_message_id ON message_reactions(message_id);
 CREATE INDEX IF NOT EXISTS idx_message_reactions_user_id ON message_reactions(user_id);
+CREATE INDEX IF NOT EXISTS idx_message_reactions_change ON message_reactions(change_xid, change_seq);
+CREATE INDEX IF NOT EXISTS idx_chat_reaction_tombstones_room_change ON chat_reaction_tombstones(room_id, change_xid, change_seq);
 
 CREATE INDEX IF NOT EXISTS idx_friend_requests_requestee_id ON friend_requests(requestee_id);
 CREATE INDEX IF NOT EXISTS idx_friend_requests_requester_id ON friend_requests(requester_id);
@@ -197,6 +249,169 @@ CREATE TRIGGER trigger_update_chat_room_last_message
     FOR EACH ROW
     EXECUTE FUNCTION update_chat_room_last_message();
 
+-- Stamp chat changes for GET /api/v1/chat/sync. change_seq orders changes
+-- within a transaction; the sync only returns changes whose change_xid is
+-- below the oldest running transaction, so nothing can commit behind a
+-- client's cursor.
+CREATE OR REPLACE FUNCTION stamp_chat_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.change_seq = nextval('chat_change_seq');
+    NEW.change_xid = pg_current_xact_id();
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER trigger_stamp_chat_messages_change
+    BEFORE INSERT OR UPDATE ON chat_messages
+    FOR EACH ROW
+    EXECUTE FUNCTION stamp_chat_change();
+
+CREATE TRIGGER trigger_stamp_message_reactions_change
+    BEFORE INSERT OR UPDATE ON message_reactions
+    FOR EACH ROW
+    EXECUTE FUNCTION stamp_chat_change();
+
+CREATE TRIGGER trigger_stamp_chat_reaction_tombstones_change
+    BEFORE INSERT OR UPDATE ON chat_reaction_tombstones
+    FOR EACH ROW
+    EXECUTE FUNCTION stamp_chat_change();
+
+CREATE OR REPLACE FUNCTION stamp_chat_participant_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- unread_count moves with every message; clients count those from the messages
+    IF TG_OP = 'INSERT'
+       OR (NEW.last_read_at, NEW.left_at, NEW.role, NEW.is_muted, NEW.is_pinned)
+          IS DISTINCT FROM (OLD.last_read_at, OLD.left_at, OLD.role, OLD.is_muted, OLD.is_pinned) THEN
+        NEW.change_seq = nextval('chat_change_seq');
+        NEW.change_xid = pg_current_xact_id();
+    END IF;
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER trigger_stamp_chat_participants_change
+    BEFORE INSERT OR UPDATE ON chat_participants
+    FOR EACH ROW
+    EXECUTE FUNCTION stamp_chat_participant_change();
+
+CREATE OR REPLACE FUNCTION record_chat_reaction_removal()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO chat_reaction_tombstones (reaction_id, message_id, room_id, user_id, reaction_type)
+    SELECT OLD.id, OLD.message_id, cm.room_id, OLD.user_id, OLD.reaction_type
+    FROM chat_messages cm WHERE cm.id = OLD.message_id
+    ON CONFLICT (reaction_id) DO NOTHING;
+    RETURN OLD;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER trigger_record_chat_reaction_removal
+    AFTER DELETE ON message_reactions
+    FOR EACH ROW
+    EXECUTE FUNCTION record_chat_reaction_removal();
+
+-- Monthly partitions of chat_messages, from from_month (default: this
+-- month) to months_ahead months from now. There is no default partition:
+-- the app runs this periodically (app.database.chat_partitions).
+CREATE OR REPLACE FUNCTION create_chat_message_partitions(months_ahead integer, from_month date DEFAULT NULL)
+RETURNS integer AS $$
+DECLARE
+    this_month date := date_trunc('month', now() AT TIME ZONE 'UTC')::date;
+    month date := date_trunc('month', COALESCE(from_month, this_month))::date;
+    part_name text;
+    created integer := 0;
+BEGIN
+    -- Every app worker runs this; one at a time
+    PERFORM pg_advisory_xact_lock(hashtext('create_chat_message_partitions'));
+    WHILE month <= this_month + make_interval(months => months_ahead) LOOP
+        part_name := 'chat_messages_p' || to_char(month, 'YYYYMM');
+        IF to_regclass(part_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF chat_messages FOR VALUES FROM (%L) TO (%L)',
+                part_name,
+                month::timestamp AT TIME ZONE 'UTC',
+                (month + interval '1 month')::timestamp AT TIME ZONE 'UTC'
+            );
+            created := created + 1;
+        END IF;
+        month := (month + interval '1 month')::date;
+    END LOOP;
+    RETURN created;
+END;
+$$ language 'plpgsql';
+
+SELECT create_chat_message_partitions(3);
+
+-- Fold each partition older than keep_months into chat_messages_archive,
+-- then detach and drop it
+CREATE OR REPLACE FUNCTION archive_chat_message_partitions(keep_months integer)
+RETURNS integer AS $$
+DECLARE
+    cutoff date := (date_trunc('month', now() AT TIME ZONE 'UTC') - make_interval(months => keep_months))::date;
+    part record;
+    archived integer := 0;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('archive_chat_message_partitions'));
+    FOR part IN
+        SELECT c.relname, to_date(substring(c.relname from '^chat_messages_p([0-9]{6})$'), 'YYYYMM') AS month
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'chat_messages'::regclass
+        ORDER BY c.relname
+    LOOP
+        CONTINUE WHEN part.month IS NULL OR part.month >= cutoff;
+        -- Edits to the old month wait; the rest of chat_messages is untouched until the detach
+        EXECUTE format('LOCK TABLE %I IN SHARE MODE', part.relname);
+        EXECUTE format($archive$
+            INSERT INTO chat_messages_archive (room_id, month, message_count, messages)
+            SELECT room_id, %L, count(*), jsonb_agg(jsonb_build_object(
+                'id', id,
+                'sender_id', sender_id,
+                'message_type', message_type,
+                'content', content,
+                'media_urls', media_urls,
+                'metadata', metadata,
+                'reply_to_id', reply_to_id,
+                'forwarded_from_id', forwarded_from_id,
+                'created_at', created_at,
+                'edited_at', edited_at
+            ) ORDER BY created_at, id)
+            FROM %I
+            WHERE is_deleted = FALSE
+            GROUP BY room_id
+        $archive$, part.month, part.relname);
+        EXECUTE format('ALTER TABLE chat_messages DETACH PARTITION %I', part.relname);
+        -- No DELETE fires on a dropped partition, so do what cleanup_chat_message_references
+        -- would. Once detached the messages are out of chat_messages, so removing their
+        -- reactions leaves no tombstones for the sync feed.
+        EXECUTE format('DELETE FROM message_read_receipts r USING %I m WHERE r.message_id = m.id', part.relname);
+        EXECUTE format('DELETE FROM message_reactions r USING %I m WHERE r.message_id = m.id', part.relname);
+        EXECUTE format('DROP TABLE %I', part.relname);
+        archived := archived + 1;
+    END LOOP;
+    RETURN archived;
+END;
+$$ language 'plpgsql';
+
+CREATE OR REPLACE FUNCTION cleanup_chat_message_references()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- What the foreign keys to chat_messages(id) would do
+    DELETE FROM message_read_receipts WHERE message_id = OLD.id;
+    DELETE FROM message_reactions WHERE message_id = OLD.id;
+    UPDATE chat_messages SET reply_to_id = NULL WHERE reply_to_id = OLD.id;
+    UPDATE chat_messages SET forwarded_from_id = NULL WHERE forwarded_from_id = OLD.id;
+    RETURN OLD;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER trigger_cleanup_chat_message_references
+    AFTER DELETE ON chat_messages
+    FOR EACH ROW
+    EXECUTE FUNCTION cleanup_chat_message_references();
+
 -- Function to update online status
 CREATE OR REPLACE FUNCTION update_user_online_status()
 RETURNS TRIGGER AS $$
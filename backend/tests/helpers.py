@@ -0,0 +1,164 @@
+"""Fakes and seed-data helpers shared by test modules.
+
+The Postgres-backed tests run against TEST_DATABASE_URL, a database
+migrated with `alembic upgrade head`, and are skipped without it. They only
+touch rows they created, and delete them afterwards.
+"""
+import asyncio
+import json
+import os
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.database.base import get_async_database_url
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+requires_postgres = pytest.mark.skipif(
+    not TEST_DATABASE_URL, reason="needs TEST_DATABASE_URL (a database migrated with alembic upgrade head)"
+)
+
+
+class FakeWebSocket:
+    """Records what the server sends; `fail` makes sends raise, `delay` makes them slow."""
+
+    def __init__(self, fail: bool = False, delay: float = 0.0):
+        self.sent = []
+        self.raw = []
+        self.fail = fail
+        self.delay = delay
+        self.close_code = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        if self.fail:
+            raise RuntimeError("socket closed")
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.raw.append(text)
+        self.sent.append(json.loads(text))
+
+    async def close(self, code: int = 1000, reason: str = None):
+        self.close_code = code
+
+
+def check_index(manager):
+    """room_members must be exactly the inverse of user_rooms."""
+    inverse = {}
+    for user_id, rooms in manager.user_rooms.items():
+        for room_id in rooms:
+            inverse.setdefault(room_id, set()).add(user_id)
+    assert manager.room_members == inverse
+
+
+async def room_with(manager, room_id, *users):
+    """Connect one FakeWebSocket per user and join them all to `room_id`."""
+    sockets = {}
+    for user in users:
+        sockets[user] = FakeWebSocket()
+        await manager.connect(sockets[user], user)
+        await manager.join_room(user, room_id)
+    return sockets
+
+
+class ChatData:
+    """Users, rooms and messages seeded into the test database, one committed transaction each."""
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+        self.tag = uuid.uuid4().hex[:8]
+        self.users = []
+        self.rooms = []
+
+    async def _execute(self, sql, params):
+        async with self.session_factory() as db:
+            result = await db.execute(text(sql), params)
+            value = result.scalar() if result.returns_rows else None
+            await db.commit()
+            return value
+
+    async def user(self, name: str) -> uuid.UUID:
+        user_id = uuid.uuid4()
+        await self._execute(
+            "INSERT INTO users (id, username, email, role) VALUES (CAST(:id AS uuid), :username, :email, 'user')",
+            {"id": str(user_id), "username": f"{name}-{self.tag}", "email": f"{name}-{self.tag}@test.invalid"},
+        )
+        self.users.append(user_id)
+        return user_id
+
+    async def room(self, *members: uuid.UUID) -> uuid.UUID:
+        room_id = uuid.uuid4()
+        await self._execute("""
+            WITH room AS (
+                INSERT INTO chat_rooms (id, type, name, created_by)
+                VALUES (CAST(:id AS uuid), 'group', :name, CAST(:created_by AS uuid))
+                RETURNING id
+            )
+            INSERT INTO chat_participants (room_id, user_id)
+            SELECT room.id, member FROM room, unnest(CAST(:members AS uuid[])) AS member
+        """, {"id": str(room_id), "name": f"room-{self.tag}", "created_by": str(members[0]),
+              "members": [str(member) for member in members]})
+        self.rooms.append(room_id)
+        return room_id
+
+    async def message(self, room_id: uuid.UUID, sender_id: uuid.UUID, content: str,
+                      created_at: datetime = None) -> uuid.UUID:
+        return await self._execute("""
+            INSERT INTO chat_messages (room_id, sender_id, content, created_at)
+            VALUES (CAST(:room_id AS uuid), CAST(:sender_id AS uuid), :content, :created_at)
+            RETURNING id
+        """, {"room_id": str(room_id), "sender_id": str(sender_id), "content": content,
+              "created_at": created_at or datetime.now(timezone.utc)})
+
+    async def archived_month(self, room_id: uuid.UUID, sender_id: uuid.UUID, month: datetime, contents):
+        """Archive rows as archive_chat_message_partitions() writes them; returns the message ids."""
+        messages = [
+            {"id": str(uuid.uuid4()), "sender_id": str(sender_id), "message_type": "text", "content": content,
+             "created_at": (month + timedelta(hours=n)).isoformat()}
+            for n, content in enumerate(contents)
+        ]
+        await self._execute("""
+            INSERT INTO chat_messages_archive (room_id, month, message_count, messages)
+            VALUES (CAST(:room_id AS uuid), CAST(:month AS date), :count, CAST(:messages AS jsonb))
+        """, {"room_id": str(room_id), "month": month.date(), "count": len(messages),
+              "messages": json.dumps(messages)})
+        return [uuid.UUID(m["id"]) for m in messages]
+
+    async def cleanup(self):
+        rooms, users = [str(r) for r in self.rooms], [str(u) for u in self.users]
+        for sql, params in (
+            ("DELETE FROM chat_messages WHERE room_id = ANY(CAST(:ids AS uuid[]))", rooms),
+            ("DELETE FROM chat_reaction_tombstones WHERE room_id = ANY(CAST(:ids AS uuid[]))", rooms),
+            ("DELETE FROM chat_messages_archive WHERE room_id = ANY(CAST(:ids AS uuid[]))", rooms),
+            ("DELETE FROM chat_participants WHERE room_id = ANY(CAST(:ids AS uuid[]))", rooms),
+            ("DELETE FROM chat_rooms WHERE id = ANY(CAST(:ids AS uuid[]))", rooms),
+            ("DELETE FROM users WHERE id = ANY(CAST(:ids AS uuid[]))", users),
+        ):
+            await self._execute(sql, {"ids": params})
+
+
+@asynccontextmanager
+async def chat_database():
+    """(session_factory, ChatData) on TEST_DATABASE_URL, with partitions for last month and this one."""
+    url, connect_args = get_async_database_url(TEST_DATABASE_URL)
+    engine = create_async_engine(url, connect_args=connect_args)
+    Session = async_sessionmaker(engine, expire_on_commit=False)
+    data = ChatData(Session)
+    try:
+        async with Session() as db:
+            await db.execute(
+                text("SELECT create_chat_message_partitions(1, CAST(:from_month AS date))"),
+                {"from_month": (datetime.now(timezone.utc) - timedelta(days=31)).date()},
+            )
+            await db.commit()
+        yield Session, data
+    finally:
+        await data.cleanup()
+        await engine.dispose()
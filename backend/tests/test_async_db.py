@@ -0,0 +1,49 @@
+import asyncio
+import threading
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.database.base import ThreadedSession, get_async_database_url
+
+
+def test_async_url_uses_asyncpg():
+    url, connect_args = get_async_database_url("postgresql://u:p@db.example.com:5432/app")
+    assert url.drivername == "postgresql+asyncpg"
+    assert url.host == "db.example.com"
+    assert connect_args == {}
+
+
+def test_async_url_moves_sslmode_to_connect_args():
+    url, connect_args = get_async_database_url(
+        "postgresql+psycopg2://u:p@db.example.com:5432/app?sslmode=require"
+    )
+    assert url.drivername == "postgresql+asyncpg"
+    assert "sslmode" not in url.query
+    assert connect_args == {"ssl": "require"}
+
+
+def test_threaded_session_runs_off_the_event_loop():
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    session = ThreadedSession(sessionmaker(bind=engine)())
+    loop_thread = threading.get_ident()
+
+    async def run():
+        result = await session.execute(text("SELECT 1"))
+        value = result.scalar()
+        await session.close()
+        return value
+
+    seen_threads = []
+    original_execute = session.sync_session.execute
+
+    def tracking_execute(*args, **kwargs):
+        seen_threads.append(threading.get_ident())
+        return original_execute(*args, **kwargs)
+
+    session.sync_session.execute = tracking_execute
+    assert asyncio.run(run()) == 1
+    assert seen_threads and seen_threads[0] != loop_thread
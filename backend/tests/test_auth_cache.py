@@ -0,0 +1,104 @@
+import uuid
+from datetime import timedelta
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.api.dependencies import get_current_user
+from app.core import auth_cache
+from app.core.auth import create_access_token
+from app.database.base import get_db
+from app.models_db import Base, Profile, User
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine, tables=[User.__table__, Profile.__table__])
+    auth_cache.token_claims.clear()
+    auth_cache.user_snapshots.clear()
+    yield sessionmaker(bind=engine, autoflush=False)
+    auth_cache.user_snapshots.clear()
+    engine.dispose()
+
+
+@pytest.fixture
+def user_id(session_factory):
+    with session_factory() as db:
+        user = User(username="ada", email="ada@example.com", role="user")
+        user.profile = Profile(display_name="Ada")
+        db.add(user)
+        db.commit()
+        return user.id
+
+
+@pytest.fixture
+def client(session_factory):
+    app = FastAPI()
+
+    @app.get("/me")
+    def me(current_user: User = Depends(get_current_user)):
+        return {"id": str(current_user.id), "display_name": current_user.profile.display_name}
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    return TestClient(app)
+
+
+def bearer(claims: dict) -> dict:
+    return {"Authorization": f"Bearer {create_access_token(claims, timedelta(minutes=5))}"}
+
+
+def test_repeat_requests_do_no_auth_queries(client, user_id, assert_max_queries):
+    headers = bearer({"sub": str(user_id), "user_id": str(user_id)})
+
+    with assert_max_queries(1):
+        assert client.get("/me", headers=headers).json()["display_name"] == "Ada"
+    with assert_max_queries(0):
+        for _ in range(5):
+            assert client.get("/me", headers=headers).json()["id"] == str(user_id)
+    assert auth_cache.user_snapshots.hits == 5
+
+
+def test_refresh_style_tokens_resolve_by_user_id_claim(client, user_id):
+    # /auth/refresh issues sub=<username>; the id is only in user_id.
+    response = client.get("/me", headers=bearer({"sub": "ada", "user_id": str(user_id)}))
+    assert response.status_code == 200
+
+    assert client.get("/me", headers={"Authorization": "Bearer not-a-jwt"}).status_code == 401
+    assert client.get("/me", headers=bearer({"sub": str(uuid.uuid4())})).status_code == 401
+
+
+def test_profile_update_evicts_cached_user(client, session_factory, user_id, assert_max_queries):
+    headers = bearer({"user_id": str(user_id)})
+    client.get("/me", headers=headers)
+
+    with session_factory() as db:
+        db.query(Profile).filter(Profile.user_id == user_id).one().display_name = "Ada L."
+        db.commit()
+
+    with assert_max_queries(1):
+        assert client.get("/me", headers=headers).json()["display_name"] == "Ada L."
+
+
+def test_cached_user_reattaches_without_insert(session_factory, user_id, assert_max_queries):
+    with session_factory() as db:
+        auth_cache.remember_user(db.get(User, user_id))
+
+    user = auth_cache.cached_user(str(user_id))
+    assert user is not auth_cache.cached_user(str(user_id))
+    with session_factory() as db, assert_max_queries(1):
+        db.add(user)
+        user.role = "trainer"
+        db.commit()  # one UPDATE, no INSERT
+    assert auth_cache.cached_user(str(user_id)) is None
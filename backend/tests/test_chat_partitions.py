@@ -0,0 +1,148 @@
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.cursors import encode_cursor
+from app.crud.chat_crud import ChatCRUD
+from app.crud import chat_crud as chat_crud_module
+from app.database.chat_partitions import ChatPartitionMaintainer
+
+ROOM = uuid.uuid4()
+ALICE = uuid.uuid4()
+T0 = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+class FunctionSession:
+    """Answers the partition functions with canned counts."""
+
+    def __init__(self, created, archived, fail=False):
+        self.created, self.archived, self.fail = created, archived, fail
+        self.calls = []
+
+    async def execute(self, statement, params=None):
+        if self.fail:
+            raise RuntimeError("no partitions here")
+        self.calls.append((str(statement), params))
+        count = self.created if 'create_chat_message_partitions' in str(statement) else self.archived
+        return SimpleNamespace(scalar_one=lambda: count)
+
+    async def commit(self):
+        pass
+
+
+def scope_for(session):
+    @asynccontextmanager
+    async def scope():
+        yield session
+    return scope
+
+
+def test_maintainer_creates_ahead_and_archives_only_when_enabled():
+    db = FunctionSession(created=2, archived=1)
+    maintainer = ChatPartitionMaintainer(scope_for(db), months_ahead=3)
+    assert asyncio.run(maintainer.run_once()) == (2, 0)
+    assert db.calls == [("SELECT create_chat_message_partitions(:months_ahead)", {"months_ahead": 3})]
+
+    maintainer.archive_after_months = 12
+    assert asyncio.run(maintainer.run_once()) == (2, 1)
+    assert db.calls[-1][1] == {"keep_months": 12}
+    assert "chat_partitions_created_total 4" in maintainer.render_prometheus()
+    assert "chat_partitions_archived_total 1" in maintainer.render_prometheus()
+
+
+def test_maintainer_survives_a_failed_run():
+    async def scenario():
+        maintainer = ChatPartitionMaintainer(scope_for(FunctionSession(0, 0, fail=True)), interval=3600)
+        maintainer.start()
+        await asyncio.sleep(0)
+        await maintainer.stop()
+        return maintainer
+
+    maintainer = asyncio.run(scenario())
+    assert maintainer.errors == 1 and maintainer.runs == 0
+
+
+def message_row(n):
+    return SimpleNamespace(
+        id=uuid.UUID(int=n), room_id=ROOM, sender_id=ALICE, message_type='text', content=f'message {n}',
+        media_urls=None, metadata=None, reply_to_id=None, forwarded_from_id=None,
+        created_at=T0 + timedelta(days=n), edited_at=None, is_deleted=False, deleted_at=None,
+        sender_username='alice', sender_display_name=None, sender_avatar=None,
+        reply_to_content=None, reply_to_sender_id=None, reply_to_sender_username=None,
+    )
+
+
+class HistorySession:
+    """Messages 0-9 are archived and 10-19 are in chat_messages; honours the keyset bounds."""
+
+    def __init__(self):
+        self.archive_reads = 0
+
+    async def execute(self, statement, params=None):
+        sql = str(statement)
+        if 'message_reactions' in sql:
+            return SimpleNamespace(fetchall=lambda: [])
+        if 'FROM chat_participants' in sql:
+            return SimpleNamespace(fetchone=lambda: SimpleNamespace(last_read_at=None))
+        archive = 'chat_messages_archive' in sql
+        self.archive_reads += archive
+        rows = [message_row(n) for n in (range(10) if archive else range(10, 20))]
+        newer = 'ASC' in sql
+        for at, id_ in ((params.get('cursor_at'), params.get('cursor_id')),
+                        (params.get('archived_at'), params.get('archived_id'))):
+            if at is not None:
+                key = (at, uuid.UUID(id_))
+                rows = [r for r in rows if ((r.created_at, r.id) > key if newer else (r.created_at, r.id) < key)]
+        rows.sort(key=lambda r: (r.created_at, r.id), reverse=not newer)
+        return SimpleNamespace(fetchall=lambda: rows[:params['limit']])
+
+
+@pytest.fixture
+def archive_enabled(monkeypatch):
+    monkeypatch.setattr(chat_crud_module.settings, 'CHAT_ARCHIVE_AFTER_MONTHS', 12)
+
+
+def page(db, **kwargs):
+    result = asyncio.run(ChatCRUD().get_room_messages(db, ROOM, ALICE, **kwargs))
+    return [m['content'] for m in result['messages']], result
+
+
+def test_older_pages_continue_into_the_archive(archive_enabled):
+    db = HistorySession()
+    contents, result = page(db, limit=6)
+    assert contents == [f'message {n}' for n in range(14, 20)] and db.archive_reads == 0
+
+    contents, result = page(db, limit=6, cursor=result['older_cursor'])
+    assert contents == [f'message {n}' for n in range(8, 14)] and result['has_more']
+
+    contents, result = page(db, limit=6, cursor=result['older_cursor'])
+    assert contents == [f'message {n}' for n in range(2, 8)]
+
+    contents, result = page(db, limit=6, cursor=result['older_cursor'])
+    assert contents == ['message 0', 'message 1'] and not result['has_more']
+
+
+def test_newer_pages_start_in_the_archive(archive_enabled):
+    db = HistorySession()
+    contents, result = page(db, limit=8, direction='newer')
+    assert contents == [f'message {n}' for n in range(8)]
+
+    contents, result = page(db, limit=8, direction='newer', cursor=result['newer_cursor'])
+    assert contents == [f'message {n}' for n in range(8, 16)] and result['has_more']
+
+    # Past the archive cutoff only chat_messages is read
+    reads = db.archive_reads
+    contents, result = page(db, limit=8, direction='newer',
+                            cursor=encode_cursor(datetime.now(timezone.utc), uuid.UUID(int=0)))
+    assert contents == [] and db.archive_reads == reads
+
+
+def test_archive_is_not_read_when_disabled(monkeypatch):
+    monkeypatch.setattr(chat_crud_module.settings, 'CHAT_ARCHIVE_AFTER_MONTHS', 0)
+    db = HistorySession()
+    contents, result = page(db, limit=50)
+    assert len(contents) == 10 and db.archive_reads == 0 and not result['has_more']
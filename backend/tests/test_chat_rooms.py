@@ -0,0 +1,86 @@
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from app.crud import chat_crud as chat_crud_module
+from app.crud.chat_crud import ChatCRUD
+from app.core.inbox_cache import InboxCache
+from app.schemas.chat import ChatRoomCreate
+
+ALICE = uuid.uuid4()
+T0 = datetime(2025, 9, 8, 10, 0, tzinfo=timezone.utc)
+
+
+def participant_row(room_id, user_id, role='member', unread=0):
+    return SimpleNamespace(
+        id=room_id, type='group', name='Leg day', description=None, image_url=None, created_by=ALICE,
+        created_at=T0, updated_at=T0, last_message_at=None, last_message_content=None,
+        last_message_sender_id=None, is_archived=False,
+        user_id=user_id, role=role, joined_at=T0, left_at=None, last_read_at=T0, unread_count=unread,
+        is_muted=False, is_pinned=user_id == ALICE, username=f'user-{user_id.hex[:6]}', display_name=None,
+        profile_picture_url=None, is_online=None, last_seen=None,
+    )
+
+
+class RecordingSession:
+    """Records statements; SELECTs return the participant rows of whatever room was last inserted."""
+
+    def __init__(self):
+        self.statements = []
+        self.commits = 0
+        self.rows = []
+
+    async def execute(self, statement, params=None):
+        self.statements.append((str(statement), params))
+        if 'INSERT INTO chat_participants' in str(statement):
+            self.rows = [
+                participant_row(uuid.UUID(params['id']), uuid.UUID(user_id), 'admin' if n == 0 else 'member')
+                for n, user_id in enumerate(params['user_ids'])
+            ]
+            return SimpleNamespace(fetchall=lambda: [])
+        return SimpleNamespace(fetchall=lambda: list(self.rows))
+
+    async def commit(self):
+        self.commits += 1
+
+
+@pytest.fixture(autouse=True)
+def inbox(monkeypatch):
+    cache = InboxCache(100, 60)
+    monkeypatch.setattr(chat_crud_module, 'inbox_cache', cache)
+    return cache
+
+
+def test_group_room_with_200_members_is_two_statements_and_one_commit(inbox):
+    members = [uuid.uuid4() for _ in range(200)]
+    inbox.remember(members[0], [])
+    db = RecordingSession()
+
+    room = asyncio.run(ChatCRUD().create_group_chat_room(
+        db, ALICE, ChatRoomCreate(name='Leg day', participant_ids=members + members[:5] + [ALICE])
+    ))
+
+    assert len(db.statements) == 2 and db.commits == 1
+    assert db.statements[0][1]['user_ids'] == [str(ALICE)] + [str(m) for m in members]
+    assert len(room['participants']) == 201 and room['participants'][0]['role'] == 'admin'
+    assert room['is_pinned'] is True  # the creator's own row
+    assert inbox.get(members[0], 0, 10) is None
+
+
+def test_room_details_are_one_query_and_refused_to_non_members():
+    room_id, bob = uuid.uuid4(), uuid.uuid4()
+    db = RecordingSession()
+    db.rows = [participant_row(room_id, bob, unread=4), participant_row(room_id, ALICE, 'admin', unread=2)]
+
+    room = asyncio.run(ChatCRUD().get_chat_room_details(db, room_id, ALICE))
+
+    assert len(db.statements) == 1
+    assert room['unread_count'] == 2
+    assert [p['unread_count'] for p in room['participants']] == [0, 2]  # only the caller's own count
+
+    db.rows = []
+    with pytest.raises(ValueError, match="not a participant"):
+        asyncio.run(ChatCRUD().get_chat_room_details(db, room_id, uuid.uuid4()))
@@ -0,0 +1,71 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.core.cursors import encode_cursor
+from app.crud.chat_crud import chat_crud
+from tests.helpers import chat_database, requires_postgres
+
+
+@pytest.fixture
+def searches(stub_chat_crud):
+    return stub_chat_crud("search_messages", lambda *args: {'messages': [], 'next_cursor': None, 'has_more': False})
+
+
+def test_search_is_not_taken_for_a_message_id(chat_client, searches, chat_user):
+    room_id = uuid.uuid4()
+    cursor = encode_cursor(0.0607927, datetime(2025, 9, 7, 10, 0, tzinfo=timezone.utc), uuid.uuid4())
+
+    response = chat_client.get("/api/v1/chat/messages/search", params={"q": "leg day", "room_id": str(room_id), "cursor": cursor})
+
+    assert response.status_code == 200
+    assert response.json() == {'messages': [], 'next_cursor': None, 'has_more': False}
+    assert searches == [(chat_user.id, "leg day", room_id, cursor, 20)]
+
+
+@pytest.mark.parametrize("params, status", [
+    ({"q": ""}, 422),
+    ({"q": "leg day", "cursor": encode_cursor("2025-09-07T10:00:00+00:00", str(uuid.uuid4()))}, 400),
+])
+def test_search_rejects_bad_input_before_querying(chat_client, searches, params, status):
+    assert chat_client.get("/api/v1/chat/messages/search", params=params).status_code == status
+    assert searches == []
+
+
+@requires_postgres
+def test_search_ranks_and_pages_the_users_rooms_only():
+    now = datetime.now(timezone.utc)
+    contents = ["leg day", "leg day with squats", "leg day, leg day, leg day", "arm day", "LEG DAY tomorrow"]
+
+    async def scenario():
+        async with chat_database() as (Session, data):
+            alice, bob, carol = await data.user("alice"), await data.user("bob"), await data.user("carol")
+            room = await data.room(alice, bob)
+            elsewhere = await data.room(bob, carol)
+            sent = [
+                await data.message(room, bob, content, now - timedelta(minutes=len(contents) - n))
+                for n, content in enumerate(contents)
+            ]
+            await data.message(elsewhere, carol, "leg day for carol")
+
+            async def search(query):
+                pages, cursor = [], None
+                while True:
+                    async with Session() as db:
+                        page = await chat_crud.search_messages(db, alice, query, None, cursor, 2)
+                    pages.append(page)
+                    if not page["has_more"]:
+                        return pages
+                    cursor = page["next_cursor"]
+
+            return sent, await search("leg day"), await search('"leg day" -squats')
+
+    sent, leg_day, no_squats = asyncio.run(scenario())
+    found = [m["id"] for page in leg_day for m in page["messages"]]
+    assert found[0] == sent[2]  # three times the words ranks first
+    assert sorted(found) == sorted([sent[0], sent[1], sent[2], sent[4]])
+    assert [len(page["messages"]) for page in leg_day] == [2, 2]
+    assert [page["next_cursor"] is None for page in leg_day] == [False, True]
+    assert sorted(m["id"] for page in no_squats for m in page["messages"]) == sorted([sent[0], sent[2], sent[4]])
@@ -0,0 +1,84 @@
+import asyncio
+import json
+
+import pytest
+
+from app.api.v1.endpoints import chat
+from app.core.cursors import decode_cursor, encode_cursor
+from app.crud.chat_crud import chat_crud
+from tests.helpers import chat_database, requires_postgres
+
+
+@pytest.fixture
+def changes(stub_chat_crud, monkeypatch):
+    """A change feed of 7 messages, served by a fake get_changes_since."""
+    feed = [json.dumps({"type": "message", "room_id": "r1", "data": {"id": i}}) for i in range(7)]
+
+    def get_changes_since(user_id, cursor, limit):
+        start = 0 if cursor is None else decode_cursor(cursor, int, int)[1]
+        page = feed[start:start + limit]
+        return {
+            'changes': page,
+            'next_cursor': encode_cursor(1, start + len(page)) if page else cursor,
+            'has_more': start + limit < len(feed),
+        }
+
+    monkeypatch.setattr(chat.settings, "CHAT_SYNC_BATCH_SIZE", 2)
+    monkeypatch.setattr(chat.settings, "CHAT_SYNC_MAX_CHANGES", 5)
+    return stub_chat_crud("get_changes_since", get_changes_since)
+
+
+def test_sync_streams_changes_in_batches_up_to_the_response_cap(chat_client, changes):
+    response = chat_client.get("/api/v1/chat/sync")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["data"]["id"] for line in lines[:-1]] == [0, 1, 2, 3, 4]
+    assert lines[-1] == {"type": "sync_state", "next_cursor": encode_cursor(1, 5), "has_more": True}
+    assert [limit for _, _, limit in changes] == [2, 2, 1]  # the last batch is cut to the cap
+
+    rest = [json.loads(line) for line in chat_client.get("/api/v1/chat/sync", params={"since": lines[-1]["next_cursor"]}).text.splitlines()]
+    assert [line["data"]["id"] for line in rest[:-1]] == [5, 6]
+    assert rest[-1]["has_more"] is False
+
+
+def test_sync_rejects_a_malformed_cursor(chat_client, changes):
+    response = chat_client.get("/api/v1/chat/sync", params={"since": "not-a-cursor"})
+
+    assert response.status_code == 400
+    assert changes == []
+
+
+@requires_postgres
+def test_change_feed_pages_through_the_users_rooms_only():
+    async def scenario():
+        async with chat_database() as (Session, data):
+            alice, bob, carol = await data.user("alice"), await data.user("bob"), await data.user("carol")
+            room = await data.room(alice, bob)
+            elsewhere = await data.room(bob, carol)
+            sent = [await data.message(room, bob, f"message {n}") for n in range(5)]
+            await data.message(elsewhere, carol, "not for alice")
+
+            async def feed(cursor):
+                async with Session() as db:
+                    return await chat_crud.get_changes_since(db, alice, cursor, 3)
+
+            pages, cursor = [], None
+            while True:
+                page = await feed(cursor)
+                pages.append(page)
+                cursor = page["next_cursor"]
+                if not page["has_more"]:
+                    break
+            caught_up = await feed(cursor)
+            late = await data.message(room, bob, "late")
+            return pages, caught_up, cursor, await feed(cursor), sent, late, room
+
+    pages, caught_up, cursor, after, sent, late, room = asyncio.run(scenario())
+    changes = [json.loads(change) for page in pages for change in page["changes"]]
+    assert all(len(page["changes"]) == 3 for page in pages[:-1])
+    assert {change["room_id"] for change in changes} == {str(room)}
+    assert [c["data"]["id"] for c in changes if c["type"] == "message"] == [str(m) for m in sent]
+    assert caught_up == {"changes": [], "next_cursor": cursor, "has_more": False}
+    assert [json.loads(c)["data"]["id"] for c in after["changes"] if json.loads(c)["type"] == "message"] == [str(late)]
@@ -0,0 +1,200 @@
+import asyncio
+import json
+
+from app.core.config import settings
+from app.websocket.chat_websocket import ConnectionManager
+from app.websocket.outbound import TRY_AGAIN_LATER, fanout_metrics
+from tests.helpers import FakeWebSocket, check_index
+
+
+def test_room_index_follows_join_leave_disconnect():
+    manager = ConnectionManager()
+    phone, laptop, other = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+
+    async def run():
+        await manager.connect(phone, "alice")
+        await manager.connect(laptop, "alice")
+        await manager.connect(other, "bob")
+        await manager.join_room("alice", "r1")
+        await manager.join_room("alice", "r2")
+        await manager.join_room("bob", "r1")
+        await manager.join_room("carol", "r1")  # not connected: ignored
+        check_index(manager)
+        assert manager.room_members == {"r1": {"alice", "bob"}, "r2": {"alice"}}
+
+        await manager.leave_room("alice", "r2")
+        check_index(manager)
+        assert "r2" not in manager.room_members
+
+        manager.disconnect(phone)  # alice still has the laptop
+        assert manager.room_members["r1"] == {"alice", "bob"}
+        manager.disconnect(laptop)
+        check_index(manager)
+        assert manager.room_members == {"r1": {"bob"}}
+
+    asyncio.run(run())
+
+
+def test_broadcast_reaches_only_room_members():
+    manager = ConnectionManager()
+    sockets = {user: FakeWebSocket() for user in ("alice", "bob", "carol")}
+    broken = FakeWebSocket(fail=True)
+
+    async def run():
+        for user, ws in sockets.items():
+            await manager.connect(ws, user)
+        await manager.connect(broken, "dave")
+        for user in ("alice", "bob", "dave"):
+            await manager.join_room(user, "r1")
+        await manager.join_room("carol", "r2")
+
+        await manager.broadcast_to_room({"type": "new_message"}, "r1", exclude_user_id="alice")
+        await manager.drain()
+
+    asyncio.run(run())
+    assert sockets["bob"].sent == [{"type": "new_message"}]
+    assert sockets["alice"].sent == [] and sockets["carol"].sent == []
+    # dave's socket failed during the broadcast and was cleaned out of the index
+    assert "dave" not in manager.active_connections
+    check_index(manager)
+
+
+def test_broadcast_is_encoded_once_and_shared():
+    manager = ConnectionManager()
+    sockets = [FakeWebSocket() for _ in range(3)]
+
+    async def run():
+        for i, ws in enumerate(sockets):
+            await manager.connect(ws, f"user-{i}")
+            await manager.join_room(f"user-{i}", "r1")
+        await manager.broadcast_to_room({"type": "new_message", "data": {"id": 1}}, "r1")
+        await manager.drain()
+
+    asyncio.run(run())
+    payloads = [ws.raw[0] for ws in sockets]
+    assert all(payload is payloads[0] for payload in payloads)
+
+
+def test_slow_consumer_does_not_delay_room_and_sheds_typing_first(monkeypatch):
+    monkeypatch.setattr(settings, "WS_SEND_QUEUE_SIZE", 3)
+    manager = ConnectionManager()
+    fast, slow = FakeWebSocket(), FakeWebSocket(delay=60)
+
+    async def run():
+        await manager.connect(fast, "fast")
+        await manager.connect(slow, "slow")
+        for user in ("fast", "slow"):
+            await manager.join_room(user, "r1")
+
+        await manager.broadcast_to_room({"type": "new_message", "data": 1}, "r1")
+        await asyncio.sleep(0)  # slow's writer is now stuck sending frame 1
+        await manager.broadcast_to_room({"type": "typing_indicator"}, "r1")
+        await manager.broadcast_to_room({"type": "new_message", "data": 2}, "r1")
+        await manager.broadcast_to_room({"type": "new_message", "data": 3}, "r1")
+        await asyncio.wait_for(manager.clients[fast].wait_idle(), timeout=1)
+        assert [m.get("data") for m in fast.sent] == [1, None, 2, 3]
+
+        slow_queue = manager.clients[slow].queue
+        assert len(slow_queue) == 3
+        # Full: the queued typing event is evicted for a real message...
+        await manager.broadcast_to_room({"type": "new_message", "data": 4}, "r1")
+        assert [json.loads(p)["data"] for p, _, _ in slow_queue] == [2, 3, 4]
+        # ...a new typing event is dropped...
+        await manager.broadcast_to_room({"type": "typing_indicator"}, "r1")
+        assert "slow" in manager.active_connections
+        # ...and with nothing left to shed the slow client is disconnected
+        await manager.broadcast_to_room({"type": "new_message", "data": 5}, "r1")
+        await asyncio.sleep(0.01)  # let the close frame go out
+        assert "slow" not in manager.active_connections
+        assert slow not in manager.clients
+        assert slow.close_code == TRY_AGAIN_LATER
+        await manager.drain()
+        assert [m.get("data") for m in fast.sent][-3:] == [4, None, 5]
+
+    dropped_before = dict(fanout_metrics.dropped)
+    asyncio.run(run())
+    assert fanout_metrics.dropped["evicted"] == dropped_before.get("evicted", 0) + 1
+    assert fanout_metrics.dropped["queue_full"] == dropped_before.get("queue_full", 0) + 1
+    assert fanout_metrics.disconnected["queue_full"] >= 1
+    check_index(manager)
+
+
+def test_consumer_stuck_in_send_is_disconnected(monkeypatch):
+    monkeypatch.setattr(settings, "WS_SLOW_CONSUMER_SECONDS", 0.05)
+    manager = ConnectionManager()
+    stuck = FakeWebSocket(delay=60)
+
+    async def run():
+        await manager.connect(stuck, "stuck")
+        await manager.send_personal_message({"type": "new_message"}, "stuck")
+        await asyncio.sleep(0.1)
+        assert "stuck" in manager.active_connections  # nothing new to deliver yet
+        await manager.send_personal_message({"type": "new_message"}, "stuck")
+        assert "stuck" not in manager.active_connections
+        await asyncio.sleep(0.01)
+        assert stuck.close_code == TRY_AGAIN_LATER
+
+    lagging_before = fanout_metrics.disconnected.get("lagging", 0)
+    asyncio.run(run())
+    assert fanout_metrics.disconnected["lagging"] == lagging_before + 1
+
+
+def test_per_user_cap_closes_the_oldest_socket(monkeypatch):
+    monkeypatch.setattr(settings, "WS_MAX_CONNECTIONS_PER_USER", 2)
+    manager = ConnectionManager()
+    first, second, third = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+
+    async def run():
+        await manager.connect(first, "alice")
+        await manager.join_room("alice", "r1")
+        await manager.connect(second, "alice")
+        await manager.connect(third, "alice")
+        await asyncio.sleep(0.01)  # let the close frame go out
+        assert manager.active_connections["alice"] == {second, third}
+        assert first not in manager.clients and first.close_code == 1008
+        assert manager.room_members == {"r1": {"alice"}}  # subscriptions survive the eviction
+        await manager.send_personal_message({"type": "new_message"}, "alice")
+        await manager.drain()
+
+    asyncio.run(run())
+    assert first.sent == [] and len(second.sent) == len(third.sent) == 1
+    assert manager.evicted == 1
+    check_index(manager)
+
+
+def test_worker_cap_refuses_new_sockets(monkeypatch):
+    monkeypatch.setattr(settings, "WS_MAX_CONNECTIONS", 2)
+    manager = ConnectionManager()
+
+    async def run():
+        await manager.connect(FakeWebSocket(), "alice")
+        assert not manager.at_capacity()
+        await manager.connect(FakeWebSocket(), "bob")
+        assert manager.at_capacity()
+        refused = FakeWebSocket()
+        await manager.refuse(refused)
+        return refused
+
+    refused = asyncio.run(run())
+    assert refused.close_code == TRY_AGAIN_LATER
+    assert "ws_connections 2" in manager.render_prometheus()
+    assert "ws_connections_refused_total 1" in manager.render_prometheus()
+
+
+def test_queued_bytes_are_accounted_per_connection(monkeypatch):
+    manager = ConnectionManager()
+    stuck = FakeWebSocket(delay=60)
+
+    async def run():
+        await manager.connect(stuck, "stuck")
+        await manager.send_personal_message({"type": "new_message", "data": "x" * 100}, "stuck")
+        await asyncio.sleep(0)  # the writer is now stuck sending the first frame
+        queued_before = fanout_metrics.queued_bytes
+        await manager.send_personal_message({"type": "new_message", "data": "y" * 200}, "stuck")
+        client = manager.clients[stuck]
+        assert client.queued_bytes == fanout_metrics.queued_bytes - queued_before > 200
+        assert f"ws_connection_queued_bytes_max {client.queued_bytes}" in manager.render_prometheus()
+        manager.disconnect(stuck)
+        assert fanout_metrics.queued_bytes == queued_before
+
+    asyncio.run(run())
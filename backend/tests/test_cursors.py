@@ -0,0 +1,29 @@
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+from app.core.cursors import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trips_a_keyset():
+    created_at = datetime(2025, 9, 5, 10, 0, 0, 123456, tzinfo=timezone.utc)
+    message_id = uuid.uuid4()
+
+    cursor = encode_cursor(created_at, message_id)
+
+    assert "=" not in cursor and "/" not in cursor and "+" not in cursor
+    assert decode_cursor(cursor, datetime, uuid.UUID) == (created_at, message_id)
+    assert decode_cursor(encode_cursor(0.25, 42), float, int) == (0.25, 42)
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not base64!",
+    encode_cursor("2025-09-05T10:00:00+00:00"),  # wrong arity
+    encode_cursor("yesterday", str(uuid.uuid4())),
+    encode_cursor("2025-09-05T10:00:00+00:00", "not-a-uuid"),
+])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor, datetime, uuid.UUID)
@@ -0,0 +1,125 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.email import SmtpTransport
+from app.core.email_worker import EmailOutboxWorker
+from app.core.smtp_sink import SmtpSink
+from app.crud.email_outbox import claim_batch, enqueue_email
+from app.models_db import EmailOutbox
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    EmailOutbox.__table__.create(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def run_with_sink(session_factory, scenario, **worker_kwargs):
+    async def run():
+        sink = await SmtpSink().start()
+        worker = EmailOutboxWorker(
+            session_factory,
+            SmtpTransport("127.0.0.1", sink.port, use_tls=False, timeout=5),
+            **{"batch_size": 20, "retry_base": 0, **worker_kwargs},
+        )
+        try:
+            await scenario(sink, worker)
+        finally:
+            await worker.stop()
+            await sink.stop()
+        return sink, worker
+
+    return asyncio.run(run())
+
+
+def statuses(session_factory):
+    with session_factory() as db:
+        return db.execute(select(EmailOutbox.status, EmailOutbox.attempts, EmailOutbox.last_error)).all()
+
+
+def test_worker_drains_outbox_in_batches_over_one_connection(session_factory):
+    with session_factory() as db:
+        for i in range(45):
+            enqueue_email(db, f"user{i}@example.com", "Hello", f"message {i}")
+
+    async def scenario(sink, worker):
+        claimed = [await worker.process_batch() for _ in range(4)]
+        assert claimed == [20, 20, 5, 0]
+
+    sink, worker = run_with_sink(session_factory, scenario)
+    assert len(sink.messages) == 45
+    assert sink.messages[0]["To"] == "user0@example.com"
+    assert sink.connections == worker.transport.connections_opened == 1
+    assert worker.sent == 45 and worker.batches == 3
+    assert {status for status, _, _ in statuses(session_factory)} == {"sent"}
+
+
+def test_temporary_failure_is_retried_then_sent(session_factory):
+    with session_factory() as db:
+        enqueue_email(db, "a@example.com", "Reset", "link")
+        enqueue_email(db, "b@example.com", "Reset", "link")
+
+    async def scenario(sink, worker):
+        sink.fail_next = 1
+        assert await worker.process_batch() == 2
+        assert len(sink.messages) == 1
+        assert worker.retried == 1
+        assert await worker.process_batch() == 1  # retry_base=0: due again immediately
+
+    sink, worker = run_with_sink(session_factory, scenario)
+    assert sorted(m["To"] for m in sink.messages) == ["a@example.com", "b@example.com"]
+    assert sorted(statuses(session_factory)) == [("sent", 1, None), ("sent", 2, None)]
+
+
+def test_gives_up_after_max_attempts(session_factory):
+    with session_factory() as db:
+        enqueue_email(db, "a@example.com", "Reset", "link")
+
+    async def scenario(sink, worker):
+        sink.fail_next = 2
+        await worker.process_batch()
+        await worker.process_batch()
+        assert await worker.process_batch() == 0
+
+    sink, worker = run_with_sink(session_factory, scenario, max_attempts=2)
+    (status, attempts, last_error), = statuses(session_factory)
+    assert (status, attempts) == ("failed", 2)
+    assert "451" in last_error
+    assert worker.failed == 1 and worker.retried == 1
+
+
+def test_claimed_rows_are_leased(session_factory):
+    with session_factory() as db:
+        enqueue_email(db, "a@example.com", "Hi", "there")
+        assert len(claim_batch(db, 10, timedelta(minutes=5))) == 1
+        assert claim_batch(db, 10, timedelta(minutes=5)) == []
+
+        enqueue_email(db, "b@example.com", "Hi", "there")
+        assert len(claim_batch(db, 10, timedelta(seconds=-1))) == 1  # worker "crashed"; lease already over
+        (row,) = claim_batch(db, 10, timedelta(minutes=5))
+        assert (row.to_email, row.attempts) == ("b@example.com", 2)
+
+
+def test_started_worker_delivers_on_notify(session_factory):
+    async def scenario(sink, worker):
+        worker.poll_interval = 30
+        worker.start()
+        await asyncio.sleep(0.05)
+        with session_factory() as db:
+            enqueue_email(db, "a@example.com", "Hi", "there")
+        worker.notify()
+        for _ in range(100):
+            if sink.messages:
+                break
+            await asyncio.sleep(0.02)
+
+    sink, worker = run_with_sink(session_factory, scenario)
+    assert len(sink.messages) == 1
+    assert worker.delivery_seconds_max < 5
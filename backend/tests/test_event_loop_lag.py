@@ -0,0 +1,109 @@
+import ast
+import asyncio
+import threading
+import time
+from pathlib import Path
+
+import anyio.to_thread
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.config import settings
+from app.database.executor import db_threadpool_limiter, run_db
+
+ENDPOINTS_DIR = Path(__file__).resolve().parent.parent / "app" / "api" / "v1" / "endpoints"
+SLOW_QUERY_MS = 300
+
+
+def make_slow_session():
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+
+    @event.listens_for(engine, "connect")
+    def register_sleep(dbapi_connection, _):
+        dbapi_connection.create_function("sleep_ms", 1, lambda ms: time.sleep(ms / 1000) or ms)
+
+    return sessionmaker(bind=engine)()
+
+
+def slow_query(db):
+    return db.execute(text("SELECT sleep_ms(:ms)"), {"ms": SLOW_QUERY_MS}).scalar()
+
+
+async def max_loop_lag_while(work) -> float:
+    """Run ``work()`` while a ticker measures the worst event-loop stall (seconds)."""
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lags.append(time.perf_counter() - start - 0.005)
+
+    tick_task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.02)
+    try:
+        await work()
+    finally:
+        done.set()
+        await tick_task
+    return max(lags)
+
+
+def test_run_db_keeps_event_loop_responsive():
+    db = make_slow_session()
+
+    async def blocking():
+        slow_query(db)
+
+    async def offloaded():
+        assert await run_db(slow_query, db) == SLOW_QUERY_MS
+
+    blocked_lag = asyncio.run(max_loop_lag_while(blocking))
+    offloaded_lag = asyncio.run(max_loop_lag_while(offloaded))
+
+    assert blocked_lag >= SLOW_QUERY_MS / 1000 * 0.8
+    assert offloaded_lag < 0.1
+
+
+def test_run_db_does_not_queue_behind_the_default_limiter(monkeypatch):
+    """A busy default threadpool (sync handlers, file I/O) must not hold up run_db, and vice versa."""
+    monkeypatch.setattr(settings, "DB_THREADPOOL_SIZE", 0)
+
+    async def scenario():
+        anyio.to_thread.current_default_thread_limiter().total_tokens = 1
+        release = threading.Event()
+        holder = asyncio.create_task(anyio.to_thread.run_sync(release.wait))
+        await asyncio.sleep(0.05)
+        try:
+            result = await asyncio.wait_for(run_db(lambda: 42), 2)
+        finally:
+            release.set()
+            await holder
+        return result, db_threadpool_limiter().total_tokens
+
+    result, tokens = asyncio.run(scenario())
+    assert result == 42
+    assert tokens == 2 * (settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW)
+
+
+def test_no_async_route_handler_takes_a_sync_session():
+    """Async handlers must use AsyncSession; sync Session work belongs in a def
+    handler or behind run_db."""
+    offenders = []
+    for path in sorted(ENDPOINTS_DIR.glob("*.py")):
+        if path.stem.endswith(("_backup", "_fixed")):
+            continue
+        tree = ast.parse(path.read_text())
+        for node in tree.body:
+            if not isinstance(node, ast.AsyncFunctionDef):
+                continue
+            if any(isinstance(n, ast.Name) and n.id == "run_db" for n in ast.walk(node)):
+                continue
+            for arg in node.args.args + node.args.kwonlyargs:
+                if isinstance(arg.annotation, ast.Name) and arg.annotation.id == "Session":
+                    offenders.append(f"{path.name}:{node.name}")
+    assert offenders == []
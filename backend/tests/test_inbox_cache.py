@@ -0,0 +1,94 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from app.core.inbox_cache import INBOX_ROOMS, InboxCache
+from app.crud import chat_crud as chat_crud_module
+from app.crud.chat_crud import ChatCRUD
+
+ALICE, BOB = uuid.uuid4(), uuid.uuid4()
+T0 = datetime(2025, 9, 5, 10, 0, tzinfo=timezone.utc)
+
+
+def room(minutes_ago, pinned=False, unread=0):
+    return {
+        'id': uuid.uuid4(), 'type': 'group', 'created_at': T0 - timedelta(days=1),
+        'updated_at': T0, 'last_message_at': T0 - timedelta(minutes=minutes_ago),
+        'last_message_content': 'old', 'last_message_sender_id': BOB,
+        'unread_count': unread, 'is_pinned': pinned,
+    }
+
+
+def message(room_id, sender_id, content='hi', message_type='text'):
+    return {'room_id': room_id, 'sender_id': sender_id, 'message_type': message_type,
+            'content': content, 'created_at': T0}
+
+
+def test_sent_messages_reorder_cached_inboxes_and_count_unread():
+    cache = InboxCache(100, 60)
+    pinned, recent, quiet = room(30, pinned=True), room(1), room(60)
+    cache.remember(ALICE, [pinned, recent, quiet])
+    cache.remember(BOB, [dict(quiet)])
+
+    cache.message_sent(message(quiet['id'], BOB, content=None, message_type='image'))
+
+    alice = cache.get(ALICE, 0, 10)
+    assert [r['id'] for r in alice] == [pinned['id'], quiet['id'], recent['id']]  # pinned stays first
+    assert alice[1]['last_message_content'] == '📷 Photo' and alice[1]['unread_count'] == 1
+    assert cache.get(BOB, 0, 10)[0]['unread_count'] == 0  # the sender's own message
+
+    cache.room_read(quiet['id'], ALICE)
+    assert cache.get(ALICE, 1, 1)[0]['unread_count'] == 0
+    assert cache.updates == 3
+
+
+def test_only_complete_windows_are_cached_and_expired_users_are_pruned():
+    cache = InboxCache(100, 60)
+    cache.remember(ALICE, [room(i) for i in range(INBOX_ROOMS + 1)])
+    assert cache.get(ALICE, 0, 10) is None  # more rooms than the window: always from the database
+
+    shared = room(5)
+    cache.remember(BOB, [shared])
+    assert cache.get(BOB, INBOX_ROOMS - 1, 2) is None
+    cache.forget(BOB)
+    cache.message_sent(message(shared['id'], ALICE))
+    assert str(shared['id']) not in cache.room_users
+
+
+def test_room_index_drops_forgotten_and_evicted_users():
+    cache = InboxCache(1, 60)
+    alices, shared = room(1), room(2)
+    cache.remember(ALICE, [alices, shared])
+    cache.forget(ALICE)
+    assert cache.room_users == {}
+
+    cache.remember(ALICE, [alices, shared])
+    cache.remember(BOB, [shared])  # evicts Alice's entry
+    assert cache.sweep() == 2
+    assert cache.room_users == {str(shared['id']): {str(BOB)}}
+
+
+def test_room_list_is_loaded_once_then_served_from_cache(monkeypatch):
+    cache = InboxCache(100, 60)
+    monkeypatch.setattr(chat_crud_module, 'inbox_cache', cache)
+    loads = []
+    rooms = [room(i) for i in range(3)]
+
+    async def load(db, user_id, skip, limit):
+        loads.append((skip, limit))
+        return rooms[skip:skip + limit]
+
+    crud = ChatCRUD()
+    monkeypatch.setattr(crud, '_load_user_chat_rooms', load)
+
+    async def run():
+        first = await crud.get_user_chat_rooms(None, ALICE, 0, 2)
+        again = await crud.get_user_chat_rooms(None, ALICE, 1, 2)
+        deep = await crud.get_user_chat_rooms(None, ALICE, INBOX_ROOMS, 10)
+        return first, again, deep
+
+    first, again, deep = asyncio.run(run())
+    assert [r['id'] for r in first] == [r['id'] for r in rooms[:2]]
+    assert [r['id'] for r in again] == [r['id'] for r in rooms[1:3]]
+    assert deep == []
+    assert loads == [(0, INBOX_ROOMS + 1), (INBOX_ROOMS, 10)]
@@ -0,0 +1,83 @@
+import io
+import json
+import logging
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.middleware.observability import (
+    MetricsRegistry, ObservabilityMiddleware, RouteStats, access_logger,
+    start_access_log, stop_access_log,
+)
+
+
+def make_client(registry: MetricsRegistry) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    def read_item(item_id: int):
+        return {"item_id": item_id}
+
+    @app.post("/echo")
+    async def echo(payload: dict):
+        return payload
+
+    app.add_middleware(ObservabilityMiddleware, registry=registry)
+    return TestClient(app)
+
+
+def test_metrics_are_keyed_by_route_template():
+    registry = MetricsRegistry()
+    client = make_client(registry)
+
+    for item_id in range(3):
+        response = client.get(f"/items/{item_id}")
+        assert response.status_code == 200
+        assert "x-process-time" in response.headers
+    client.get("/does-not-exist")
+
+    stats = registry.routes[("GET", "/items/{item_id}")]
+    assert stats.count == 3
+    assert stats.response_bytes == sum(len(f'{{"item_id":{i}}}') for i in range(3))
+    assert registry.routes[("GET", "<unmatched>")].count == 1
+    assert registry.in_flight == 0
+
+
+def test_request_bytes_and_prometheus_output():
+    registry = MetricsRegistry()
+    client = make_client(registry)
+    body = json.dumps({"hello": "world"})
+
+    client.post("/echo", content=body, headers={"content-type": "application/json"})
+
+    stats = registry.routes[("POST", "/echo")]
+    assert stats.request_bytes == len(body)
+    text = registry.render_prometheus()
+    assert 'http_requests_total{method="POST",route="/echo"} 1' in text
+    assert 'quantile="0.99"' in text
+    assert "http_requests_in_flight 0" in text
+
+
+def test_quantiles_follow_the_histogram():
+    stats = RouteStats()
+    for _ in range(90):
+        stats.observe(0.004, 200, 0, 0)
+    for _ in range(10):
+        stats.observe(0.8, 200, 0, 0)
+    assert stats.quantile(0.5) <= 0.005
+    assert 0.75 <= stats.quantile(0.99) <= 1.0
+
+
+def test_access_log_is_written_off_thread_as_json():
+    stream = io.StringIO()
+    start_access_log(stream=stream)
+    try:
+        access_logger.info("request", extra={"access": {"path": "/x", "status": 200}})
+    finally:
+        stop_access_log()
+        access_logger.handlers = []
+        access_logger.setLevel(logging.NOTSET)
+
+    record = json.loads(stream.getvalue().strip())
+    assert record["path"] == "/x"
+    assert record["status"] == 200
@@ -0,0 +1,135 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from passlib.context import CryptContext
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.api.v1.endpoints import auth
+from app.core import auth_cache
+from app.core.password_hashing import PasswordHasher, PasswordHasherBusy
+from app.database.base import get_db
+from app.models_db import Base, Profile, RefreshToken, User
+
+
+def bcrypt_context(rounds: int) -> CryptContext:
+    return CryptContext(
+        schemes=["bcrypt"],
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
+
+
+def test_hashing_does_not_stall_the_event_loop():
+    hasher = PasswordHasher(bcrypt_context(11), workers=2, max_queue=16)
+
+    async def run():
+        lags = []
+        done = asyncio.Event()
+
+        async def ticker():
+            while not done.is_set():
+                start = time.perf_counter()
+                await asyncio.sleep(0.005)
+                lags.append(time.perf_counter() - start - 0.005)
+
+        tick_task = asyncio.create_task(ticker())
+        hashes = await asyncio.gather(*(hasher.hash(f"password-{i}") for i in range(6)))
+        done.set()
+        await tick_task
+        return hashes, max(lags)
+
+    try:
+        hashes, max_lag = asyncio.run(run())
+    finally:
+        hasher.shutdown()
+    assert all(h.startswith("$2b$11$") for h in hashes)
+    assert max_lag < 0.05
+    assert hasher.completed == 6
+    assert hasher.max_queue_depth >= 3  # 6 submitted, 2 workers
+    assert hasher.in_flight == hasher.running == 0
+
+
+def test_full_queue_rejects_instead_of_piling_up():
+    hasher = PasswordHasher(bcrypt_context(10), workers=1, max_queue=1)
+
+    async def run():
+        return await asyncio.gather(*(hasher.hash("pw") for _ in range(4)), return_exceptions=True)
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        hasher.shutdown()
+    rejected = [r for r in results if isinstance(r, PasswordHasherBusy)]
+    assert len(rejected) == hasher.rejected >= 1
+    assert "password_hash_rejected_total" in hasher.render_prometheus()
+
+
+def test_verify_rehashes_when_cost_differs():
+    old_hash = bcrypt_context(4).hash("secret")
+    hasher = PasswordHasher(bcrypt_context(5), workers=1, max_queue=4)
+
+    async def run():
+        return (
+            await hasher.verify("secret", old_hash),
+            await hasher.verify("wrong", old_hash),
+            await hasher.verify("secret", None),
+        )
+
+    try:
+        (ok, new_hash), (bad, no_hash), (google_only, _) = asyncio.run(run())
+    finally:
+        hasher.shutdown()
+    assert ok and new_hash.startswith("$2b$05$")
+    assert not bad and no_hash is None
+    assert not google_only
+    assert hasher.rehashed == 1
+
+    same_cost = PasswordHasher(bcrypt_context(5), workers=1, max_queue=4)
+    try:
+        assert asyncio.run(same_cost.verify("secret", new_hash)) == (True, None)
+    finally:
+        same_cost.shutdown()
+
+
+def test_login_gives_the_connection_back_while_verifying(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'auth.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine, tables=[User.__table__, Profile.__table__, RefreshToken.__table__])
+    Session = sessionmaker(bind=engine, autoflush=False)
+    with Session() as db:
+        db.add(User(username="ada", email="ada@example.com", role="user", password_hash="old-hash"))
+        db.commit()
+    checked_out = []
+
+    class CountingHasher:
+        async def verify(self, password, password_hash):
+            checked_out.append(engine.pool.checkedout())
+            return password_hash == "old-hash", "new-hash"
+
+    def override_get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    monkeypatch.setattr(auth, "password_hasher", CountingHasher())
+    app = FastAPI()
+    app.include_router(auth.router)
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        response = TestClient(app).post("/login", json={"email": "ada@example.com", "password": "secret"})
+    finally:
+        auth_cache.user_snapshots.clear()
+
+    assert response.status_code == 200
+    assert checked_out == [0]
+    assert engine.pool.checkedout() == 0
+    with Session() as db:
+        assert db.query(User).one().password_hash == "new-hash"
+        assert db.query(RefreshToken).count() == 1
+    engine.dispose()
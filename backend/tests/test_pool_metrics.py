@@ -0,0 +1,61 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, exc, text
+
+from app.api.v1.endpoints import internal
+from app.core.config import settings
+from app.database.pool_metrics import InstrumentedQueuePool, pool_status
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.05,
+    )
+    yield engine
+    engine.dispose()
+
+
+def test_pool_status_tracks_checkouts(engine):
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        status = pool_status(engine.pool)
+        assert status["checked_out"] == 1
+        assert status["size"] == 1
+
+    status = pool_status(engine.pool)
+    assert status["checked_out"] == 0
+    assert status["checkouts"] == 1
+    assert sum(status["wait_histogram"].values()) == 1
+
+
+def test_pool_timeout_is_counted(engine):
+    with engine.connect():
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+
+    status = pool_status(engine.pool)
+    assert status["timeouts"] == 1
+    assert status["max_wait_ms"] >= 50
+
+
+@pytest.mark.parametrize("token, debug, sent, status", [
+    ("", False, None, 404),  # fails closed with the shipped default
+    ("", True, None, 200),
+    ("secret", False, None, 403),
+    ("secret", False, "wrong", 403),
+    ("secret", False, "secret", 200),
+])
+def test_internal_endpoints_need_the_token(monkeypatch, token, debug, sent, status):
+    monkeypatch.setattr(settings, "INTERNAL_API_TOKEN", token)
+    monkeypatch.setattr(settings, "DEBUG", debug)
+    app = FastAPI()
+    app.include_router(internal.router, prefix="/internal")
+    headers = {"X-Internal-Token": sent} if sent else {}
+
+    assert TestClient(app).get("/internal/db/pool", headers=headers).status_code == status
@@ -0,0 +1,96 @@
+import asyncio
+import uuid
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.models_db import Base, Buddy, UserOnlineStatus
+from app.websocket.chat_websocket import ConnectionManager
+from app.websocket.presence import PresenceRegistry
+from tests.helpers import FakeWebSocket
+
+
+ALICE, BOB, CAROL = (str(uuid.uuid4()) for _ in range(3))
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine, tables=[Buddy.__table__, UserOnlineStatus.__table__])
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        db.add_all([
+            Buddy(user_id=uuid.UUID(ALICE), buddy_user_id=uuid.UUID(BOB)),
+            Buddy(user_id=uuid.UUID(BOB), buddy_user_id=uuid.UUID(ALICE)),
+        ])
+        db.commit()
+    yield Session
+    engine.dispose()
+
+
+def status_rows(session_factory):
+    with session_factory() as db:
+        return {str(row.user_id): row.is_online for row in db.execute(select(UserOnlineStatus)).scalars()}
+
+
+def test_reconnect_within_grace_is_invisible_and_friends_only_are_told(session_factory):
+    manager = ConnectionManager()
+    presence = PresenceRegistry(manager, session_factory, grace=0.05)
+    sockets = {user: FakeWebSocket() for user in (BOB, CAROL)}
+
+    async def run():
+        for user, ws in sockets.items():
+            await manager.connect(ws, user)
+        phone = FakeWebSocket()
+        await manager.connect(phone, ALICE)
+        presence.connected(ALICE)
+        for _ in range(5):  # flaky network: drop and reconnect straight away
+            manager.disconnect(phone)
+            presence.disconnected(ALICE)
+            phone = FakeWebSocket()
+            await manager.connect(phone, ALICE)
+            presence.connected(ALICE)
+        await asyncio.sleep(0.1)
+        await manager.drain()
+        assert presence.is_online(ALICE) and presence.reconnects_in_grace == 5
+
+        manager.disconnect(phone)
+        presence.disconnected(ALICE)
+        assert presence.is_online(ALICE)
+        await asyncio.sleep(0.1)
+        await manager.drain()
+        assert not presence.is_online(ALICE)
+        assert await presence.flush() == 1
+
+    asyncio.run(run())
+    assert [m["data"]["is_online"] for m in sockets[BOB].sent] == [True, False]
+    assert sockets[CAROL].sent == []
+    assert presence.status_changes == 2
+    assert status_rows(session_factory) == {ALICE: False}
+
+
+def test_status_writes_are_coalesced_into_one_flush(session_factory):
+    manager = ConnectionManager()
+    presence = PresenceRegistry(manager, session_factory, grace=0)
+    users = [str(uuid.uuid4()) for _ in range(50)]
+
+    async def run():
+        for user in users:
+            ws = FakeWebSocket()
+            await manager.connect(ws, user)
+            presence.connected(user)
+            if user in users[:10]:
+                manager.disconnect(ws)
+                presence.disconnected(user)
+        await asyncio.sleep(0.01)
+        assert await presence.flush() == 50
+        assert await presence.flush() == 0
+
+        await presence.stop()  # everyone still here is written as offline
+
+    asyncio.run(run())
+    assert presence.flushes == 2
+    assert set(status_rows(session_factory).values()) == {False}
+    assert len(status_rows(session_factory)) == 50
@@ -0,0 +1,92 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+from app.database.query_stats import fingerprint, install_query_hooks, track_queries
+from app.middleware.observability import MetricsRegistry, ObservabilityMiddleware
+
+install_query_hooks()
+
+
+@pytest.fixture
+def db_engine():
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE rooms (id INTEGER PRIMARY KEY, name TEXT)"))
+        conn.execute(text("CREATE TABLE members (room_id INTEGER, user_id INTEGER)"))
+        for room_id in range(10):
+            conn.execute(text("INSERT INTO rooms VALUES (:id, :name)"), {"id": room_id, "name": f"room {room_id}"})
+            conn.execute(text("INSERT INTO members VALUES (:id, 1)"), {"id": room_id})
+    yield engine
+    engine.dispose()
+
+
+def make_client(engine, registry: MetricsRegistry) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/rooms/n-plus-one")
+    def rooms_n_plus_one():
+        with engine.connect() as conn:
+            rooms = conn.execute(text("SELECT id FROM rooms")).all()
+            return [
+                conn.execute(text("SELECT count(*) FROM members WHERE room_id = :id"), {"id": r.id}).scalar()
+                for r in rooms
+            ]
+
+    @app.get("/rooms/joined")
+    def rooms_joined():
+        with engine.connect() as conn:
+            return [row.n for row in conn.execute(text(
+                "SELECT count(m.user_id) AS n FROM rooms r LEFT JOIN members m ON m.room_id = r.id GROUP BY r.id"
+            ))]
+
+    app.add_middleware(ObservabilityMiddleware, registry=registry, debug_headers=True, repeat_threshold=5)
+    return TestClient(app)
+
+
+def test_fingerprint_ignores_literals_and_whitespace():
+    assert fingerprint("SELECT * FROM t WHERE id = 1") == fingerprint("SELECT *\n  FROM t WHERE id = 42")
+    assert fingerprint("SELECT * FROM t WHERE name = 'a'") == "SELECT * FROM t WHERE name = ?"
+    assert fingerprint("SELECT * FROM t WHERE id IN (?, ?, ?)") == "SELECT * FROM t WHERE id IN (...)"
+
+
+def test_track_queries_counts_and_finds_repeats(db_engine):
+    with track_queries() as stats:
+        with db_engine.connect() as conn:
+            for i in range(3):
+                conn.execute(text("SELECT * FROM rooms WHERE id = :id"), {"id": i})
+            conn.execute(text("SELECT count(*) FROM members"))
+    assert stats.count == 4
+    assert stats.max_repeat == 3
+    assert stats.repeated() == [("SELECT * FROM rooms WHERE id = ?", 3)]
+    assert stats.duration > 0
+
+
+def test_middleware_reports_queries_per_request(db_engine):
+    registry = MetricsRegistry()
+    client = make_client(db_engine, registry)
+
+    response = client.get("/rooms/n-plus-one")
+    assert response.headers["x-db-queries"] == "11"
+    assert response.headers["x-db-max-repeat"] == "10"
+    response = client.get("/rooms/joined")
+    assert response.headers["x-db-queries"] == "1"
+
+    n_plus_one = registry.routes[("GET", "/rooms/n-plus-one")]
+    assert (n_plus_one.db_queries, n_plus_one.n_plus_one) == (11, 1)
+    assert registry.routes[("GET", "/rooms/joined")].n_plus_one == 0
+    assert 'http_request_n_plus_one_total{method="GET",route="/rooms/n-plus-one"} 1' in registry.render_prometheus()
+
+
+def test_assert_max_queries_catches_n_plus_one(db_engine, assert_max_queries):
+    client = make_client(db_engine, MetricsRegistry())
+
+    with assert_max_queries(1):
+        client.get("/rooms/joined")
+    with pytest.raises(AssertionError, match="expected at most 2 queries, got 11"):
+        with assert_max_queries(2):
+            client.get("/rooms/n-plus-one")
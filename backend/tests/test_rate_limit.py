@@ -0,0 +1,76 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.middleware.rate_limit import (
+    MemoryBucketStore, RateLimitMiddleware, classify, parse_limits,
+)
+
+
+def make_client(store, limits) -> TestClient:
+    app = FastAPI()
+
+    @app.post("/api/v1/auth/login")
+    def login():
+        return {"ok": True}
+
+    @app.get("/api/v1/posts/")
+    def feed():
+        return []
+
+    @app.get("/metrics")
+    def read_metrics():
+        return "ok"
+
+    app.add_middleware(RateLimitMiddleware, store=store, limits=limits)
+    return TestClient(app)
+
+
+def test_route_groups():
+    assert classify("POST", "/api/v1/auth/login") == "auth"
+    assert classify("POST", "/api/v1/chat/rooms/abc/messages") == "chat_send"
+    assert classify("GET", "/api/v1/chat/rooms/abc/messages") == "default"
+    assert classify("GET", "/api/v1/posts/feed/public") == "feed_reads"
+    assert classify("GET", "/api/v1/social/stories/feed") == "feed_reads"
+    assert classify("POST", "/api/v1/shop/orders") == "shop_orders"
+    assert parse_limits({"auth": "5/60"})["auth"] == (5, 60.0)
+
+
+def test_auth_group_returns_429_with_retry_after():
+    limits = parse_limits({"auth": "3/60", "default": "1000/1"})
+    client = make_client(MemoryBucketStore(), limits)
+
+    assert [client.post("/api/v1/auth/login").status_code for _ in range(3)] == [200] * 3
+    blocked = client.post("/api/v1/auth/login")
+    assert blocked.status_code == 429
+    assert 1 <= int(blocked.headers["retry-after"]) <= 20
+
+    # Other groups and exempt paths have their own budget.
+    assert client.get("/api/v1/posts/").status_code == 200
+    assert client.get("/metrics").status_code == 200
+
+
+def test_bucket_refills_over_time():
+    store = MemoryBucketStore()
+
+    async def run():
+        assert (await store.take("k", 2, 10, now=0.0))[0]
+        assert (await store.take("k", 2, 10, now=0.0))[0]
+        allowed, retry_after = await store.take("k", 2, 10, now=1.0)
+        assert not allowed and 3.9 < retry_after < 4.1
+        assert (await store.take("k", 2, 10, now=5.0))[0]
+
+    asyncio.run(run())
+
+
+def test_store_memory_is_bounded_under_many_clients():
+    store = MemoryBucketStore(max_keys=1000)
+
+    async def run():
+        for i in range(20_000):
+            await store.take(f"default:10.0.{i // 256}.{i % 256}", 100, 1, now=float(i))
+
+    asyncio.run(run())
+    assert len(store) == 1000
+    assert store.evictions == 19_000
@@ -0,0 +1,108 @@
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.inbox_cache import InboxCache
+from app.crud import chat_crud as chat_crud_module
+from app.crud.chat_crud import ChatCRUD, chat_crud
+from app.websocket.chat_websocket import ConnectionManager
+from app.websocket.read_receipts import ReadReceiptBatcher
+from tests.helpers import room_with
+
+ROOM, ALICE, BOB = (str(uuid.uuid4()) for _ in range(3))
+
+
+@asynccontextmanager
+async def no_session():
+    yield None
+
+
+@pytest.fixture
+def writes(monkeypatch):
+    calls = []
+
+    async def mark_messages_as_read(db, room_id, user_id, message_ids=None):
+        calls.append((str(room_id), str(user_id), None if message_ids is None else sorted(map(str, message_ids))))
+        return True
+
+    monkeypatch.setattr(chat_crud, "mark_messages_as_read", mark_messages_as_read)
+    return calls
+
+
+def receipts(ws):
+    return [m["data"] for m in ws.sent if m["type"] == "message_read_receipt"]
+
+
+def test_scroll_events_are_written_and_broadcast_once(writes):
+    manager = ConnectionManager()
+    batcher = ReadReceiptBatcher(manager, no_session, interval=0.05)
+    ids = sorted(str(uuid.uuid4()) for _ in range(30))
+
+    async def run():
+        sockets = await room_with(manager, ROOM, ALICE, BOB)
+        for start in range(0, 30, 3):  # ten scroll steps, overlapping
+            batcher.mark(ROOM, ALICE, ids[max(start - 1, 0):start + 3])
+        await asyncio.sleep(0.1)
+        await manager.drain()
+        return sockets
+
+    sockets = asyncio.run(run())
+    assert writes == [(ROOM, ALICE, ids)]
+    assert receipts(sockets[BOB]) == [{"room_id": ROOM, "user_id": ALICE, "message_ids": ids}]
+    assert sockets[ALICE].sent == []
+    assert batcher.events_received == 10 and batcher.flushes == 1 and batcher.ids_flushed == 30
+    assert batcher.pending == {} and batcher._timers == {}
+
+
+def test_marking_the_whole_room_supersedes_queued_ids(writes):
+    manager = ConnectionManager()
+    batcher = ReadReceiptBatcher(manager, no_session, interval=10)
+
+    async def run():
+        await room_with(manager, ROOM, ALICE, BOB)
+        batcher.mark(ROOM, ALICE, [str(uuid.uuid4())])
+        batcher.mark(ROOM, ALICE)
+        batcher.mark(ROOM, ALICE, [str(uuid.uuid4())])
+        batcher.mark(ROOM, BOB, [str(uuid.uuid4())])
+        await batcher.flush_all()  # shutdown: nothing is left behind
+
+    asyncio.run(run())
+    assert (ROOM, ALICE, None) in writes
+    assert len(writes) == 2 and batcher.pending == {}
+
+
+class MarkSession:
+    """Answers the chat_participants UPDATE with the unread count left."""
+
+    def __init__(self, unread_count):
+        self.unread_count = unread_count
+        self.statements = []
+
+    async def execute(self, statement, params=None):
+        self.statements.append((str(statement), params))
+        return SimpleNamespace(scalar=lambda: self.unread_count)
+
+    async def commit(self):
+        pass
+
+
+def test_reading_some_messages_moves_the_mark_only_up_to_them(monkeypatch):
+    cache = InboxCache(100, 60)
+    monkeypatch.setattr(chat_crud_module, "inbox_cache", cache)
+    cache.remember(ALICE, [{"id": ROOM, "unread_count": 500}])
+    read = [uuid.uuid4() for _ in range(3)]
+
+    db = MarkSession(unread_count=497)
+    asyncio.run(ChatCRUD().mark_messages_as_read(db, uuid.UUID(ROOM), uuid.UUID(ALICE), read))
+    (sql, params), = db.statements
+    assert "CURRENT_TIMESTAMP" not in sql and "max(cm.created_at)" in sql
+    assert params["message_ids"] == [str(message_id) for message_id in read]
+    assert cache.get(ALICE, 0, 10)[0]["unread_count"] == 497
+
+    db = MarkSession(unread_count=0)
+    asyncio.run(ChatCRUD().mark_messages_as_read(db, uuid.UUID(ROOM), uuid.UUID(ALICE)))
+    assert "last_read_at = CURRENT_TIMESTAMP" in db.statements[0][0]
+    assert cache.get(ALICE, 0, 10)[0]["unread_count"] == 0
@@ -0,0 +1,77 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.crud import chat_crud as chat_crud_module
+from app.crud.chat_crud import chat_crud
+from tests.helpers import chat_database, requires_postgres
+
+PAGE = {'messages': [{'id': 'm1'}, {'id': 'm2'}], 'older_cursor': 'o', 'newer_cursor': 'n', 'has_more': True}
+
+
+@pytest.fixture
+def pages(stub_chat_crud):
+    return stub_chat_crud("get_room_messages", lambda *args: PAGE)
+
+
+def test_cursor_pages_come_back_with_their_cursors(chat_client, pages):
+    response = chat_client.get(f"/api/v1/chat/rooms/{uuid.uuid4()}/messages")
+
+    assert response.status_code == 200
+    assert response.json() == PAGE
+
+
+def test_before_message_id_keeps_the_list_response(chat_client, pages):
+    before = uuid.uuid4()
+    response = chat_client.get(f"/api/v1/chat/rooms/{uuid.uuid4()}/messages", params={"before_message_id": str(before)})
+
+    assert response.status_code == 200
+    assert response.json() == PAGE['messages']
+    assert [(cursor, before_message_id) for _, _, cursor, _, _, before_message_id in pages] == [(None, before)]
+
+
+@requires_postgres
+def test_history_pages_run_through_the_partitions_into_the_archive(monkeypatch):
+    monkeypatch.setattr(chat_crud_module.settings, "CHAT_ARCHIVE_AFTER_MONTHS", 12)
+    now = datetime.now(timezone.utc)
+    two_years_ago = datetime(now.year - 2, now.month, 1, tzinfo=timezone.utc)
+
+    async def scenario():
+        async with chat_database() as (Session, data):
+            alice, bob, carol = await data.user("alice"), await data.user("bob"), await data.user("carol")
+            room = await data.room(alice, bob)
+            elsewhere = await data.room(bob, carol)
+            archived = await data.archived_month(room, bob, two_years_ago, ["archived 0", "archived 1"])
+            live = [
+                await data.message(room, bob, f"message {n}", now - timedelta(minutes=5 - n))
+                for n in range(5)
+            ]
+            await data.message(elsewhere, carol, "not for alice")
+
+            async def walk(direction, limit):
+                pages, cursor = [], None
+                while True:
+                    async with Session() as db:
+                        page = await chat_crud.get_room_messages(db, room, alice, cursor, direction, limit)
+                    pages.append(page)
+                    if not page["has_more"]:
+                        return pages
+                    cursor = page["older_cursor" if direction == "older" else "newer_cursor"]
+
+            older, newer = await walk("older", 3), await walk("newer", 4)
+            async with Session() as db:
+                with pytest.raises(ValueError):
+                    await chat_crud.get_room_messages(db, elsewhere, alice)
+            return archived + live, older, newer
+
+    history, older, newer = asyncio.run(scenario())
+
+    def ids(page):
+        return [m["id"] for m in page["messages"]]
+
+    assert [ids(page) for page in older] == [history[4:], history[1:4], history[:1]]
+    assert [page["has_more"] for page in older] == [True, True, False]
+    assert [ids(page) for page in newer] == [history[:4], history[4:]]
+    assert [page["has_more"] for page in newer] == [True, False]
@@ -0,0 +1,29 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+_PROBE = """
+import sys
+import app.main
+from app.database.base import engine, async_engine
+print("checkouts=%d" % (engine.pool.wait_stats.checkouts + async_engine.sync_engine.pool.wait_stats.checkouts))
+print("clients=" + ",".join(m for m in ("firebase_admin", "cloudinary") if m in sys.modules))
+"""
+
+
+def test_importing_app_does_not_touch_the_database_or_lazy_clients():
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE],
+        cwd=BACKEND_DIR,
+        env=os.environ.copy(),
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert out.returncode == 0, out.stderr
+    probe = dict(line.split("=", 1) for line in out.stdout.splitlines() if "=" in line)
+    assert probe["checkouts"] == "0"
+    assert probe["clients"] == ""
@@ -0,0 +1,56 @@
+import asyncio
+
+from app.websocket.chat_websocket import ConnectionManager
+from app.websocket.typing_indicators import TypingTracker
+from tests.helpers import room_with
+
+
+def typing_events(ws):
+    return [(m["data"]["user_id"], m["data"]["is_typing"]) for m in ws.sent if m["type"] == "typing_indicator"]
+
+
+def test_keystrokes_are_coalesced_and_expire():
+    manager = ConnectionManager()
+    tracker = TypingTracker(manager, ttl=0.1, interval=0.02)
+
+    async def run():
+        sockets = await room_with(manager, "r1", "alice", "bob")
+        for _ in range(20):  # typing_start per keystroke
+            tracker.start("r1", "alice")
+            await asyncio.sleep(0.005)
+        await asyncio.sleep(0.2)  # no refresh: expires
+        await manager.drain()
+        return sockets
+
+    sockets = asyncio.run(run())
+    assert typing_events(sockets["bob"]) == [("alice", True), ("alice", False)]
+    assert sockets["alice"].sent == []
+    assert tracker.frames_received == 20 and tracker.events_sent == 2
+    assert tracker.typing == {} and tracker._timers == {}
+
+
+def test_room_events_are_rate_limited_and_flaps_cancel_out():
+    manager = ConnectionManager()
+    tracker = TypingTracker(manager, ttl=5, interval=0.05)
+
+    async def run():
+        sockets = await room_with(manager, "r1", "alice", "bob", "carol", "dave")
+        tracker.start("r1", "alice")
+        await asyncio.sleep(0.01)  # alice's start goes out straight away
+        tracker.start("r1", "bob")
+        tracker.start("r1", "carol")
+        tracker.stop("r1", "carol")  # inside the same interval: never shown
+        await asyncio.sleep(0.02)
+        assert typing_events(sockets["dave"]) == [("alice", True)]
+        await asyncio.sleep(0.05)
+        tracker.stop("r1", "alice", received=False)  # alice sent her message
+        tracker.forget_user("bob")
+        await asyncio.sleep(0.1)
+        await manager.drain()
+        return sockets
+
+    sockets = asyncio.run(run())
+    events = typing_events(sockets["dave"])
+    assert events[:2] == [("alice", True), ("bob", True)]
+    assert sorted(events[2:]) == [("alice", False), ("bob", False)]  # one flush, any order
+    assert ("carol", True) not in typing_events(sockets["alice"])
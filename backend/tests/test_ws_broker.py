@@ -0,0 +1,93 @@
+import asyncio
+
+from app.websocket.broker import PostgresBroker, room_channel, user_channel
+from app.websocket.chat_websocket import ConnectionManager
+from tests.helpers import FakeWebSocket, check_index
+
+
+class FakePostgres:
+    """Stands in for the database between workers: relays each broker's
+    queued NOTIFYs to every broker LISTENing on the channel, itself included,
+    as Postgres does."""
+
+    def __init__(self, *brokers):
+        self.brokers = brokers
+
+    def flush(self):
+        for source in self.brokers:
+            while source._outbox:
+                channel, notification = source._outbox.popleft()
+                for broker in self.brokers:
+                    if channel in broker.channels:
+                        broker._on_notify(None, 0, channel, notification)
+
+
+def make_worker():
+    return ConnectionManager(PostgresBroker("postgresql://unused"))
+
+
+def test_room_and_user_messages_reach_other_workers():
+    worker_a, worker_b = make_worker(), make_worker()
+    postgres = FakePostgres(worker_a.broker, worker_b.broker)
+    alice = FakeWebSocket()
+    bob_phone, bob_laptop = FakeWebSocket(), FakeWebSocket()
+
+    async def run():
+        await worker_a.connect(alice, "alice")
+        await worker_a.connect(bob_phone, "bob")
+        await worker_b.connect(bob_laptop, "bob")
+        await worker_a.join_room("alice", "r1")
+        await worker_b.join_room("bob", "r1")
+        assert room_channel("r1") in worker_a.broker.channels
+        assert room_channel("r1") in worker_b.broker.channels
+
+        await worker_a.broadcast_to_room({"type": "new_message", "data": 1}, "r1", exclude_user_id="alice")
+        await worker_a.send_personal_message({"type": "friend_request_received"}, "bob")
+        await worker_b.broadcast_to_room({"type": "typing_indicator"}, "r1", exclude_user_id="bob")
+        postgres.flush()
+        await worker_a.drain()
+        await worker_b.drain()
+
+    asyncio.run(run())
+    # bob's phone on worker A is not in r1 there; his laptop on worker B is
+    assert bob_laptop.sent == [{"type": "new_message", "data": 1}, {"type": "friend_request_received"}]
+    # the publishing worker delivers locally without waiting for its own NOTIFY
+    assert bob_phone.sent == [{"type": "friend_request_received"}]
+    assert alice.sent == [{"type": "typing_indicator"}]
+    assert worker_a.broker.received == 1 and worker_b.broker.received == 2
+
+
+def test_large_payloads_are_chunked_and_reassembled():
+    worker_a, worker_b = make_worker(), make_worker()
+    postgres = FakePostgres(worker_a.broker, worker_b.broker)
+    bob = FakeWebSocket()
+    content = "x" * (3 * PostgresBroker.CHUNK_SIZE)
+
+    async def run():
+        await worker_b.connect(bob, "bob")
+        await worker_a.send_personal_message({"type": "new_message", "data": content}, "bob")
+        assert len(worker_a.broker._outbox) == 4
+        assert all(len(n.encode()) < 8000 for _, n in worker_a.broker._outbox)
+        postgres.flush()
+        await worker_b.drain()
+
+    asyncio.run(run())
+    assert bob.sent == [{"type": "new_message", "data": content}]
+
+
+def test_workers_listen_only_while_they_have_local_subscribers():
+    worker = make_worker()
+    phone, laptop = FakeWebSocket(), FakeWebSocket()
+
+    async def run():
+        await worker.connect(phone, "bob")
+        await worker.connect(laptop, "bob")
+        await worker.join_room("bob", "r1")
+        assert worker.broker.channels == {user_channel("bob"), room_channel("r1")}
+        worker.disconnect(phone)
+        assert worker.broker.channels == {user_channel("bob"), room_channel("r1")}
+        worker.disconnect(laptop)
+
+    asyncio.run(run())
+    assert worker.broker.channels == set()
+    check_index(worker)
@@ -0,0 +1,105 @@
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from datetime import timedelta
+
+import anyio.to_thread
+import pytest
+from fastapi import WebSocketDisconnect
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+from app.core import auth_cache
+from app.core.auth import create_access_token
+from app.core.config import settings
+from app.database.base import ThreadedSession
+from app.models_db import Base, Buddy, Profile, User
+from app.websocket import chat_websocket
+from app.websocket.chat_websocket import ConnectionManager, websocket_endpoint
+from app.websocket.presence import PresenceRegistry
+from tests.helpers import FakeWebSocket
+
+SOCKETS = 1000
+POOL_SIZE = 5
+
+
+class IdleWebSocket(FakeWebSocket):
+    """Connects, then sits silent until the client goes away."""
+
+    def __init__(self, gone: asyncio.Event):
+        super().__init__()
+        self.gone = gone
+
+    async def receive_text(self):
+        await self.gone.wait()
+        raise WebSocketDisconnect(1000)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    # A small real pool: a socket that kept its session would pin a connection
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'ws.db'}", connect_args={"check_same_thread": False},
+        poolclass=QueuePool, pool_size=POOL_SIZE, max_overflow=0, pool_timeout=2,
+    )
+    Base.metadata.create_all(engine, tables=[User.__table__, Profile.__table__, Buddy.__table__])
+    auth_cache.user_snapshots.clear()
+    yield engine
+    auth_cache.user_snapshots.clear()
+    engine.dispose()
+
+
+def test_idle_sockets_hold_no_pooled_connections(engine, monkeypatch):
+    Session = sessionmaker(bind=engine)
+    tokens = []
+    with Session() as db:
+        users = [User(username=f"user{i}", email=f"user{i}@example.com", role="user") for i in range(20)]
+        db.add_all(users)
+        db.commit()
+        for user in users:
+            tokens.append(create_access_token({"sub": user.email, "user_id": str(user.id)}, timedelta(minutes=5)))
+
+    sessions_opened = 0
+
+    @asynccontextmanager
+    async def session_scope():
+        nonlocal sessions_opened
+        sessions_opened += 1
+        db = ThreadedSession(Session())
+        try:
+            yield db
+        finally:
+            await db.close()
+
+    manager = ConnectionManager()
+    monkeypatch.setattr(chat_websocket, "async_session_scope", session_scope)
+    monkeypatch.setattr(chat_websocket, "manager", manager)
+    monkeypatch.setattr(chat_websocket, "presence", PresenceRegistry(manager, Session, grace=0))
+    monkeypatch.setattr(settings, "WS_MAX_CONNECTIONS_PER_USER", 0)  # 50 sockets per user here
+
+    async def run():
+        gone = asyncio.Event()
+        sockets = [IdleWebSocket(gone) for _ in range(SOCKETS)]
+        # Worst case for ThreadedSession: no more default-limiter threads than connections
+        anyio.to_thread.current_default_thread_limiter().total_tokens = POOL_SIZE
+        endpoints = [
+            asyncio.create_task(websocket_endpoint(ws, tokens[i % len(tokens)]))
+            for i, ws in enumerate(sockets)
+        ]
+        while len(manager.websocket_users) < SOCKETS and not any(e.done() for e in endpoints):
+            await asyncio.sleep(0.01)
+        assert len(manager.websocket_users) == SOCKETS
+        await asyncio.sleep(0.1)  # presence announcements load friend lists
+        await manager.drain()
+
+        assert all(ws.sent[0]["type"] == "connection_established" for ws in sockets)
+        assert engine.pool.checkedout() == 0
+
+        gone.set()
+        await asyncio.gather(*endpoints)
+        assert manager.websocket_users == {}
+
+    asyncio.run(run())
+    assert sessions_opened == SOCKETS  # one short session per connect, for auth
+    assert engine.pool.checkedout() == 0
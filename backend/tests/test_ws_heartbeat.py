@@ -0,0 +1,76 @@
+import asyncio
+
+from app.websocket.chat_websocket import ConnectionManager
+from app.websocket.heartbeat import GOING_AWAY, HeartbeatMonitor
+from tests.helpers import FakeWebSocket
+
+
+def age(manager, seconds):
+    """Move every connection's timestamps `seconds` into the past."""
+    for client in manager.clients.values():
+        client.connected_at -= seconds
+        client.last_seen -= seconds
+        client.last_active -= seconds
+        if client.pinged_at is not None:
+            client.pinged_at -= seconds
+
+
+def run(scenario):
+    manager = ConnectionManager()
+    monitor = HeartbeatMonitor(manager, interval=25, timeout=60, idle_timeout=300)
+
+    async def main():
+        await scenario(manager, monitor)
+        await manager.drain()
+
+    asyncio.run(main())
+    return manager, monitor
+
+
+def test_quiet_sockets_are_pinged_and_dead_ones_reaped():
+    alive, dead = FakeWebSocket(), FakeWebSocket()
+
+    async def scenario(manager, monitor):
+        await manager.connect(alive, "alice")
+        await manager.connect(dead, "bob")
+        await manager.join_room("bob", "r1")
+
+        age(manager, 10)
+        assert monitor.check() == 0 and monitor.pings_sent == 0  # not quiet long enough
+
+        age(manager, 20)
+        monitor.check()
+        monitor.check()  # no second ping within the interval
+        assert monitor.pings_sent == 2
+        manager.touch(alive, active=False)  # alice answers with a pong
+
+        age(manager, 35)  # bob has been silent for 65s
+        assert monitor.check() == 1
+        await asyncio.sleep(0.01)
+        assert "bob" not in manager.active_connections and "r1" not in manager.room_members
+        assert dead.close_code == GOING_AWAY
+        assert "alice" in manager.active_connections
+
+    manager, monitor = run(scenario)
+    assert [m["type"] for m in alive.sent] == ["ping", "ping"]  # the second once alice went quiet again
+    assert monitor.reaped == {"heartbeat_timeout": 1}
+    assert 'ws_connections_reaped_total{reason="heartbeat_timeout"} 1' in monitor.render_prometheus()
+
+
+def test_sockets_answering_only_heartbeats_are_reaped_as_idle():
+    idle, busy = FakeWebSocket(), FakeWebSocket()
+
+    async def scenario(manager, monitor):
+        await manager.connect(idle, "alice")
+        await manager.connect(busy, "bob")
+        for _ in range(13):  # 325s of pongs; bob also sends messages
+            age(manager, 25)
+            manager.touch(idle, active=False)
+            manager.touch(busy, active=True)
+            monitor.check()
+        await asyncio.sleep(0.01)
+        assert list(manager.active_connections) == ["bob"]
+
+    manager, monitor = run(scenario)
+    assert idle.close_code == GOING_AWAY and busy.close_code is None
+    assert monitor.reaped == {"idle": 1}
@@ -0,0 +1,63 @@
+import asyncio
+import uuid
+
+import pytest
+
+from app.crud.chat_crud import chat_crud
+from app.websocket import chat_websocket
+from app.websocket.chat_websocket import ConnectionManager, handle_send_message
+from tests.helpers import FakeWebSocket
+
+ROOM, ALICE = str(uuid.uuid4()), str(uuid.uuid4())
+
+
+@pytest.fixture
+def sends(monkeypatch):
+    calls = []
+
+    async def send_message(db, room_id, sender_id, message_data, check_membership=True):
+        calls.append(check_membership)
+        if check_membership and str(sender_id) != ALICE:
+            raise ValueError("User is not a participant in this room")
+        return {"id": str(uuid.uuid4()), "room_id": str(room_id), "content": message_data.content}
+
+    monkeypatch.setattr(chat_crud, "send_message", send_message)
+    monkeypatch.setattr(chat_websocket, "manager", ConnectionManager())
+    return calls
+
+
+def test_membership_is_checked_once_per_socket(sends):
+    manager = chat_websocket.manager
+    phone, laptop = FakeWebSocket(), FakeWebSocket()
+
+    async def run():
+        await manager.connect(phone, ALICE)
+        await manager.connect(laptop, ALICE)
+        for text in ("hi", "there", "again"):
+            await handle_send_message(phone, {"room_id": ROOM, "content": text}, ALICE)
+        await handle_send_message(laptop, {"room_id": ROOM, "content": "from laptop"}, ALICE)
+        assert manager.is_verified_member(phone, ROOM)
+        await manager.drain()
+        manager.disconnect(phone)
+
+    asyncio.run(run())
+    assert sends == [True, False, False, True]
+    assert [m["type"] for m in phone.sent] == ["message_sent"] * 3
+    assert manager.verified_rooms.keys() == {laptop}
+
+
+def test_rejected_send_is_not_cached(sends):
+    manager = chat_websocket.manager
+    mallory = str(uuid.uuid4())
+    ws = FakeWebSocket()
+
+    async def run():
+        await manager.connect(ws, mallory)
+        for _ in range(2):
+            await handle_send_message(ws, {"room_id": ROOM, "content": "let me in"}, mallory)
+        await manager.drain()
+
+    asyncio.run(run())
+    assert sends == [True, True]
+    assert [m["type"] for m in ws.sent] == ["error", "error"]
+    assert not manager.is_verified_member(ws, ROOM)